@@ -1,12 +1,148 @@
+import io
+import os
+import bisect
+import codecs
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 from customedDS.CustomDict import CustomDict
 
-def reduce(function, sequence, initial):
-    it = iter(sequence)
-    value = initial
-    for element in it:
-        value = function(value, element)
+# First bytes of a file compressed in blocks. A file in the first format starts
+# with the length of its lookup table, which is 255 only for a text of a single
+# byte value repeated enough for 255 merges of pairs seen at least twice
+XIP2_MAGIC = b"\xffXIP2"
+# Compressed bytes expanded at a time when decompressing piece by piece
+DECOMPRESS_CHUNK_SIZE = 1 << 16
+
+class Byte_Pairs:
+    """
+    Counts of the adjacent byte pairs of a sequence, kept up to date while
+    pairs are merged into single bytes, so a merge costs time in the number
+    of places it changes instead of the length of the sequence.
+
+    -   The sequence is a doubly linked list over the positions of the
+        original bytes, kept in NumPy arrays. Merged bytes are unlinked and
+        marked with 256
+
+    -   Where each pair was at the start is found once by sorting the
+        positions by pair. Pairs made by merges are added to lists of their
+        own as they appear, places that changed since are skipped
+
+    -   A merge removes the counts of the pairs around the replaced places
+        and adds those of the pairs they become, all places at once
+
+    Pair (a, b) is counted at index a * 256 + b, as in a flat 256 x 256 table.
+
+    Methods:
+    --------
+    - most_frequent():
+        Index and count of the most frequent pair, the lowest index on ties
+        Returns: tuple of (int, int)
+
+    - merge(first: int, second: int, replacement: int):
+        Replace each pair (first, second) from left to right with replacement,
+        like bytes.replace
+        Returns: void
+
+    - data():
+        The sequence after the merges so far
+        Returns: bytes
+    """
+
+    def __init__(self, data: bytes):
+        values = np.frombuffer(data, dtype=np.uint8)
+        length = len(values)
+        codes = values[:-1].astype(np.uint16) * 256 + values[1:]
+
+        self.counts = np.bincount(codes, minlength=256 * 256)
+        # positions of each pair at the start, grouped by pair in order
+        self.positions = np.argsort(codes, kind="stable").astype(np.int32)
+        self.starts = np.concatenate(([0], np.cumsum(self.counts))).tolist()
+        # positions of pairs made by merges, a list of arrays per pair
+        self.added = {}
+
+        self.values = values.astype(np.uint16)
+        self.previous = np.arange(-1, length - 1, dtype=np.int32)
+        self.next = np.arange(1, length + 1, dtype=np.int32)
+        if length:
+            self.next[-1] = -1
+
+    def most_frequent(self):
+        """ Get the index and count of the most frequent pair, (0, 0) if there is no pair"""
+
+        index = int(np.argmax(self.counts))
+        return index, int(self.counts[index])
+
+    def merge(self, first: int, second: int, replacement: int):
+        """ Replace every pair (first, second) with replacement and update the counts around each"""
+
+        values = self.values
+        previous = self.previous
+        following = self.next
+
+        index = first * 256 + second
+        places = [self.positions[self.starts[index]:self.starts[index + 1]]] + self.added.pop(index, [])
+        if len(places) > 1:
+            # each list is in order, a stable sort merges them in linear time
+            places = np.sort(np.concatenate(places), kind="stable")
+        else:
+            places = places[0]
+
+        # Skip places that changed since
+        right = following[places]
+        places = places[(values[places] == first) & (right >= 0) & (values[right] == second)]
+        if len(places) == 0:
+            return
+
+        # In a run of the same byte, the pairs overlap: like bytes.replace,
+        # take every other one from the left of each run
+        if first == second and len(places) > 1:
+            ranks = np.arange(len(places))
+            run_starts = np.ones(len(places), dtype=bool)
+            run_starts[1:] = previous[places[1:]] != places[:-1]
+            ranks -= np.maximum.accumulate(np.where(run_starts, ranks, 0))
+            places = places[ranks % 2 == 0]
+
+        right = following[places]
+        left = previous[places]
+        after = following[right]
+        has_after = after >= 0
+        # places right after the place before them, their left neighbour is
+        # that place's right byte
+        joined = np.zeros(len(places), dtype=bool)
+        joined[1:] = left[1:] == right[:-1]
+
+        # Pairs starting at the place, its right byte and its left neighbour
+        # lose their count
+        old = np.concatenate((places, right[has_after], left[(left >= 0) & ~joined]))
+        self.counts -= np.bincount(values[old] * 256 + values[following[old]], minlength=256 * 256)
+
+        values[places] = replacement
+        values[right] = 256
+        following[places] = after
+        previous[after[has_after]] = places[has_after]
+
+        # Pairs starting at the place and its new left neighbour are new
+        left = previous[places]
+        new = np.sort(np.concatenate((places[has_after], left[(left >= 0) & ~joined])), kind="stable")
+        if len(new) == 0:
+            return
+        codes = values[new] * 256 + values[following[new]]
+        self.counts += np.bincount(codes, minlength=256 * 256)
+
+        # Add the places to the lists of their pairs, still in order
+        order = np.argsort(codes, kind="stable")
+        codes = codes[order]
+        new = new[order]
+        bounds = (np.flatnonzero(codes[1:] != codes[:-1]) + 1).tolist()
+        for start, end in zip([0] + bounds, bounds + [len(codes)]):
+            self.added.setdefault(int(codes[start]), []).append(new[start:end])
+
+    def data(self) -> bytes:
+        """ Get the sequence after the merges so far"""
+
+        return self.values[self.values < 256].astype(np.uint8).tobytes()
 
-    return value
 
 class BPE():
     """
@@ -15,23 +151,45 @@ class BPE():
         and replacing the most common pair with a single, unused byte.
 
     -   This process is repeated until we either run out of available bytes,
-        or there are no more frequent pairs (Max frequency = 1)
+        or there are no more frequent pairs (no pair appears twice)
 
     -   Since a single byte can represent 256 characters, we build a list
         of reserved and available characters
     
     -   The resulting map is appended to the output file, to enable a 
         lossless file decompression
+
+    -   With a block size, the text is split into blocks compressed on their
+        own, each with its own map, in a pool of processes (the v2 format,
+        see XIP2_MAGIC). An index at the end of the file gives where each
+        block starts in the text and in the file, so one block can be
+        decompressed without the others
     
     Methods:
     --------
-    - compress(text: str):
+    - compress(text: str, file_path: str, iterations: int, block_size: int, workers: int):
         Method for compressing an input string and saving the output to a file
         Returns: void
 
-    - decompress(filename: str):
-        Method for loading a file and decompressing it back to text
+    - decompress(filename: str, workers: int, output_path: str):
+        Method for loading a file and decompressing it back to text, or into the file at output_path
         Returns: str
+
+    - iter_decompress(filename: str, chunk_size: int):
+        Method for decompressing a file piece by piece, in bounded memory
+        Returns: generator of str
+
+    - decompress_at(filename: str, offset: int):
+        Method for decompressing only the block of a v2 file holding a byte of the text
+        Returns: tuple of (int, str)
+
+    - encode(data: bytes, iterations: int):
+        Compress bytes into a lookup table length, the compressed bytes and the lookup table
+        Returns: bytes
+
+    - decode(data: bytes):
+        Decompress bytes written by encode
+        Returns: bytes
     """
 
     def __init__(self):
@@ -39,7 +197,6 @@ class BPE():
         self.__original_file_data: bytes = None
         self.__unique_file_data = []
         self.__available_characters = []
-        self.__frequencies = [0] * 256 * 256
         self.__all_bytes = [i.to_bytes() for i in range(256)]
 
     def __get_replacement(self) -> bytes:
@@ -51,36 +208,43 @@ class BPE():
         replacement = self.__available_characters.pop(0)
         return replacement.to_bytes()
 
-    def __find_original(self, b: bytes, table):
-        """Check if the byte is in the lookup table and get the original byte before decompression"""
+    def __build_expansions(self, table):
+        """Get the original bytes of every byte value from the lookup table, a list of 256 bytes.
+        Each replacement is expanded once its pair is, so every expansion is built only once.
+        Replacements that lead back to themselves can not be expanded and are None"""
 
-        if b in table:
-            b1, b2 = table.get(b)
-            return self.__find_original(b1.to_bytes(), table) + self.__find_original(b2.to_bytes(), table)
-        else:
-            return b
+        expansions = list(self.__all_bytes)
+        unresolved = {key[0]: (value[0], value[1]) for key, value in table.items()}
 
-    def __rebuild_replacement_dict(self, data: bytes):
-        """Reconstruct the lookup table from the data in the compressed file"""
+        while unresolved:
+            resolved = [b for b, (b1, b2) in unresolved.items() if b1 not in unresolved and b2 not in unresolved]
+            if not resolved:
+                break
+            for b in resolved:
+                b1, b2 = unresolved.pop(b)
+                expansions[b] = expansions[b1] + expansions[b2]
 
-        byte_len = data[0]
-        table_chunk = data[(-3 * byte_len):]
+        for b in unresolved:
+            expansions[b] = None
+        return expansions
+
+    def __rebuild_replacement_dict(self, byte_len: int, table_chunk: bytes):
+        """Reconstruct the lookup table from the data in the compressed file"""
 
         table = CustomDict()
         for i in range(0, 3 * byte_len, 3):
             table.set(table_chunk[i].to_bytes(), table_chunk[i + 1].to_bytes() + table_chunk[i + 2].to_bytes())
         return table
 
-    def compress(self, text: str, file_path, iterations = None):
-        """Convert text to binary to compress it"""
-        self.__original_file_data = bytearray(text, "utf-8")
-        self.__unique_file_data = reduce(lambda l, x: l.append(x) or l if x not in l else l, self.__original_file_data, [])
+    def encode(self, data: bytes, iterations = None) -> bytes:
+        """Compress bytes, the whole of a v1 file or one block of a v2 file"""
+        self.__replacement_dict = CustomDict()
+        self.__original_file_data = bytearray(data)
+        # Bytes in the order they first appear
+        self.__unique_file_data = list(dict.fromkeys(self.__original_file_data))
         self.__available_characters = [c for c in range(256) if c not in self.__unique_file_data]
 
-        # Placeholder for the most frequent object in the last loop
-        highest_frequency = 0
-        data_len = len(self.__original_file_data)
-        compressed_data = self.__original_file_data
+        pairs = Byte_Pairs(self.__original_file_data)
         _iter = 0
         iterate = True
         if iterations == "":
@@ -88,16 +252,7 @@ class BPE():
         elif iterations != "" and iterations != None:
             iterations = int(iterations)
 
-        # Break if file cannot be compressed further
-        while (highest_frequency != 1 and iterate):
-            # Loop through the data and count frequencies
-            self.__frequencies = [0] * 256 * 256
-            for i in range(data_len - 1):
-                first_iter = compressed_data[i]
-                second_iter = compressed_data[i + 1]
-                index = first_iter * 256 + second_iter
-                self.__frequencies[index] += 1
-
+        while (iterate):
             # Try to find a replacement byte from the available characters
             try:
                 replacement = self.__get_replacement()
@@ -105,13 +260,12 @@ class BPE():
                 print(e)
                 break
 
-            max_val = 0
-            index_max = 0 # Index of most frequent pair
-            for i in range(len(self.__frequencies)):
-                if self.__frequencies[i] > max_val:
-                    max_val = self.__frequencies[i]
-                    index_max = i
-            highest_frequency = self.__frequencies[index_max] # Count of pair in data
+            # Index of most frequent pair, the first one on ties
+            index_max, highest_frequency = pairs.most_frequent()
+            # Break if file cannot be compressed further, replacing a pair
+            # seen once would only make the lookup table longer
+            if highest_frequency < 2:
+                break
 
             first = (index_max // 256)
             second = (index_max % 256)
@@ -119,40 +273,215 @@ class BPE():
             # Add the chosen byte to the lookup table
             self.__replacement_dict.set(replacement, highest_occuring_pair)
 
-            # Replace two bytes with a single byte
-            compressed_data = compressed_data.replace(highest_occuring_pair, replacement)
-            data_len = len(compressed_data)
+            # Replace two bytes with a single byte, only the counts of the
+            # pairs around each replacement change
+            pairs.merge(first, second, replacement[0])
             if iterations != None:
                 _iter += 1
                 iterate = _iter < iterations
 
-        replacement_length = (len(self.__replacement_dict)).to_bytes()
+        # Length of the bytes used for compression, the compressed bytes,
+        # then the lookup table as overhead at the end
+        return b"".join([(len(self.__replacement_dict)).to_bytes(), pairs.data()]
+                        + [key + value for key, value in self.__replacement_dict.items_iter()])
 
-        with open(file=file_path+".xip", mode="wb") as compressed_file:
-            # Write length of the bytes used for compression
-            compressed_file.write(replacement_length)
-            compressed_file.write(compressed_data)
+    def __expand(self, expansions, data: bytes) -> bytes:
+        """Replace each byte in the compressed data by its expansion"""
 
-            # Add the lookup table as overhead at the end of the file
-            for key, value in self.__replacement_dict.items_iter():
-                compressed_file.write(key + value)
+        try:
+            return b"".join(map(expansions.__getitem__, data))
+        except TypeError:
+            raise ValueError("The lookup table of the compressed file has a replacement that leads back to itself")
+
+    def __iter_expanded(self, file, start: int, end: int, chunk_size: int):
+        """Decompress the bytes written by encode between start and end of a binary file,
+        reading chunk_size compressed bytes at a time"""
+
+        # Use the redundant information to construct dict before decompression
+        file.seek(start)
+        byte_len = file.read(1)[0]
+        data_end = end - 3 * byte_len
+        file.seek(data_end)
+        expansions = self.__build_expansions(self.__rebuild_replacement_dict(byte_len, file.read(3 * byte_len)))
+
+        file.seek(start + 1)
+        position = start + 1
+        while position < data_end:
+            data = file.read(min(chunk_size, data_end - position))
+            position += len(data)
+            yield self.__expand(expansions, data)
+
+    def __iter_decompressed(self, file, chunk_size: int):
+        """Decompress a binary file of either format, see __iter_expanded"""
+
+        size = file.seek(0, 2)
+        file.seek(0)
+        if file.read(len(XIP2_MAGIC)) != XIP2_MAGIC:
+            yield from self.__iter_expanded(file, 0, size, chunk_size)
+            return
+
+        file.seek(-8, 2)
+        _, block_offsets = read_block_index(file.read(8), file, size - 8)
+        for start, end in zip(block_offsets, block_offsets[1:]):
+            yield from self.__iter_expanded(file, start, end, chunk_size)
+
+    def decode(self, data: bytes) -> bytes:
+        """Decompress bytes written by encode"""
+
+        # Use the redundant information to construct dict before decompression
+        byte_len = data[0]
+        reconstruction_dict = self.__rebuild_replacement_dict(byte_len, data[(-3 * byte_len):])
+        data_len = len(data) - len(reconstruction_dict) * 3
+
+        # Expand every byte value once, then replace each byte in the compressed data by its expansion
+        expansions = self.__build_expansions(reconstruction_dict)
+        return self.__expand(expansions, data[1:data_len])
+
+    def compress(self, text: str, file_path, iterations = None, block_size = None, workers = None):
+        """Convert text to binary to compress it, in blocks of block_size bytes in the v2 format if given"""
+        data = text.encode("utf-8")
+
+        with open(file=file_path+".xip", mode="wb") as compressed_file:
+            if block_size is None:
+                compressed_file.write(self.encode(data, iterations))
+            else:
+                write_blocks(compressed_file, data, block_size, iterations, workers)
             print("Compressed!")
 
-    def decompress(self, filename: str):
-        """ Decompress the file back to its original format """
-        
+    def decompress(self, filename: str, workers = None, output_path = None):
+        """ Decompress the file back to its original format, the blocks of a v2 file in a pool of processes.
+        With output_path, the text is written to that file piece by piece instead, see iter_decompress """
+
+        if output_path is not None:
+            with open(file=filename, mode="rb") as file_binary, open(file=output_path, mode="wb") as output:
+                for data in self.__iter_decompressed(file_binary, DECOMPRESS_CHUNK_SIZE):
+                    output.write(data)
+            print("Decompressed!")
+            return None
+
         with open(file=filename, mode="rb") as file_binary:
             compressed_file_data = file_binary.read()
 
-        decompressed_data = []
+        if compressed_file_data.startswith(XIP2_MAGIC):
+            original_offsets, block_offsets = read_block_index(compressed_file_data[-8:], compressed_file_data)
+            blocks = [compressed_file_data[start:end] for start, end in zip(block_offsets, block_offsets[1:])]
+            decompressed_data = b"".join(map_blocks(decompress_block, blocks, workers))
+        else:
+            decompressed_data = self.decode(compressed_file_data)
 
-        # Use the redundant information to construct dict before decompression
-        reconstruction_dict = self.__rebuild_replacement_dict(compressed_file_data)
-        data_len = len(compressed_file_data) - len(reconstruction_dict) * 3
+        print("Decompressed!")
+        return decompressed_data.decode("utf8")
 
-        # Iterate through every file in the compressed file and find every byte in the lookup table recursively
-        for i in range(1, data_len):
-            decompressed_data.append(self.__find_original(compressed_file_data[i].to_bytes(), reconstruction_dict))
+    def iter_decompress(self, filename: str, chunk_size = DECOMPRESS_CHUNK_SIZE):
+        """ Decompress the file as pieces of text, expanding chunk_size compressed bytes at a time,
+        so memory stays bounded whatever the size of the file and the first piece comes right away.
+        Characters cut between two pieces of bytes are kept for the next piece of text """
 
-        print("Decompressed!")
-        return b"".join(decompressed_data).decode("utf8")
\ No newline at end of file
+        decoder = codecs.getincrementaldecoder("utf8")()
+        with open(file=filename, mode="rb") as file_binary:
+            for data in self.__iter_decompressed(file_binary, chunk_size):
+                text = decoder.decode(data)
+                if text:
+                    yield text
+        # Fails on a character cut at the end
+        decoder.decode(b"", final=True)
+
+    def decompress_at(self, filename: str, offset: int):
+        """ Decompress only the block of a v2 file that holds the byte at offset in the UTF-8 text.
+        Returns the offset where the block starts in the text and the text of the block """
+
+        with open(file=filename, mode="rb") as file_binary:
+            if file_binary.read(len(XIP2_MAGIC)) != XIP2_MAGIC:
+                raise ValueError("Only files compressed in blocks can be decompressed in part")
+
+            size = file_binary.seek(-8, 2)
+            original_offsets, block_offsets = read_block_index(file_binary.read(8), file_binary, size)
+            if not 0 <= offset < original_offsets[-1]:
+                raise ValueError(f"Offset {offset} is outside the text of {original_offsets[-1]} bytes")
+
+            block = bisect.bisect_right(original_offsets, offset) - 1
+            file_binary.seek(block_offsets[block])
+            data = file_binary.read(block_offsets[block + 1] - block_offsets[block])
+
+        return original_offsets[block], self.decode(data).decode("utf8")
+
+
+def find_block_cuts(data: bytes, block_size: int):
+    """Split bytes into blocks of about block_size bytes, cutting UTF-8 text only between characters.
+    Returns the offsets of the cuts, starting with 0 and ending with len(data)"""
+
+    cuts = [0]
+    while cuts[-1] + block_size < len(data):
+        cut = cuts[-1] + block_size
+        # Move back to the first byte of a character
+        while data[cut] & 0xC0 == 0x80:
+            cut -= 1
+        cuts.append(cut)
+    if len(data) > 0:
+        cuts.append(len(data))
+    return cuts
+
+
+def compress_block(data: bytes, iterations = None) -> bytes:
+    """ Compress one block of a v2 file, run by the worker processes. The limit message is not printed """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return BPE().encode(data, iterations)
+
+
+def decompress_block(data: bytes) -> bytes:
+    """ Decompress one block of a v2 file, run by the worker processes """
+
+    return BPE().decode(data)
+
+
+def map_blocks(function, blocks, workers = None, *arguments):
+    """ Run function on every block in a pool of workers processes, one per CPU by default.
+    A single block or a single worker is run in this process. Returns the results in order """
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(blocks) <= 1:
+        return [function(block, *arguments) for block in blocks]
+
+    with ProcessPoolExecutor(min(workers, len(blocks))) as executor:
+        return list(executor.map(function, blocks, *[[argument] * len(blocks) for argument in arguments]))
+
+
+def write_blocks(file, data: bytes, block_size: int, iterations = None, workers = None):
+    """ Write bytes compressed in blocks in the v2 format:
+    the magic bytes, the blocks one after the other, each written by BPE.encode,
+    then the index: the offsets of the blocks in the text and in the file, with the end of each
+    as last offset, as 64-bit little-endian integers, and last the number of blocks """
+
+    # A block holds at least one UTF-8 character
+    if block_size < 4:
+        raise ValueError("The block size must be at least 4 bytes")
+
+    cuts = find_block_cuts(data, block_size)
+    blocks = map_blocks(compress_block, [data[start:end] for start, end in zip(cuts, cuts[1:])], workers, iterations)
+
+    file.write(XIP2_MAGIC)
+    block_offsets = [len(XIP2_MAGIC)]
+    for block in blocks:
+        file.write(block)
+        block_offsets.append(block_offsets[-1] + len(block))
+
+    file.write(np.array(cuts + block_offsets, dtype="<u8").tobytes())
+    file.write(len(blocks).to_bytes(8, "little"))
+
+
+def read_block_index(footer: bytes, source, size = None):
+    """ Read the index of a v2 file, see write_blocks, given its last 8 bytes and either the whole file,
+    or the file object and its size without the last 8 bytes.
+    Returns the offsets of the blocks in the text and in the file, each with the end as last offset """
+
+    count = int.from_bytes(footer, "little")
+    length = 16 * (count + 1)
+    if size is None:
+        index = source[-8 - length:-8]
+    else:
+        source.seek(size - length)
+        index = source.read(length)
+
+    offsets = np.frombuffer(index, dtype="<u8").tolist()
+    return offsets[:count + 1], offsets[count + 1:]
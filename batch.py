@@ -0,0 +1,230 @@
+"""
+Headless batch processing of XML files, running the same operations as the
+GUI over many files at once in a pool of worker processes.
+
+Usage:
+    python batch.py minify exports/
+    python batch.py xml2json "exports/**/*.xml" --workers 8
+    python batch.py xml2jsonl exports/ --record-path users/user
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from formatting import minify_stream, prettify_stream
+from xml2json import xml2json, xml2jsonl
+from correct_xml import correct_xml_stream
+from BPE import BPE
+
+# Suffix that replaces ".xml" in each output file name, per operation.
+OUTPUT_SUFFIXES = {
+    "minify": ".min.xml",
+    "prettify": ".pretty.xml",
+    "xml2json": ".json",
+    "xml2jsonl": ".jsonl",
+    "correct_xml": ".corrected.xml",
+    "compress": ".xip",
+}
+
+def output_path(path, operation):
+    """
+    Gets the path of the file written next to the input by an operation.
+
+    Parameters:
+    ----------
+    - path (str):
+        Input file path.
+    - operation (str):
+        One of the keys of OUTPUT_SUFFIXES.
+
+    Returns:
+    --------
+    str:
+        Output file path.
+    """
+
+    base, _ = os.path.splitext(path)
+    return base + OUTPUT_SUFFIXES[operation]
+
+def find_input_files(patterns):
+    """
+    Expands directories and glob patterns into a sorted list of files.
+    Directories contribute their *.xml files. Outputs of a previous batch
+    run are left out of directories and glob matches, but not of file
+    paths given as they are.
+
+    Parameters:
+    ----------
+    - patterns (list of str):
+        Directories, file paths or glob patterns.
+
+    Returns:
+    --------
+    list of str:
+        Input file paths, without duplicates.
+    """
+
+    outputs = tuple(suffix for suffix in OUTPUT_SUFFIXES.values() if suffix.endswith(".xml"))
+    files = set()
+    for pattern in patterns:
+        if (os.path.isdir(pattern)):
+            for path in glob.glob(os.path.join(pattern, "*.xml")):
+                if (not path.endswith(outputs)):
+                    files.add(path)
+        elif (glob.has_magic(pattern)):
+            files.update(path for path in glob.glob(pattern, recursive=True)
+                         if os.path.isfile(path) and not path.endswith(outputs))
+        elif (os.path.isfile(pattern)):
+            files.add(pattern)
+    return sorted(files)
+
+def process_file(path, operation, tab_length=4, iterations=None, record_path=None):
+    """
+    Runs one operation on one file and writes the result next to it.
+    Runs inside a worker process.
+
+    Parameters:
+    ----------
+    - path (str):
+        Input file path.
+    - operation (str):
+        One of the keys of OUTPUT_SUFFIXES.
+    - tab_length (int, optional):
+        Indentation for prettify and xml2json. (Default is 4)
+    - iterations (int, optional):
+        Maximum BPE iterations for compress. (Default is None, no limit)
+    - record_path (str, optional):
+        Path of the records for xml2jsonl, e.g. "users/user". (Default is None)
+
+    Returns:
+    --------
+    tuple of (str, int, float):
+        Output path, input size in bytes and time taken in seconds.
+    """
+
+    destination = output_path(path, operation)
+    size = os.path.getsize(path)
+    start = time.perf_counter()
+
+    if (operation == "minify"):
+        with open(path, "rb") as source, open(destination, "w", encoding="utf-8") as sink:
+            for chunk in minify_stream(source):
+                sink.write(chunk)
+
+    elif (operation == "prettify"):
+        with open(path, "rb") as source, open(destination, "w", encoding="utf-8") as sink:
+            prettify_stream(source, sink, tab_length)
+
+    elif (operation == "correct_xml"):
+        with open(path, "rb") as source, open(destination, "w", encoding="utf-8") as sink:
+            correct_xml_stream(source, sink)
+
+    elif (operation == "xml2jsonl"):
+        with open(path, "rb") as source, open(destination, "w", encoding="utf-8") as sink:
+            xml2jsonl(source, sink, record_path)
+
+    else:
+        with open(path, encoding="utf-8") as file:
+            text = file.read()
+
+        if (operation == "compress"):
+            # BPE reports progress with print, keep worker output clean
+            with contextlib.redirect_stdout(io.StringIO()):
+                BPE().compress(text, destination[:-len(".xip")], iterations)
+        else:
+            result = xml2json(text, tab_length)
+            with open(destination, "w", encoding="utf-8") as file:
+                file.write(result)
+
+    return destination, size, time.perf_counter() - start
+
+def run_batch(files, operation, workers=None, tab_length=4, iterations=None, record_path=None,
+              out=sys.stdout):
+    """
+    Processes files in a process pool, printing one line per file as it
+    finishes and a throughput summary at the end.
+
+    Parameters:
+    ----------
+    - files (list of str):
+        Input file paths.
+    - operation (str):
+        One of the keys of OUTPUT_SUFFIXES.
+    - workers (int, optional):
+        Number of worker processes. (Default is None, one per CPU)
+    - tab_length (int, optional):
+        Indentation for prettify and xml2json. (Default is 4)
+    - iterations (int, optional):
+        Maximum BPE iterations for compress. (Default is None, no limit)
+    - record_path (str, optional):
+        Path of the records for xml2jsonl. (Default is None)
+    - out (file-like object, optional):
+        Where the report is printed. (Default is sys.stdout)
+
+    Returns:
+    --------
+    int:
+        Number of files that failed.
+    """
+
+    failed = 0
+    total_size = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_file, path, operation, tab_length, iterations, record_path): path
+                   for path in files}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                destination, size, elapsed = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"FAILED {path}: {e}", file=out)
+                continue
+
+            total_size += size
+            rate = size / 1e6 / elapsed if elapsed > 0 else float("inf")
+            print(f"{path} -> {destination}: {elapsed:.3f} s, {rate:.2f} MB/s", file=out)
+
+    elapsed = time.perf_counter() - start
+    rate = total_size / 1e6 / elapsed if elapsed > 0 else float("inf")
+    print(f"{operation}: {len(files) - failed} files, {total_size / 1e6:.2f} MB "
+          f"in {elapsed:.3f} s ({rate:.2f} MB/s), {failed} failed", file=out)
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a Parsiewer operation over many XML files.")
+    parser.add_argument("operation", choices=sorted(OUTPUT_SUFFIXES),
+                        help="operation to run on every file")
+    parser.add_argument("inputs", nargs="+",
+                        help="directories, files or glob patterns (** is recursive)")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of worker processes (default: one per CPU)")
+    parser.add_argument("-t", "--tab-length", type=int, default=4,
+                        help="indentation for prettify and xml2json (default: 4)")
+    parser.add_argument("-i", "--iterations", type=int, default=None,
+                        help="maximum BPE iterations for compress (default: no limit)")
+    parser.add_argument("-r", "--record-path", default=None,
+                        help="path of the records for xml2jsonl, e.g. users/user")
+    args = parser.parse_args(argv)
+
+    if (args.operation == "xml2jsonl" and not args.record_path):
+        parser.error("xml2jsonl needs --record-path")
+
+    files = find_input_files(args.inputs)
+    if (not files):
+        parser.error("no input files found")
+
+    failed = run_batch(files, args.operation, args.workers, args.tab_length, args.iterations,
+                       args.record_path)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Measures BPE.compress across file sizes, on sample_more_users_network.xml
+repeated to each size: the time one round of pair counting takes with
+NumPy against the pure Python loop it replaced, compression with the
+pair counts kept up to date between merges against recounting them all
+after each merge, and decompression, whole or piece by piece into a file, then the same with the text compressed
+in blocks in a pool of processes and one block decompressed on its own.
+
+Usage:
+    python benchmarks/bpe_benchmark.py [--sizes 1 5 20] [--iterations 200] [--block-size 1] [--workers 4]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from BPE import BPE
+
+
+def count_pairs_python(data):
+    """The per-byte counting loop BPE.compress used before NumPy."""
+
+    frequencies = [0] * 256 * 256
+    for i in range(len(data) - 1):
+        frequencies[data[i] * 256 + data[i + 1]] += 1
+    return frequencies
+
+
+def count_pairs_numpy(data):
+    array = np.frombuffer(data, dtype=np.uint8)
+    return np.bincount(array[:-1].astype(np.uint16) * 256 + array[1:], minlength=256 * 256)
+
+
+def compress_recount(data, iterations):
+    """The merge loop of BPE.compress with every pair counted again after each merge."""
+
+    available = [c for c in range(256) if c not in set(data)]
+    for replacement in available[:iterations]:
+        frequencies = count_pairs_numpy(data)
+        index = int(np.argmax(frequencies))
+        if frequencies[index] < 2:
+            break
+        data = data.replace(bytes((index // 256, index % 256)), bytes((replacement,)))
+    return bytes(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 5, 20],
+                        help='input sizes in MB (default 1 5 20)')
+    parser.add_argument('--iterations', type=int, default=200,
+                        help='BPE iterations per compression (default 200)')
+    parser.add_argument('--block-size', type=float, default=1,
+                        help='block size in MB for compression in blocks (default 1)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes for compression in blocks (default one per CPU)')
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, 'test_files', 'sample_more_users_network.xml')) as file:
+        sample = file.read()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'document')
+        for size in args.sizes:
+            text = (sample * (int(size * 1e6) // len(sample) + 1))[:int(size * 1e6)]
+            data = bytearray(text, 'utf-8')
+
+            start = time.perf_counter()
+            count_pairs_python(data)
+            python_time = time.perf_counter() - start
+            start = time.perf_counter()
+            count_pairs_numpy(data)
+            numpy_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            expected = compress_recount(data, args.iterations)
+            recount_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                BPE().compress(text, path, args.iterations)
+            compress_time = time.perf_counter() - start
+            with open(path + '.xip', 'rb') as file:
+                compressed = file.read()
+            same = "same output" if compressed[1:len(expected) + 1] == expected else "OUTPUT DIFFERS"
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                restored = BPE().decompress(path + '.xip')
+            decompress_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                BPE().decompress(path + '.xip', output_path=path + '.out')
+            stream_time = time.perf_counter() - start
+            with open(path + '.out', encoding='utf-8') as file:
+                streamed = file.read() == text
+
+            print(f"{size:g} MB: pair count {python_time:.2f} s in Python, {numpy_time * 1000:.1f} ms with NumPy "
+                  f"({python_time / numpy_time:.0f}x)")
+            print(f"    compress, up to {args.iterations} merges: recounting {recount_time:.2f} s, "
+                  f"incremental {compress_time:.2f} s ({recount_time / compress_time:.1f}x, "
+                  f"{len(data) / 1e6 / compress_time:.1f} MB/s), ratio {len(compressed) / len(data):.2f}, {same}")
+            print(f"    decompress: {decompress_time:.2f} s ({len(data) / 1e6 / decompress_time:.1f} MB/s), "
+                  f"{'round trip ok' if restored == text else 'ROUND TRIP FAILED'}")
+            print(f"    decompress into a file: {stream_time:.2f} s ({len(data) / 1e6 / stream_time:.1f} MB/s), "
+                  f"{'round trip ok' if streamed else 'ROUND TRIP FAILED'}")
+
+            block_size = int(args.block_size * 1e6)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                BPE().compress(text, path, args.iterations, block_size, args.workers)
+            blocks_compress_time = time.perf_counter() - start
+            blocks_ratio = os.path.getsize(path + '.xip') / len(data)
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                restored = BPE().decompress(path + '.xip', args.workers)
+            blocks_decompress_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            block_start, block_text = BPE().decompress_at(path + '.xip', len(data) // 2)
+            block_time = time.perf_counter() - start
+            block_ok = data[block_start:block_start + len(block_text.encode('utf-8'))] == block_text.encode('utf-8')
+
+            print(f"    in blocks of {args.block_size:g} MB: compress {blocks_compress_time:.2f} s "
+                  f"({compress_time / blocks_compress_time:.1f}x), ratio {blocks_ratio:.2f}, "
+                  f"decompress {blocks_decompress_time:.2f} s, "
+                  f"{'round trip ok' if restored == text else 'ROUND TRIP FAILED'}")
+            print(f"    one block at the middle: {block_time * 1000:.1f} ms, "
+                  f"{'same bytes' if block_ok else 'BLOCK DIFFERS'}")
+
+
+if __name__ == '__main__':
+    main()
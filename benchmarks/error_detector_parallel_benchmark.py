@@ -0,0 +1,63 @@
+"""
+Compares detect_errors() with detect_errors_parallel() for a growing
+number of worker processes, on one well-formed document holding the
+<user> records of sample_more_users_network.xml repeated many times.
+
+Usage:
+    python benchmarks/error_detector_parallel_benchmark.py [--scale 20000] [--workers 2 4 8]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from xml_error_detector import detect_errors, detect_errors_parallel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=int, default=20000,
+                        help='number of copies of the records (default 20000)')
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='worker counts to try (default 2, 4, ... up to the CPU count)')
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    worker_counts = args.workers or [2 ** i for i in range(1, cpus.bit_length() + 1) if 2 ** i <= max(cpus, 2)]
+
+    with open(os.path.join(ROOT, 'test_files', 'sample_more_users_network.xml')) as file:
+        text = file.read()
+    # the records repeated inside the one top element
+    start = text.index('<user>')
+    end = text.rindex('</users>')
+    text = text[:start] + text[start:end] * args.scale + text[end:]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'document.xml')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"input: {size_mb:.1f} MB, {cpus} CPUs")
+
+        begin = time.perf_counter()
+        expected = [error.message() for error in detect_errors(text)]
+        serial_time = time.perf_counter() - begin
+        del text
+        print(f"detect_errors: {serial_time:.2f} s ({size_mb / serial_time:.1f} MB/s)")
+
+        for workers in worker_counts:
+            begin = time.perf_counter()
+            result = [error.message() for error in detect_errors_parallel(path, workers=workers)]
+            elapsed = time.perf_counter() - begin
+            same = "same errors" if result == expected else "ERRORS DIFFER"
+            print(f"detect_errors_parallel, {workers} workers: {elapsed:.2f} s "
+                  f"({size_mb / elapsed:.1f} MB/s, {serial_time / elapsed:.1f}x), {same}")
+
+
+if __name__ == '__main__':
+    main()
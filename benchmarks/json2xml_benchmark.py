@@ -0,0 +1,78 @@
+"""
+Measures the throughput of json2xml against xml2json, the forward
+direction, on generic_syntactically_correct2.xml repeated many times,
+and the peak memory of converting the JSON file while reading it.
+
+Usage:
+    python benchmarks/json2xml_benchmark.py [--scale 10]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from json2xml import json2xml_stream
+from xml2json import xml2json, element_to_object
+from xml_document import XML_Document
+
+
+class Null_Sink:
+    def write(self, text):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=int, default=10,
+                        help='number of copies of the test file (default 10)')
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, 'test_files', 'generic_syntactically_correct2.xml')) as file:
+        text = '<root>' + file.read() * args.scale + '</root>'
+    xml_mb = len(text.encode('utf-8')) / 1e6
+
+    start = time.perf_counter()
+    xml2json(text)
+    forward_time = time.perf_counter() - start
+
+    # XML2JSON does not escape text content, so the JSON is made with the
+    # json module from the same values instead
+    json_text = json.dumps(element_to_object(XML_Document(text).root), indent=4, ensure_ascii=False)
+    del text
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'document.json')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(json_text)
+        json_mb = os.path.getsize(path) / 1e6
+        del json_text
+
+        times = {}
+        for label, tab_length in (("minified", None), ("prettified", 4)):
+            start = time.perf_counter()
+            with open(path, 'rb') as source:
+                json2xml_stream(source, Null_Sink(), tab_length)
+            times[label] = time.perf_counter() - start
+
+        tracemalloc.start()
+        with open(path, 'rb') as source:
+            json2xml_stream(source, Null_Sink())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    print(f"XML: {xml_mb:.1f} MB, JSON: {json_mb:.1f} MB")
+    print(f"xml2json: {forward_time:.2f} s ({xml_mb / forward_time:.1f} MB/s of XML)")
+    for label, elapsed in times.items():
+        print(f"json2xml, {label}: {elapsed:.2f} s ({json_mb / elapsed:.1f} MB/s of JSON)")
+    print(f"json2xml peak memory while streaming: {peak / 1e6:.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Compares the throughput of formatting.minify against the regex cascade it
+replaced, on generic_syntactically_correct2.xml repeated many times.
+
+Usage:
+    python benchmarks/minify_benchmark.py [--scale 100] [--repeat 3]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from formatting import minify
+
+
+def regex_minify(text):
+    """The previous minify implementation, one re.sub pass per rule."""
+
+    text = re.sub(r'<\s*!\s*-\s*-\s*[\S\s]+?-\s*-\s*>', r'', text)
+    text = re.sub(r'\A\s+|(?<=>)\s+(?=<)|\s+\Z', r'', text)
+    text = re.sub(r'\s+>', r'>', text)
+    text = re.sub(r'\s+/>', r'/>', text)
+    text = re.sub(r'<\s+', r'<', text)
+    text = re.sub(r'</\s+', r'</', text)
+    text = re.sub(r'(<\S+)(\s+)', r'\g<1> ', text)
+    text = re.sub(r'(\s*=\s*)(?=[^<]+>)', r'=', text)
+    text = re.sub(r'\"\s+(?=[^<]+>)', r'" ', text)
+    text = re.sub(r"\'\s+(?=[^<]+>)", r"' ", text)
+    text = re.sub(r'\s+<', r'<', text)
+    text = re.sub(r'>\s+', r'>', text)
+    return text
+
+
+def best_time(function, text, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=int, default=100,
+                        help='number of copies of the test file (default 100)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per implementation, best is reported (default 3)')
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, 'test_files', 'generic_syntactically_correct2.xml')) as file:
+        text = file.read() * args.scale
+    size_mb = len(text.encode('utf-8')) / 1e6
+
+    # output must match byte for byte on every test file
+    test_dir = os.path.join(ROOT, 'test_files')
+    for name in sorted(os.listdir(test_dir)):
+        if (name.endswith('.xml')):
+            with open(os.path.join(test_dir, name)) as file:
+                sample = file.read()
+            assert minify(sample) == regex_minify(sample), name
+
+    old_time, old_result = best_time(regex_minify, text, args.repeat)
+    new_time, new_result = best_time(minify, text, args.repeat)
+    assert old_result == new_result
+
+    print(f"input: {size_mb:.1f} MB ({args.scale}x generic_syntactically_correct2.xml)")
+    print(f"regex cascade: {old_time:.2f} s, {size_mb / old_time:.1f} MB/s")
+    print(f"state machine: {new_time:.2f} s, {size_mb / new_time:.1f} MB/s")
+    print(f"speedup: {old_time / new_time:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
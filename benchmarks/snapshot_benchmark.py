@@ -0,0 +1,59 @@
+"""
+Compares loading a tree from a binary snapshot against parsing the XML
+text again, on generic_syntactically_correct2.xml repeated many times.
+
+Usage:
+    python benchmarks/snapshot_benchmark.py [--scale 5] [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from xml_document import XML_Document
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=int, default=5,
+                        help='number of copies of the test file (default 5)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per method, best is reported (default 3)')
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, 'test_files', 'generic_syntactically_correct2.xml')) as file:
+        text = '<root>' + file.read() * args.scale + '</root>'
+    size_mb = len(text.encode('utf-8')) / 1e6
+
+    parse_time, document = best_time(lambda: XML_Document(text), args.repeat)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'document.snap')
+        save_time, _ = best_time(lambda: document.save_snapshot(path), args.repeat)
+        snapshot_mb = os.path.getsize(path) / 1e6
+        load_time, _ = best_time(lambda: XML_Document.from_snapshot(path, text), args.repeat)
+
+    print(f"input: {size_mb:.1f} MB, snapshot: {snapshot_mb:.1f} MB")
+    print(f"parse: {parse_time:.3f} s")
+    print(f"save snapshot: {save_time:.3f} s")
+    print(f"load snapshot: {load_time:.3f} s (checksum included)")
+    print(f"speedup: {parse_time / load_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Reports the memory used per node by the tree XML_Document builds, with the
+compact Element/Attribute classes and interned names against the previous
+plain classes.
+
+Usage:
+    python benchmarks/tree_memory_benchmark.py [--scale 10]
+"""
+
+import argparse
+import os
+import re
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import xml_document
+from formatting import minify
+from xml_document_parts import Element, Attribute
+
+
+class PlainAttribute:
+    """Attribute as it was before, with a per-instance __dict__."""
+
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+
+
+class PlainElement:
+    """Element as it was before, with a per-instance __dict__."""
+
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.children = []
+        self.child_index = None
+        self.child_runs = None
+        self.parent = parent
+        self.attributes = attributes
+        self.content = ""
+
+
+def count_nodes(root):
+    elements = 0
+    attributes = 0
+    stack = [root]
+    while (stack):
+        element = stack.pop()
+        elements += 1
+        attributes += len(element.attributes)
+        for group in element.children:
+            stack.extend(group)
+    return elements, attributes
+
+
+def measure(tokens, element_class, attribute_class, intern):
+    """Builds a tree from tokens, returns (bytes allocated, elements, attributes)."""
+
+    xml_document.Element = element_class
+    xml_document.Attribute = attribute_class
+    xml_document.intern = intern
+    try:
+        tracemalloc.start()
+        root = element_class("root", None, [])
+        root.parent = root
+        for _ in xml_document.parse_events(tokens, [root]):
+            pass
+        allocated, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        xml_document.Element = Element
+        xml_document.Attribute = Attribute
+        xml_document.intern = sys.intern
+
+    return (allocated,) + count_nodes(root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=int, default=10,
+                        help='number of copies of the test file (default 10)')
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, 'test_files', 'generic_syntactically_correct2.xml')) as file:
+        text = '<root>' + file.read() * args.scale + '</root>'
+    tokens = re.findall(r'<[^>]+>|(?<=>)[^<]+(?=<)', minify(text))
+
+    results = [
+        ("before (plain classes)", measure(tokens, PlainElement, PlainAttribute, lambda name: name)),
+        ("after (__slots__ + interned names)", measure(tokens, Element, Attribute, sys.intern)),
+    ]
+
+    for label, (allocated, elements, attributes) in results:
+        nodes = elements + attributes
+        print(f"{label}: {allocated / 1e6:.1f} MB for {elements} elements and "
+              f"{attributes} attributes, {allocated / nodes:.0f} bytes per node")
+
+    before, after = results[0][1][0], results[1][1][0]
+    print(f"reduction: {100 * (1 - after / before):.0f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Compares xml2json() with xml2json_parallel() for a growing number of
+worker processes, on one document holding the <users> records of
+generic_syntactically_correct2.xml repeated many times.
+
+Usage:
+    python benchmarks/xml2json_parallel_benchmark.py [--scale 50] [--workers 2 4 8]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from xml2json import xml2json, xml2json_parallel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=int, default=50,
+                        help='number of copies of the records (default 50)')
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='worker counts to try (default 2, 4, ... up to the CPU count)')
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    worker_counts = args.workers or [2 ** i for i in range(1, cpus.bit_length() + 1) if 2 ** i <= max(cpus, 2)]
+
+    with open(os.path.join(ROOT, 'test_files', 'generic_syntactically_correct2.xml')) as file:
+        text = file.read()
+    # the records repeated inside the one top element
+    start = text.index('<users>')
+    end = text.rindex('</manyusers>')
+    text = text[:start] + text[start:end] * args.scale + text[end:]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'document.xml')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"input: {size_mb:.1f} MB, {cpus} CPUs")
+
+        begin = time.perf_counter()
+        expected = xml2json(text)
+        serial_time = time.perf_counter() - begin
+        del text
+        print(f"xml2json: {serial_time:.2f} s ({size_mb / serial_time:.1f} MB/s)")
+
+        for workers in worker_counts:
+            begin = time.perf_counter()
+            result = xml2json_parallel(path, workers=workers)
+            elapsed = time.perf_counter() - begin
+            same = "same output" if result == expected else "OUTPUT DIFFERS"
+            print(f"xml2json_parallel, {workers} workers: {elapsed:.2f} s "
+                  f"({size_mb / elapsed:.1f} MB/s, {serial_time / elapsed:.1f}x), {same}")
+
+
+if __name__ == '__main__':
+    main()
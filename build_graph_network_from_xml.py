@@ -82,4 +82,69 @@ def build_graph_netowrk_from_xml(xml_text):
                     bttemp.set('topics', topics)
                     social_graph_instance.add_post(user_id, bttemp)
 
-    return social_graph_instance
\ No newline at end of file
+    return social_graph_instance
+
+
+def build_graph_network_from_document(document):
+    """
+    Build a social graph network from an already parsed XML document, so
+    the text does not have to be searched again.
+
+    Parameters:
+    - document (XML_Document or Incremental_XML_Document): Parsed XML
+      representation of the social network.
+
+    Returns:
+    - SocialGraph: An instance of the SocialGraph class representing the social network.
+
+    Example:
+    >>> document = Incremental_XML_Document("<users>...</users>")
+    >>> social_graph_instance = build_graph_network_from_document(document)
+    """
+    def child_content(element, name):
+        """
+        Get the content of the first child of element with the given name.
+
+        Returns:
+        - str: The child's content, None if there is no such child.
+        """
+        children = element.get_children(name)
+        return children[0].content if children else None
+
+    # Create a SocialGraph instance
+    social_graph_instance = SocialGraph()
+
+    users = document.root.get_children('users')
+    if users:
+        for user in users[0].get_children('user'):
+            user_id = int(child_content(user, 'id'))
+            user_name = child_content(user, 'name')
+
+            # Add user and corresponding node to the social graph
+            social_graph_instance.add_user(user_id, user_name)
+            social_graph_instance.graph.add_node(user_id)
+
+            # Extract followers information
+            for followers in user.get_children('followers')[:1]:
+                for follower in followers.get_children('follower'):
+                    follower_id = int(child_content(follower, 'id'))
+
+                    # Add follower, corresponding edge, and update social graph
+                    social_graph_instance.graph.add_edge(follower_id, user_id)
+                    social_graph_instance.add_follower(user_id, follower_id)
+
+            # Extract posts information
+            for posts in user.get_children('posts')[:1]:
+                for post in posts.get_children('post'):
+                    post_body = child_content(post, 'body')
+
+                    topics = []
+                    for topics_element in post.get_children('topics')[:1]:
+                        topics = [topic.content for topic in topics_element.get_children('topic') if topic.content]
+
+                    bttemp = CustomDict()
+                    bttemp.set('body', post_body)
+                    bttemp.set('topics', topics)
+                    social_graph_instance.add_post(user_id, bttemp)
+
+    return social_graph_instance
@@ -1,53 +1,395 @@
-import re
-from formatting import minify, prettify
+import io
+import mmap
+import codecs
+from formatting import (minify, iter_tokens, iter_token_spans, Safe_Cut_Finder, prettify_chunks,
+                        TOKEN_PATTERN, SPACE_PATTERN)
+
+# Corrected XML is handed on in pieces of about this many characters.
+OUTPUT_CHUNK_SIZE = 1 << 16
+# Bytes copied at a time when edits are applied to a copy of a file.
+COPY_BLOCK_SIZE = 1 << 24
 
 def correct_xml(xml):
-    xml = minify(xml)
-    stack = []
+    """
+    Corrects the missing opening and closing tags of a syntax-error-free
+    XML string, see iter_corrected().
+
+    Parameters:
+    ----------
+    - xml (str):
+        XML string.
+
+    Returns:
+    --------
+    str:
+        Prettified corrected XML.
+    """
+
+    tokens = (match.group() for match in TOKEN_PATTERN.finditer(minify(xml)))
+    return ''.join(prettify_chunks(iter_corrected(tokens)))
+
+def correct_xml_stream(source, sink, tab_length=4, chunk_size=1 << 16):
+    """
+    Corrects XML read in chunks and writes the result to sink as it goes,
+    keeping only the tags still open in memory, so dumps larger than
+    memory can be fixed. Writes the same text as correct_xml().
+
+    Parameters:
+    ----------
+    - source (str, file-like object or iterable of str/bytes):
+        Syntax-error-free XML, see formatting.iter_text_chunks().
+    - sink (file-like object):
+        Text or binary file to write to. Binary files receive UTF-8.
+    - tab_length (int, optional):
+        Desired tab length (in spaces) for indentation. (Default is 4,
+        None writes the corrected XML minified)
+    - chunk_size (int, optional):
+        Read size for file-like objects. (Default is 65536)
+    """
+
+    binary = (isinstance(sink, (io.RawIOBase, io.BufferedIOBase))
+              or 'b' in getattr(sink, 'mode', ''))
+
+    chunks = iter_corrected(iter_tokens(source, chunk_size))
+    if (tab_length is not None):
+        chunks = prettify_chunks(chunks, tab_length)
+    for text in chunks:
+        sink.write(text.encode('utf-8') if binary else text)
+
+def iter_corrected(tokens):
+    """
+    Corrects a stream of tokens, see iter_repairs(), and writes the
+    corrected XML.
+
+    Parameters:
+    ----------
+    - tokens (iterable of str):
+        Tags and text content of minified XML, as found by TOKEN_PATTERN.
+
+    Returns:
+    --------
+    generator of str:
+        Minified corrected XML, split only between two tags.
+
+    Raises:
+    -------
+    ValueError:
+        If there are no tokens.
+    """
 
-    tokens = re.findall(r'<[^>]+>|(?<=>)[^<]+(?=<)', xml)
-    # flag for checking whether first tag is matched or not (root)
-    # used in looping over the tokens as well.
-    mismatched_first_tag = 1
+    xml = []
+    size = 0
+    # whether the last piece is text content, which must be followed by a
+    # tag in the same chunk
+    after_text = False
 
-    if (tokens[0][1:-1] != tokens[-1][2:-1]):
-        mismatched_first_tag = -len(tokens)
+    for inserted, span in iter_repairs((None, None, token) for token in tokens):
+        if (span is None):
+            xml.append(inserted)
+            break
+        token = span[2]
 
-    xml = [tokens[0]]
+        # between two tags, a safe point to hand the XML so far on
+        if (size >= OUTPUT_CHUNK_SIZE and not after_text and token[0] == '<'):
+            yield ''.join(xml)
+            xml = []
+            size = 0
 
-    for token in tokens[1:-mismatched_first_tag]:
+        if (token[0] == '<'):
+            if (inserted):
+                xml.append(inserted)
+                size += len(inserted)
+            after_text = False
+        else:
+            # text directly after a tag without spaces has its first run of
+            # spaces collapsed, as minify() does to text in that place
+            if (' ' not in xml[-1]):
+                token = SPACE_PATTERN.sub(' ', token, 1)
+            after_text = True
+        xml.append(token)
+        size += len(token)
+
+    yield ''.join(xml)
+
+def iter_repairs(spans):
+    """
+    Decides how to correct a stream of tokens: which tags to insert to
+    close the tags left open, and to give closing tags that match no open
+    tag an opening tag of their own.
+
+    The first token is the root. When the last token closes it, the tags
+    still open are closed right before it, otherwise they and the root
+    are closed at the end. Each token is handled once the next one is
+    read, so the last one is known without reading ahead any further, and
+    only the names of the open tags are kept.
+
+    Parameters:
+    ----------
+    - spans (iterable of tuple of (int, int, str)):
+        Start, end and token for the tags and text content of minified
+        XML, as yielded by formatting.iter_token_spans(). Only the token
+        is read, the offsets are passed on.
+
+    Returns:
+    --------
+    generator of tuple of (str, tuple):
+        For each span in order, the tags to insert right before it, ''
+        if none, then the tags to insert at the end with None as span,
+        unless the last token closes the root.
+
+    Raises:
+    -------
+    ValueError:
+        If there are no tokens.
+    """
+
+    spans = iter(spans)
+    root = next(spans, None)
+    if (root is None):
+        raise ValueError("There are no tags to correct.")
+    yield "", root
+    root_name = root[2][1:-1]
+    stack = []
+
+    span = next(spans, None)
+    while (span is not None):
+        next_span = next(spans, None)
+        token = span[2]
+        if (next_span is None and token[2:-1] == root_name):
+            # the root's closing tag
+            break
+
+        inserted = ""
         if (token[0] == '<' and token[1] != '/'):
-            xml.append(token)
             stack.append(token[1:-1])
 
-        elif (token[0] == '<' and token[1] == '/'):
-            entered_loop = False
-            while(len(stack) > 0 and stack[-1] != token[2:-1]):
-                entered_loop = True
-                xml.append('</' + stack[-1] + '>')
-                if (len(stack) == 1):
-                    xml.append('<' + token[2:-1] + '>')
-                    xml.append(token)
-                stack.pop()
+        elif (token[0] == '<'):
+            name = token[2:-1]
+            if (len(stack) > 0 and stack[-1] != name):
+                # close the open tags up to the one this tag closes, if
+                # there is none it gets an opening tag after them all
+                closing = []
+                while (len(stack) > 0 and stack[-1] != name):
+                    closing.append('</' + stack.pop() + '>')
+                if (len(stack) == 0):
+                    closing.append('<' + name + '>')
+                inserted = ''.join(closing)
 
-            if (len(stack) > 0 and stack[-1] == token[2:-1]):
-                xml.append('</' + stack[-1] + '>')
+            if (len(stack) > 0):
                 stack.pop()
+            elif (not inserted):
+                inserted = '<' + name + '>'
 
-            elif (not entered_loop):
-                xml.append('<' + token[2:-1] + '>')
-                xml.append(token)
+        yield inserted, span
+        span = next_span
 
-        else:
-            xml.append(token)
+    closing = ''.join('</' + name + '>' for name in reversed(stack))
+    if (span is not None):
+        yield closing, span
+    else:
+        yield closing + '</' + root_name + '>', None
+
+def correction_edits(xml):
+    """
+    Finds how to correct an XML string as correct_xml() does, as a list of
+    insertions into the text instead of a new document, so that a few
+    missing tags cost a few edits whatever the size of the text.
+
+    Parameters:
+    ----------
+    - xml (str):
+        Syntax-error-free XML string.
+
+    Returns:
+    --------
+    list of tuple of (int, str):
+        Index in xml and tags to insert there, in increasing order of
+        index. See apply_edits().
+    """
+
+    return collect_edits(iter_token_spans(xml))
+
+def correction_edits_file(path, chunk_size=1 << 16):
+    """
+    Finds how to correct an XML file as correct_xml() does, reading it in
+    chunks, see correction_edits().
+
+    Parameters:
+    ----------
+    - path (str):
+        Path of a syntax-error-free XML file, encoded as UTF-8.
+    - chunk_size (int, optional):
+        Read size in bytes. (Default is 65536)
+
+    Returns:
+    --------
+    list of tuple of (int, str):
+        Byte offset in the file and tags to insert there, in increasing
+        order of offset. See apply_edits_file().
+    """
+
+    with open(path, 'rb') as file:
+        return collect_edits(iter_file_token_spans(file, chunk_size))
+
+def collect_edits(spans):
+    """
+    Internal function that turns the output of iter_repairs() into edits.
+    """
+
+    edits = []
+    end = 0
+    for inserted, span in iter_repairs(spans):
+        if (inserted):
+            edits.append((span[0] if span is not None else end, inserted))
+        if (span is not None):
+            end = span[1]
+    return edits
+
+def iter_file_token_spans(file, chunk_size=1 << 16):
+    """
+    Internal function that tokenizes a binary XML file in chunks, like
+    formatting.iter_token_spans() on its decoded text, with byte offsets.
+    """
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ""
+    # byte offset of pending in the file
+    offset = 0
+    finder = Safe_Cut_Finder()
+
+    while (True):
+        data = file.read(chunk_size)
+        pending += decoder.decode(data, final=not data)
+        # both sides of a safe cut tokenize the same on their own
+        cut = finder.find(pending) if data else len(pending)
+        if (cut):
+            piece = pending[:cut]
+            pending = pending[cut:]
+            if (piece.isascii()):
+                for start, end, token in iter_token_spans(piece):
+                    yield offset + start, offset + end, token
+                offset += len(piece)
+            else:
+                position = 0
+                for start, end, token in iter_token_spans(piece):
+                    offset += len(piece[position:start].encode('utf-8'))
+                    start_offset = offset
+                    offset += len(piece[start:end].encode('utf-8'))
+                    position = end
+                    yield start_offset, offset, token
+                offset += len(piece[position:].encode('utf-8'))
+        if (not data):
+            return
+
+def apply_edits(xml, edits):
+    """
+    Applies insertions such as those of correction_edits() to a string.
+
+    Parameters:
+    ----------
+    - xml (str):
+        Text to edit.
+    - edits (list of tuple of (int, str)):
+        Index and text to insert there, in increasing order of index.
+
+    Returns:
+    --------
+    str:
+        Edited text.
+    """
+
+    pieces = []
+    position = 0
+    for offset, text in edits:
+        pieces.append(xml[position:offset])
+        pieces.append(text)
+        position = offset
+    pieces.append(xml[position:])
+    return ''.join(pieces)
+
+def apply_edits_file(path, edits, destination=None):
+    """
+    Applies insertions such as those of correction_edits_file() to a file
+    through a memory map, either in place or into a copy. In place, only
+    the bytes after the first edit are moved, so edits near the end of a
+    large file, like closing tags missing at its end, cost little.
+
+    Parameters:
+    ----------
+    - path (str):
+        File to edit.
+    - edits (list of tuple of (int, str)):
+        Byte offset and text to insert there, in increasing order of
+        offset. The text is written as UTF-8.
+    - destination (str, optional):
+        Path of the edited copy. (Default is None, path is edited in place)
+    """
+
+    edits = [(offset, text.encode('utf-8')) for offset, text in edits]
+    added = sum(len(data) for _, data in edits)
+
+    if (destination is None):
+        if (added == 0):
+            return
+        with open(path, 'r+b') as file:
+            size = file.seek(0, 2)
+            file.truncate(size + added)
+            with mmap.mmap(file.fileno(), 0) as mapped:
+                # from the last edit back, move the bytes after each edit
+                # to their final place and write the edit in front of them
+                end = size
+                for offset, data in reversed(edits):
+                    mapped.move(offset + added, offset, end - offset)
+                    added -= len(data)
+                    mapped[offset + added:offset + added + len(data)] = data
+                    end = offset
+                mapped.flush()
+        return
+
+    with open(path, 'rb') as source, open(destination, 'w+b') as file:
+        size = source.seek(0, 2)
+        file.truncate(size + added)
+        if (size + added == 0):
+            return
+        with mmap.mmap(file.fileno(), 0) as mapped:
+            position = 0
+            target = 0
+            for offset, data in edits + [(size, b'')]:
+                source.seek(position)
+                # copy in blocks, so memory does not grow with the file
+                while (position < offset):
+                    block = source.read(min(COPY_BLOCK_SIZE, offset - position))
+                    mapped[target:target + len(block)] = block
+                    position += len(block)
+                    target += len(block)
+                mapped[target:target + len(data)] = data
+                target += len(data)
+            mapped.flush()
+
+def correct_xml_file(path, destination=None, chunk_size=1 << 16):
+    """
+    Corrects the missing opening and closing tags of an XML file by
+    inserting them into it, instead of writing the whole document again
+    as correct_xml() does. The rest of the file is left as it is, not
+    minified or prettified: minifying then prettifying the corrected file
+    gives the text of correct_xml().
 
-    while (len(stack) > 0):
-        xml.append('</' + stack[-1] + '>')
-        stack.pop()
+    Parameters:
+    ----------
+    - path (str):
+        Path of a syntax-error-free XML file, encoded as UTF-8.
+    - destination (str, optional):
+        Path of the corrected copy. (Default is None, path is corrected in
+        place)
+    - chunk_size (int, optional):
+        Read size in bytes. (Default is 65536)
 
-    if (mismatched_first_tag == 1):
-        xml.append('</' + tokens[0][1:-1] + '>')
+    Returns:
+    --------
+    list of tuple of (int, str):
+        The edits made, see correction_edits_file().
+    """
 
-    xml = ''.join(xml)
-    xml = prettify(xml)
-    return xml
+    edits = correction_edits_file(path, chunk_size)
+    apply_edits_file(path, edits, destination)
+    return edits
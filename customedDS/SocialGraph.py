@@ -1,3 +1,6 @@
+import csv
+import os
+import numpy as np
 from customedDS.CustomSet import CustomSet
 from customedDS.CustomDict import CustomDict
 from customedDS.User import User
@@ -22,6 +25,8 @@ class SocialGraph:
     - suggested_follows(user_id): Suggest followers for a user in the social graph.
     - search_posts_by_topic(topic): Search for posts with a specific topic in the social graph.
     - print_network_analysis(): Print a network analysis report for the social graph.
+    - to_columns(): Flatten users, follower edges, posts and topics into typed column arrays.
+    - export_columns(directory, format): Write the column arrays to .npy or CSV files.
     """
 
     def __init__(self):
@@ -217,3 +222,110 @@ class SocialGraph:
         result.append("-" * 30)
 
         return result
+
+    def to_columns(self):
+        """
+        Flatten the social graph into tables of typed column arrays, so
+        aggregations can run vectorized over whole columns instead of
+        walking User objects and posts one by one.
+
+        Users are sorted by ID, followers of each user by ID, and posts are
+        numbered in that order.
+
+        Text columns are object arrays of str, so each row takes the size of
+        its own string rather than of the longest one.
+
+        Returns:
+        - dict: Table name to a dict of column name to NumPy array:
+          "users": user_id (int64), name (str).
+          "edges": source (int64, the follower), target (int64, the followed user).
+          "posts": post_id (int64), user_id (int64), body (str).
+          "post_topics": post_id (int64), topic (str), one row per topic of each post.
+        """
+        user_ids = []
+        names = []
+        sources = []
+        targets = []
+        post_users = []
+        bodies = []
+        topic_posts = []
+        topics = []
+
+        for user in sorted(self.users.Values(), key=lambda user: user.user_id):
+            user_ids.append(user.user_id)
+            names.append(user.name or "")
+
+            followers = sorted(user.followers)
+            sources.extend(followers)
+            targets.extend([user.user_id] * len(followers))
+
+            for post in user.posts:
+                post_topics = post.get('topics') or []
+                topic_posts.extend([len(bodies)] * len(post_topics))
+                topics.extend(post_topics)
+                post_users.append(user.user_id)
+                bodies.append(post.get('body') or "")
+
+        return {
+            "users": {
+                "user_id": np.array(user_ids, dtype=np.int64),
+                "name": np.array(names, dtype=object),
+            },
+            "edges": {
+                "source": np.array(sources, dtype=np.int64),
+                "target": np.array(targets, dtype=np.int64),
+            },
+            "posts": {
+                "post_id": np.arange(len(bodies), dtype=np.int64),
+                "user_id": np.array(post_users, dtype=np.int64),
+                "body": np.array(bodies, dtype=object),
+            },
+            "post_topics": {
+                "post_id": np.array(topic_posts, dtype=np.int64),
+                "topic": np.array(topics, dtype=object),
+            },
+        }
+
+    def export_columns(self, directory, format="npy"):
+        """
+        Write the tables of to_columns() to a directory.
+
+        Parameters:
+        - directory (str): Output directory, created if it does not exist.
+        - format (str): "npy" for one <table>.<column>.npy file per column,
+          loadable with numpy.load() without pickling, or "csv" for one
+          <table>.csv file per table with a header row. A text column is
+          written as <table>.<column>.data.npy, its rows encoded as UTF-8
+          one after the other (uint8), and <table>.<column>.offsets.npy,
+          where row i ends and row i + 1 starts (int64, starting with 0).
+
+        Returns:
+        - list: Paths of the written files.
+        """
+        if format not in ("npy", "csv"):
+            raise ValueError(f"Unknown column format: {format!r}, expected 'npy' or 'csv'.")
+
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for table, columns in self.to_columns().items():
+            if format == "npy":
+                for column, values in columns.items():
+                    if values.dtype == object:
+                        encoded = [value.encode("utf-8") for value in values]
+                        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+                        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+                        arrays = {".data": np.frombuffer(b"".join(encoded), dtype=np.uint8), ".offsets": offsets}
+                    else:
+                        arrays = {"": values}
+                    for suffix, array in arrays.items():
+                        path = os.path.join(directory, f"{table}.{column}{suffix}.npy")
+                        np.save(path, array)
+                        paths.append(path)
+            else:
+                path = os.path.join(directory, f"{table}.csv")
+                with open(path, "w", encoding="utf-8", newline="") as file:
+                    writer = csv.writer(file)
+                    writer.writerow(columns.keys())
+                    writer.writerows(zip(*(values.tolist() for values in columns.values())))
+                paths.append(path)
+        return paths
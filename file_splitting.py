@@ -0,0 +1,144 @@
+import re
+from bisect import bisect_left, bisect_right
+from formatting import COMMENT_PATTERN, COMMENT_START_PATTERN, TAG_PATTERN, LOOSE_TAG_PATTERN
+
+# Byte patterns used to find cut points in files without decoding them:
+# comments, anything minify() reads as one tag or comment, closing tags and
+# self-closing tag ends with spaces inside, and what may follow a safe cut.
+COMMENT_BYTES_PATTERN = re.compile(COMMENT_PATTERN.pattern.encode())
+COMMENT_START_BYTES_PATTERN = re.compile(COMMENT_START_PATTERN.pattern.encode())
+MARKUP_BYTES_PATTERN = re.compile(b'|'.join(pattern.pattern.encode() for pattern in
+                                            (COMMENT_PATTERN, TAG_PATTERN, LOOSE_TAG_PATTERN)))
+SPACED_CLOSING_BYTES_PATTERN = re.compile(rb'<\s+/')
+SPACED_SELF_CLOSING_BYTES_PATTERN = re.compile(rb'/\s+>')
+DECLARATION_BYTES_PATTERN = re.compile(rb'<\s*[?!]')
+SAFE_CUT_BYTES_PATTERN = re.compile(rb'\s*<\s*[^\s!]')
+# Files smaller than this are not worth splitting across processes, in bytes.
+MIN_PART_SIZE = 1 << 20
+
+def find_record_cuts(data, parts):
+    """
+    Finds where an XML file can be split into about parts pieces that each
+    hold whole children of its top element, e.g. whole <user> elements of
+    <users>, reading the raw bytes instead of tokenizing them.
+
+    The depth between two cuts is found by counting '<', '</' and '/>'
+    outside comments, so only the tags around each cut are read one by
+    one. Every cut is right after a tag, at the depth of the top element's
+    children, and followed by whitespace and a tag that is not a comment,
+    so the pieces minify and tokenize the same as the whole (see
+    formatting.find_safe_cut()).
+
+    A '/>' in text content or an attribute value throws the count off, so
+    callers must check that every piece between two cuts is balanced.
+
+    Parameters:
+    ----------
+    - data (bytes or mmap):
+        UTF-8 encoded XML.
+    - parts (int):
+        Number of pieces wanted.
+
+    Returns:
+    --------
+    list of int:
+        Byte offsets of at most parts - 1 cuts, in increasing order. Empty
+        if the top element's children can not be told apart, e.g. when it
+        has only one child.
+    """
+
+    comment_starts = []
+    comment_ends = []
+    for match in COMMENT_BYTES_PATTERN.finditer(data):
+        comment_starts.append(match.start())
+        comment_ends.append(match.end())
+
+    # nothing after an unclosed comment can be cut
+    limit = len(data)
+    unclosed = COMMENT_START_BYTES_PATTERN.search(data, comment_ends[-1] if comment_ends else 0)
+    if (unclosed):
+        limit = unclosed.start()
+
+    def depth_change(start, end):
+        # net number of elements opened in data[start:end], skipping comments
+        change = 0
+        index = bisect_left(comment_starts, start)
+        while (start < end):
+            stop = min(comment_starts[index], end) if index < len(comment_starts) else end
+            segment = data[start:stop]
+            closing = segment.count(b'</') + len(SPACED_CLOSING_BYTES_PATTERN.findall(segment))
+            self_closing = segment.count(b'/>') + len(SPACED_SELF_CLOSING_BYTES_PATTERN.findall(segment))
+            change += segment.count(b'<') - 2 * closing - self_closing
+            if (stop == end):
+                break
+            start = comment_ends[index]
+            index += 1
+        return change
+
+    # The children of the top element are one level below the first tag
+    # that is not a declaration such as <?xml ...?>, which are read as
+    # elements that are never closed
+    record_depth = 0
+    position = 0
+    while (True):
+        match = MARKUP_BYTES_PATTERN.search(data, position)
+        if (match is None or match.end() > limit):
+            return []
+        position = match.end()
+        if (COMMENT_START_BYTES_PATTERN.match(match.group())):
+            continue
+        record_depth += depth_change(match.start(), match.end())
+        if (not DECLARATION_BYTES_PATTERN.match(match.group())):
+            break
+    depth = record_depth
+
+    cuts = []
+    for part in range(1, parts):
+        target = max(len(data) * part // parts, position)
+
+        # jump to the first tag at or after target, outside comments
+        start = data.find(b'<', target)
+        index = bisect_right(comment_starts, start) - 1
+        while (start >= 0 and index >= 0 and start < comment_ends[index]):
+            start = data.find(b'<', comment_ends[index])
+            index = bisect_right(comment_starts, start) - 1
+        if (start < 0 or start >= limit):
+            break
+        depth += depth_change(position, start)
+        position = start
+
+        # then read tags until one ends back among the top element's children
+        cut = None
+        while (cut is None):
+            match = MARKUP_BYTES_PATTERN.match(data, position)
+            if (match is None):
+                return cuts
+            position = match.end()
+            if (position > limit):
+                return cuts
+            if (not COMMENT_START_BYTES_PATTERN.match(match.group())):
+                depth += depth_change(match.start(), position)
+                if (depth < record_depth):
+                    return cuts
+                # a '>' inside a quoted value would end the tag's token
+                # early, leaving text that runs past the cut
+                if (depth == record_depth and b'>' not in match.group()[:-1]
+                        and SAFE_CUT_BYTES_PATTERN.match(data, position)):
+                    cut = position
+            if (cut is None):
+                position = data.find(b'<', position)
+                if (position < 0):
+                    return cuts
+        cuts.append(cut)
+    return cuts
+
+def decode_text(data):
+    """
+    Decodes UTF-8 bytes read from part of a file the way reading the file
+    in text mode does, turning '\r\n' and '\r' into '\n'.
+    """
+
+    text = data.decode('utf-8')
+    if ('\r' in text):
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
@@ -1,10 +1,197 @@
 import re
+import io
+import codecs
+from bisect import bisect_right
+
+# Matches an XML comment, the same way minify() strips them.
+COMMENT_PATTERN = re.compile(r'<\s*!\s*-\s*-\s*[\S\s]+?-\s*-\s*>')
+# Start of a comment whose end may not have been read yet.
+COMMENT_START_PATTERN = re.compile(r'<\s*!\s*-\s*-')
+# End of a comment.
+COMMENT_END_PATTERN = re.compile(r'-\s*-\s*>')
+# A boundary between two tags with nothing but whitespace in between, where
+# the second tag is not a comment. Minifying both sides separately gives the
+# same result as minifying them together.
+SAFE_CUT_PATTERN = re.compile(r'>(?=\s*<\s*[^\s!])')
+# A tag with no spaces, attributes or comments, and a run of such tags
+# separated only by whitespace.
+PLAIN_TAG_PATTERN = re.compile(r'</?[^\s<>"\'=/!]+/?>')
+PLAIN_TAGS_PATTERN = re.compile(r'{0}(?:\s*{0})*'.format(PLAIN_TAG_PATTERN.pattern))
+# Any other tag, where a '>' inside a quoted attribute value does not end it.
+TAG_PATTERN = re.compile(r'<(?:[^<>"\']|"[^"<]*"|\'[^\'<]*\')*>')
+# Fallback for tags with unbalanced quotes or no closing '>'.
+LOOSE_TAG_PATTERN = re.compile(r'<[^>]*>?')
+QUOTED_VALUE_PATTERN = re.compile(r'("[^"]*"|\'[^\']*\')')
+SPACE_PATTERN = re.compile(r'\s+')
+# A tag, or text content between two tags.
+TOKEN_PATTERN = re.compile(r'<[^>]+>|(?<=>)[^<]+(?=<)')
+
+def iter_text_chunks(source, chunk_size=1 << 16):
+    """
+    Yields text chunks from a string, a file-like object or an iterable
+    of chunks. Bytes are decoded as UTF-8, including multi-byte sequences
+    that straddle two chunks.
+
+    Parameters:
+    ----------
+    - source (str, file-like object or iterable of str/bytes):
+        Input to read from.
+    - chunk_size (int, optional):
+        Number of characters/bytes read at a time from file-like
+        objects. (Default is 65536)
+
+    Returns:
+    --------
+    generator of str:
+        Text chunks in order.
+    """
+
+    if (isinstance(source, (str, bytes))):
+        source = [source]
+    elif (hasattr(source, 'read')):
+        read = source.read
+        source = iter(lambda: read(chunk_size), read(0))
+
+    decoder = None
+    for chunk in source:
+        if (isinstance(chunk, (bytes, bytearray))):
+            if (decoder is None):
+                decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = decoder.decode(chunk)
+        if (chunk):
+            yield chunk
+
+    if (decoder is not None):
+        tail = decoder.decode(b'', final=True)
+        if (tail):
+            yield tail
+
+def find_safe_cut(text, start=0):
+    """
+    Finds the last position in text where it can be split so that both
+    halves minify independently, i.e. right after a tag's '>' that is
+    followed (after optional whitespace) by a non-comment tag, and not
+    inside a comment.
+
+    Parameters:
+    ----------
+    - text (str):
+        Partial XML text, starting at a previous safe cut.
+    - start (int, optional):
+        Index to start reading at. text[:start] must hold no safe cut
+        and no comment that is still open. (Default is 0)
+
+    Returns:
+    --------
+    int:
+        Index to split at, or 0 if there is no safe position yet.
+    """
+
+    return scan_safe_cut(text, start)[0]
+
+def scan_safe_cut(text, start):
+    """
+    Internal function for find_safe_cut() that also returns the start of
+    a comment that is still open, or None.
+    """
+
+    comment_starts = []
+    comment_ends = []
+    for match in COMMENT_PATTERN.finditer(text, start):
+        comment_starts.append(match.start())
+        comment_ends.append(match.end())
+
+    # a comment that is still open blocks everything after its start
+    limit = len(text)
+    unclosed = COMMENT_START_PATTERN.search(text, comment_ends[-1] if comment_ends else start)
+    if (unclosed):
+        limit = unclosed.start()
+
+    cuts = [match.end() for match in SAFE_CUT_PATTERN.finditer(text, start, limit)]
+    for position in reversed(cuts):
+        index = bisect_right(comment_starts, position) - 1
+        if (index < 0 or position >= comment_ends[index]):
+            return position, None
+    return 0, limit if unclosed else None
+
+def skip_back(text, end, characters):
+    """
+    Internal function that returns the start of the run of characters,
+    or whitespace, that ends at index end of text.
+    """
+
+    while (end > 0 and (text[end - 1] in characters or text[end - 1].isspace())):
+        end -= 1
+    return end
+
+class Safe_Cut_Finder:
+    """
+    Finds safe cuts (see find_safe_cut()) in text that only grows at its
+    end between two calls, such as the text kept between two reads of a
+    stream. Where the last call stopped reading is kept, so each call
+    reads only about the text added since, even inside a long text
+    content or comment.
+
+    After a cut is found the caller drops the text before it, and the
+    next call starts over from the beginning of what is left.
+    """
+
+    def __init__(self):
+        # text[:start] holds no safe cut and no open comment, except one
+        # starting at start
+        self.start = 0
+        # where the end of the open comment may start, or None
+        self.comment_end = None
+
+    def find(self, text):
+        """
+        Finds the last safe cut in text.
+
+        Parameters:
+        ----------
+        - text (str):
+            Text of the last call, if no cut was found, with more text
+            added at its end.
+
+        Returns:
+        --------
+        int:
+            Index to split at, or 0 if there is no safe position yet.
+        """
+
+        # nothing can change before an open comment ends
+        if (self.comment_end is not None and
+                not COMMENT_END_PATTERN.search(text, self.comment_end)):
+            self.comment_end = skip_back(text, len(text), '-')
+            return 0
+
+        cut, unclosed = scan_safe_cut(text, self.start)
+        if (cut):
+            self.start = 0
+            self.comment_end = None
+        elif (unclosed is not None):
+            self.start = unclosed
+            self.comment_end = max(skip_back(text, len(text), '-'), unclosed)
+        else:
+            # only a last '>' followed by whitespace, or by the start of a
+            # tag or comment, can still become a cut
+            start = skip_back(text, len(text), '<!-')
+            if (start > 0 and text[start - 1] == '>'):
+                start -= 1
+            self.start = max(start, self.start)
+            self.comment_end = None
+        return cut
 
 def minify(text):
     """
     Minifies a syntactically correct XML file, i.e. it removes
     extra spaces and new lines.
 
+    The text is read in a single pass, switching between outside-tag,
+    in-tag, in-attribute-value and in-comment states. Each state skips
+    ahead over a whole run of characters at once instead of looking at
+    them one by one. Quoted attribute values are kept as they are.
+
     Parameters:
     ----------
     - text (str):
@@ -16,33 +203,238 @@ def minify(text):
         Minifed text.
     """
 
-    # remove all comments
-    text = re.sub(r'<\s*!\s*-\s*-\s*[\S\s]+?-\s*-\s*>', r'', text)
-    # remove all extra newlines or tabs after > or before <
-    # avoid changing newlines in tag content while doing so
-    # also remove all spaces before start of file and after end
-    text = re.sub(r'\A\s+|(?<=>)\s+(?=<)|\s+\Z', r'', text)
-    # remove all extra spaces after opening tag and before closing tag
-    text = re.sub(r'\s+>', r'>', text)
-    text = re.sub(r'\s+/>', r'/>', text)
-    text = re.sub(r'<\s+', r'<', text)
-    text = re.sub(r'</\s+', r'</', text)
-    # remove all extra spaces after tag name and before first attribute if any
-    text = re.sub(r'(<\S+)(\s+)', r'\g<1> ', text)
-    # remove all spaces surrounding = when defining an attribute
-    # and avoid messing with tag contents if similar structures exist
-    text = re.sub(r'(\s*=\s*)(?=[^<]+>)', r'=', text)
-    # remove all extra spaces between different attributes
-    text = re.sub(r'\"\s+(?=[^<]+>)', r'" ', text)
-    text = re.sub(r"\'\s+(?=[^<]+>)", r"' ", text)
-
-    # remove any non-significant spaces and newlines after
-    # closing tag and before text content, or before opening
-    # tag and after text content.
-    text = re.sub(r'\s+<', r'<', text)
-    text = re.sub(r'>\s+', r'>', text)
-
-    return text
+    minified = []
+    append = minified.append
+    length = len(text)
+    position = 0
+    # text content seen since the last tag, comments split it into parts
+    content = []
+    # content directly after a tag with no spaces in it has its first
+    # run of inner whitespace collapsed, as the old regex minifier did
+    after_plain_tag = False
+
+    while (position < length):
+        # Outside-tag state: everything up to the next '<' is content
+        start = text.find('<', position)
+        if (start < 0):
+            content.append(text[position:])
+            break
+        if (start > position):
+            content.append(text[position:start])
+
+        # In-tag state for consecutive tags without spaces or attributes,
+        # only the whitespace between them has to go
+        match = PLAIN_TAGS_PATTERN.match(text, start)
+        if (match):
+            tags = match.group()
+            if (content):
+                append(minify_content(content, after_plain_tag))
+                content = []
+            append(''.join(tags.split()))
+            after_plain_tag = True
+            position = match.end()
+            continue
+
+        # In-comment state: skip it, the content around it is joined
+        match = COMMENT_PATTERN.match(text, start)
+        if (match):
+            position = match.end()
+            continue
+
+        # In-tag and in-attribute-value states
+        match = TAG_PATTERN.match(text, start) or LOOSE_TAG_PATTERN.match(text, start)
+        tag = minify_tag(match.group())
+        if (content):
+            append(minify_content(content, after_plain_tag))
+            content = []
+        append(tag)
+        after_plain_tag = ' ' not in tag
+        position = match.end()
+
+    if (content):
+        append(minify_content(content, after_plain_tag))
+
+    return ''.join(minified)
+
+def minify_tag(tag):
+    """
+    Removes extra spaces from a single tag. Spaces after '<' and '</',
+    around '=' and before '>' or '/>' are removed, other runs of spaces
+    become a single space. Quoted attribute values are kept as they are.
+
+    Parameters:
+    ----------
+    - tag (str):
+        Tag text, i.e. text between < >, including them.
+
+    Returns:
+    --------
+    str:
+        Minified tag.
+    """
+
+    if ('"' in tag or "'" in tag):
+        parts = QUOTED_VALUE_PATTERN.split(tag)
+    else:
+        parts = [tag]
+
+    # even parts are outside quotes, odd parts are attribute values
+    last = len(parts) - 1
+    for i in range(0, len(parts), 2):
+        part = parts[i]
+        minified = ' '.join(part.split())
+        # keep a space next to a quoted value, it may separate attributes
+        if (i > 0 and part[:1].isspace()):
+            minified = ' ' + minified
+        if (i < last and part[-1:].isspace()):
+            minified += ' '
+        if (' ' in minified):
+            minified = (minified.replace('< ', '<').replace('</ ', '</')
+                        .replace(' =', '=').replace('= ', '=')
+                        .replace(' >', '>').replace(' />', '/>'))
+        parts[i] = minified
+    return ''.join(parts)
+
+def minify_content(content, after_plain_tag):
+    """
+    Strips the text content found between two tags.
+
+    Parameters:
+    ----------
+    - content (list of str):
+        Pieces of text content, split by any removed comments.
+    - after_plain_tag (bool):
+        Whether the content directly follows a tag that has no spaces.
+
+    Returns:
+    --------
+    str:
+        Stripped text content, possibly empty.
+    """
+
+    text = content[0] if len(content) == 1 else ''.join(content)
+    stripped = text.strip()
+    if (after_plain_tag and stripped and text[0] == stripped[0]):
+        stripped = SPACE_PATTERN.sub(' ', stripped, 1)
+    return stripped
+
+def iter_token_spans(text, start=0, end=None):
+    """
+    Tokenizes XML without minifying it first, keeping where each token is
+    in the original text. Yields the same tokens as re.findall with
+    TOKEN_PATTERN on minify(text[start:end]).
+
+    Parameters:
+    ----------
+    - text (str):
+        XML file string.
+    - start (int, optional):
+        Index to start reading at. (Default is 0)
+    - end (int, optional):
+        Index to stop reading at. (Default is None, the end of text)
+
+    Returns:
+    --------
+    generator of tuple of (int, int, str):
+        Start index, end index and minified token. Text content spans
+        cover any comments inside it.
+
+    Raises:
+    -------
+    ValueError:
+        If re.findall would split the text differently, i.e. for an empty
+        tag, a '>' inside a tag's attribute value or a '>' before the
+        first tag.
+    """
+
+    if (end is None):
+        end = len(text)
+    position = start
+    content = []
+    content_start = start
+    after_plain_tag = False
+    # content before the first tag is never a token
+    after_tag = False
+
+    while (position < end):
+        tag_start = text.find('<', position, end)
+        # neither is content after the last tag
+        if (tag_start < 0):
+            break
+        if (tag_start > position):
+            if (not content):
+                content_start = position
+            content.append(text[position:tag_start])
+            if (not after_tag and '>' in content[-1]):
+                raise ValueError(f"Unexpected '>' before the first tag at index {position}.")
+
+        match = PLAIN_TAG_PATTERN.match(text, tag_start, end)
+        plain = bool(match)
+        if (not plain):
+            match = COMMENT_PATTERN.match(text, tag_start, end)
+            if (match):
+                if (not content):
+                    content_start = tag_start
+                position = match.end()
+                continue
+            match = TAG_PATTERN.match(text, tag_start, end) or LOOSE_TAG_PATTERN.match(text, tag_start, end)
+
+        if (content):
+            minified = minify_content(content, after_plain_tag)
+            if (minified and after_tag):
+                yield (content_start, tag_start, minified)
+            content = []
+
+        if (plain):
+            tag = match.group()
+        else:
+            # a tag left open at the end is not a token either
+            if (match.group()[-1] != '>'):
+                break
+            tag = minify_tag(match.group())
+            if (len(tag) < 3 or '>' in tag[:-1]):
+                raise ValueError(f"Tag {tag!r} at index {tag_start} can not be tokenized.")
+
+        yield (tag_start, match.end(), tag)
+        after_plain_tag = ' ' not in tag
+        after_tag = True
+        position = match.end()
+
+def minify_stream(source, chunk_size=1 << 16):
+    """
+    Minifies XML read in chunks, yielding minified chunks as soon as
+    they are ready. Joining the output gives the same text as minify().
+    Only the text after the last safe cut is kept between reads, so memory
+    is bounded by the chunk size and the longest text content or comment
+    rather than the document size, and each read is scanned about once.
+
+    Parameters:
+    ----------
+    - source (str, file-like object or iterable of str/bytes):
+        Syntactically correct XML, see iter_text_chunks().
+    - chunk_size (int, optional):
+        Read size for file-like objects. (Default is 65536)
+
+    Returns:
+    --------
+    generator of str:
+        Minified chunks.
+    """
+
+    pending = ""
+    finder = Safe_Cut_Finder()
+    for chunk in iter_text_chunks(source, chunk_size):
+        pending += chunk
+        cut = finder.find(pending)
+        if (cut):
+            text = minify(pending[:cut])
+            pending = pending[cut:]
+            if (text):
+                yield text
+
+    text = minify(pending)
+    if (text):
+        yield text
 
 def prettify(text, tab_length=4):
     """
@@ -62,28 +454,96 @@ def prettify(text, tab_length=4):
         Prettified text.
     """
 
-    text = minify(text)
-    # Get any text between tags, or any text content, and put in list
-    tokens = re.findall(r'<[^>]+>|(?<=>)[^<]+(?=<)', text)
+    return ''.join(prettify_chunks([minify(text)], tab_length))
 
-    text = []
-    tabs = ""
+def prettify_chunks(minified_chunks, tab_length=4):
+    """
+    Prettifies already minified XML given as chunks, such as those yielded
+    by minify_stream(). Tokens are read lazily from one chunk at a time and
+    each indentation level is built only once.
 
-    for token in tokens:
-        if (token[0] == '<' and token[1] != '/'):
-            text.append('\n' + tabs + token)
-            if (token[-2] != '/'):
-                tabs += ' ' * tab_length
+    Parameters:
+    ----------
+    - minified_chunks (iterable of str):
+        Minified XML, split only between two tags.
+    - tab_length (int, optional):
+        Desired tab length (in spaces) for indentation. (Default is 4)
 
-        elif (token[0] == '<' and token[1] == '/'):
-            tabs = tabs[:-tab_length]
-            text.append('\n' + tabs + token)
+    Returns:
+    --------
+    generator of str:
+        Prettified text, one piece per input chunk.
+    """
 
-        else:
-            text.append('\n' + tabs + token)
+    # indents[depth] is the whitespace in front of a token at that depth
+    indents = [""]
+    depth = 0
+    separator = ""
+
+    for chunk in minified_chunks:
+        text = []
+        # Get any text between tags, or any text content
+        for token in TOKEN_PATTERN.findall(chunk):
+            if (token[0] == '<' and token[1] != '/'):
+                text.append(separator + indents[depth] + token)
+                if (token[-2] != '/'):
+                    depth += 1
+                    if (depth == len(indents)):
+                        indents.append(indents[-1] + ' ' * tab_length)
+
+            elif (token[0] == '<' and token[1] == '/'):
+                depth = max(depth - 1, 0)
+                text.append(separator + indents[depth] + token)
+
+            else:
+                text.append(separator + indents[depth] + token)
+            # no newline before the very first token
+            separator = "\n"
+
+        if (text):
+            yield ''.join(text)
+
+def iter_tokens(source, chunk_size=1 << 16):
+    """
+    Lazily tokenizes XML read in chunks, like re.findall with
+    TOKEN_PATTERN on the minified text but without holding all of it.
+
+    Parameters:
+    ----------
+    - source (str, file-like object or iterable of str/bytes):
+        Syntactically correct XML, see iter_text_chunks().
+    - chunk_size (int, optional):
+        Read size for file-like objects. (Default is 65536)
+
+    Returns:
+    --------
+    generator of str:
+        Tags and text content, in document order.
+    """
+
+    for chunk in minify_stream(source, chunk_size):
+        yield from TOKEN_PATTERN.findall(chunk)
+
+def prettify_stream(source, sink, tab_length=4, chunk_size=1 << 16):
+    """
+    Prettifies XML read in chunks and writes the result to sink as it goes,
+    so output starts right away and memory does not grow with the size of
+    the document. Writes the same text as prettify().
+
+    Parameters:
+    ----------
+    - source (str, file-like object or iterable of str/bytes):
+        Syntactically correct XML, see iter_text_chunks().
+    - sink (file-like object):
+        Text or binary file to write to. Binary files receive UTF-8.
+    - tab_length (int, optional):
+        Desired tab length (in spaces) for indentation. (Default is 4)
+    - chunk_size (int, optional):
+        Read size for file-like objects. (Default is 65536)
+    """
 
-    text = ''.join(text)
-    # remove extra \n at beginning of "text"
-    text = text[1:]
+    binary = (isinstance(sink, (io.RawIOBase, io.BufferedIOBase))
+              or 'b' in getattr(sink, 'mode', ''))
 
-    return text
+    for text in prettify_chunks(minify_stream(source, chunk_size), tab_length):
+        sink.write(text.encode('utf-8') if binary else text)
@@ -9,13 +9,15 @@ import os
 import matplotlib.backends.backend_tkagg
 #for program features
 from formatting import minify, prettify
-from xml2json import xml2json
+from xml2json import xml2json, XML2JSON
 from correct_xml import correct_xml
 from xml_error_detector import XML_error_detector
 # Social Network
 from build_graph_network_from_xml import *
 # Compression
 from BPE import BPE
+from incremental_document import Incremental_XML_Document
+from parse_cache import parse_cache
 bpe = BPE()
 
 ct.set_appearance_mode("system")  # Modes: system (default), light, dark
@@ -109,10 +111,14 @@ class Ui :
         self.user2ID = ct.CTkLabel(self.frame_buttons2, text ="User2 ID:", padx = 5, pady = 5)
         self.user2ID.grid(row=6, column=0, padx=10, pady=5)
 
-        # Attributes used to build and maintain the social graph
+        # Attributes used to build and maintain the social graph, parse_cache
+        # only saves building it again for a text it was already built from
         self.content_that_built_the_graph = None
         self.social_graph = None
 
+        # Parsed editor content, updated on every edit instead of parsed again
+        self.document = None
+
 
         self.undo_button = ct.CTkButton(self.frame_buttons2, width=50, text="Undo", command=self.undo)
         self.undo_button.grid(row=7, column=0, padx=5, pady=5)
@@ -124,6 +130,9 @@ class Ui :
         self.output_text_box.grid(row=0, column=3, padx=10, pady=10, sticky='n')
         self.saveFileButton = ct.CTkButton(self.root,  width=270, text="Save File", command=self.choose_output_file)
         self.saveFileButton.grid(row=1, column=3, padx=10, pady=10)
+        # Hits and memory use of parse_cache, updated after every operation
+        self.cacheStatsLabel = ct.CTkLabel(self.root, width=270, wraplength=270, text=parse_cache.stats())
+        self.cacheStatsLabel.grid(row=2, column=3, padx=10, pady=5)
         self.last_function_performed_output_extension = ".txt"
         self.makeResponsive()
 
@@ -204,32 +213,69 @@ class Ui :
         title="Decompress File",
         filetypes=[("All files", "*.xip")])
         if file_path:
-            content = bpe.decompress(file_path)
-            self.show_output(content)
+            self.show_output("")
+            self.output_text_box.configure(state='normal')
+            for content in bpe.iter_decompress(file_path):
+                self.output_text_box.insert(tk.END, content)
+                # show the text decompressed so far while the rest follows
+                self.output_text_box.update_idletasks()
+            self.output_text_box.configure(state='disabled')
             self.last_function_performed_output_extension = ".xml"
 
     def minify(self):
         content = self.editor_text_box.get(1.0, tk.END)
-        content = minify(content)
+        content = parse_cache.get(content, "minified", minify)
         self.show_output(content)
         self.last_function_performed_output_extension = ".xml"
 
+    def get_document(self, content):
+        """
+        Brings the parsed document up to date with the editor content,
+        re-parsing only the element that changed since the last call.
+
+        Returns:
+        --------
+        Incremental_XML_Document:
+            Tree of content, None if it could not be parsed.
+        """
+
+        try:
+            if (self.document is None):
+                self.document = Incremental_XML_Document(content)
+            else:
+                self.document.update(content)
+        except Exception:
+            self.document = None
+        return self.document
+
+    def build_json(self, content):
+        document = self.get_document(content)
+        if (document is not None):
+            return XML2JSON(content, 4, document).json_text
+        return xml2json(content)
+
     def xml2json(self):
         content = self.editor_text_box.get(1.0, tk.END)
-        content = xml2json(content)
+        content = parse_cache.get(content, "json", self.build_json)
         self.show_output(content)
         self.last_function_performed_output_extension = ".json"
 
+    def build_prettified(self, content):
+        document = self.get_document(content)
+        if (document is not None):
+            return document.prettify()
+        return prettify(content)
+
     def prettify(self):
         content = self.editor_text_box.get(1.0, tk.END)
-        content = prettify(content)
+        content = parse_cache.get(content, "prettified", self.build_prettified)
         self.show_output(content)
         self.last_function_performed_output_extension = ".xml"
 
     def correct_xml(self):
         content = self.editor_text_box.get(1.0, tk.END)
         try:
-            content = correct_xml(content)
+            content = parse_cache.get(content, "corrected", correct_xml)
             self.show_output(content)
             self.last_function_performed_output_extension = ".xml"
         except:
@@ -237,22 +283,38 @@ class Ui :
 
     def show_xml_errors(self):
         content=self.editor_text_box.get(1.0,tk.END)
-        content = XML_error_detector(content)
+        content = parse_cache.get(content, "errors", XML_error_detector)
         self.show_output(content)
         self.last_function_performed_output_extension = ".txt"
 
+    def build_graph(self, xml_content):
+        document = self.get_document(xml_content)
+        if (document is not None):
+            return build_graph_network_from_document(document)
+        return build_graph_netowrk_from_xml(xml_content)
+
+    def get_built_graph(self, xml_content):
+        """
+        Gets the social graph built from xml_content, None if the last
+        Build Graph was run on other content.
+        """
+
+        if (xml_content != self.content_that_built_the_graph):
+            return None
+        return self.social_graph
+
     def build_social_graph(self):
         xml_content = self.editor_text_box.get(1.0, tk.END)
         try:
-            self.social_graph = build_graph_netowrk_from_xml(xml_content)
-            self.show_output("Social graph built successfully.")
+            self.social_graph = parse_cache.get(xml_content, "graph", self.build_graph)
             self.content_that_built_the_graph = xml_content
+            self.show_output("Social graph built successfully.")
         except:
             self.show_error("The entered file is not a valid\nsocial graph representation. Try again\nwith a different file.")
 
     def visualize_social_graph(self):
         xml_content = self.editor_text_box.get(1.0, tk.END)
-        if (xml_content == self.content_that_built_the_graph):
+        if (self.get_built_graph(xml_content) is not None):
             try:
                 self.social_graph.visualize_graph()
             except:
@@ -265,7 +327,7 @@ class Ui :
         topic = self.topicEntry.get()
         xml_content = self.editor_text_box.get(1.0, tk.END)
         if topic:
-            if (xml_content == self.content_that_built_the_graph):
+            if (self.get_built_graph(xml_content) is not None):
                 posts_by_topic = self.social_graph.search_posts_by_topic(topic)
                 self.output_text_box.configure(state='normal')
                 self.output_text_box.delete(1.0, tk.END)
@@ -283,7 +345,7 @@ class Ui :
 
     def show_network_analysis(self):
         xml_content = self.editor_text_box.get(1.0, tk.END)
-        if (xml_content != self.content_that_built_the_graph):
+        if (self.get_built_graph(xml_content) is None):
             self.show_error("Please build the social graph first.")
         else:
             try:
@@ -322,12 +384,14 @@ class Ui :
         self.output_text_box.insert(tk.END, message)
         self.output_text_box.configure(state='disabled')
         self.last_function_performed_output_extension = ".txt"
+        self.cacheStatsLabel.configure(text=parse_cache.stats())
 
     def show_output(self, message):
         self.output_text_box.configure(state='normal')
         self.output_text_box.delete(1.0, tk.END)
         self.output_text_box.insert(tk.END, message)
         self.output_text_box.configure(state='disabled')
+        self.cacheStatsLabel.configure(text=parse_cache.stats())
 
 #start app
 Ui()
@@ -0,0 +1,474 @@
+from bisect import bisect_left, bisect_right
+from formatting import COMMENT_PATTERN, COMMENT_START_PATTERN, iter_token_spans, prettify, prettify_chunks
+from xml_document import XML_Document, get_attr, add_child
+from xml_document_parts import Element
+from xml_query import query
+
+class Incremental_XML_Document:
+    """
+    Builds a tree from XML text and keeps it up to date as the text is
+    edited. Every element remembers where it is in the text, so an edit
+    only re-tokenizes and re-parses the smallest element whose content
+    contains it, and splices the new subtree into the tree.
+
+    The tree is the same as the one XML_Document builds for the same text.
+    Per-element positions are kept in lists indexed by document order.
+
+    Attributes:
+    ----------
+    - text (str):
+        Current XML string.
+    - root (Element):
+        Root of the document, used to access any and all children.
+    - tokens (list of str):
+        Minified tags and text content, like XML_Document.tokens.
+    - elements (list of Element):
+        All elements in document order (the order of their opening tags).
+    - starts, ends (list of int):
+        Span of each element in text, from the '<' of its opening tag to
+        after the '>' of its closing tag.
+    - content_starts, content_ends (list of int):
+        Span of each element's content, between its two tags. For
+        self-closing tags the end is before the start, so no edit is
+        ever inside it.
+    - parents (list of int):
+        Index in elements of each element's parent, -1 for top-level
+        elements.
+    - token_starts, token_ends (list of int):
+        Range of each element's tokens in tokens.
+    - indexed (bool):
+        Whether the positions are known, see parse(). If not, the lists
+        above are empty and every edit parses the whole text.
+    - unclosed_comment (bool):
+        Whether a comment is left open somewhere in text. If so, every
+        edit parses the whole text.
+    - tag_index (dict of str to list of Element, or None):
+        All elements of each name in document order, used by query().
+        Built when first needed, and kept up to date by edits that keep
+        the names of the re-parsed elements.
+    - tag_positions (list of int):
+        Index of each element in its list in tag_index.
+
+    Methods:
+    --------
+    - parse():
+        Parses the whole text from scratch.
+    - update(text):
+        Brings the tree up to date with a new version of the text.
+    - edit(start, end, replacement):
+        Replaces text[start:end] and updates the tree.
+    - find_enclosing(start, end):
+        Finds the innermost element whose content contains a span.
+    - prettify(tab_length):
+        Prettified text, like formatting.prettify(text).
+    - query(path):
+        Finds the elements matching an XPath-like path.
+    """
+
+    def __init__(self, text):
+        """
+        Parameters:
+        ----------
+        - text (str):
+            syntactically correct XML string.
+        """
+
+        self.text = text
+        self.parse()
+
+    def parse(self):
+        """
+        Parses the whole text, replacing the tree and all positions. Text
+        that can not be tokenized in place, e.g. with a '>' inside an
+        attribute value, gets a tree without positions.
+        """
+
+        root = Element("root", None, [])
+        root.parent = root
+        last_comment = None
+        for last_comment in COMMENT_PATTERN.finditer(self.text):
+            pass
+        self.unclosed_comment = COMMENT_START_PATTERN.search(
+            self.text, last_comment.end() if last_comment else 0) is not None
+        self.tag_index = None
+        self.tag_positions = []
+        try:
+            parsed = self.build(0, len(self.text), root, -1, 0, 0, partial=False)
+        except ValueError:
+            # positions can not be kept for this text, so build the tree as
+            # XML_Document does and parse everything again on every edit
+            document = XML_Document(self.text)
+            self.root = document.root
+            self.tokens = document.tokens
+            self.elements, self.starts, self.ends = [], [], []
+            self.content_starts, self.content_ends, self.parents = [], [], []
+            self.token_starts, self.token_ends = [], []
+            self.indexed = False
+            self.tag_index = document.tag_index
+            return
+
+        self.root = root
+        self.indexed = True
+        (self.elements, self.starts, self.ends, self.content_starts, self.content_ends,
+         self.parents, self.token_starts, self.token_ends, self.tokens) = parsed
+
+    def build(self, start, end, parent, parent_index, first_index, first_token, partial):
+        """
+        Internal method that parses text[start:end] under parent.
+
+        Parameters:
+        ----------
+        - start, end (int):
+            Span of text to parse.
+        - parent (Element):
+            Element the parsed elements are added to.
+        - parent_index (int):
+            Index of parent in self.elements.
+        - first_index, first_token (int):
+            Index in self.elements and self.tokens the results will start at.
+        - partial (bool):
+            Whether the span must hold whole elements only. If False, as for
+            the whole document, elements left open end with the text.
+
+        Returns:
+        --------
+        tuple of lists:
+            elements, starts, ends, content_starts, content_ends, parents,
+            token_starts, token_ends and tokens for the parsed span.
+
+        Raises:
+        -------
+        ValueError:
+            If a closing tag has no opening tag in the span, or partial is
+            True and an element or comment is left open.
+        """
+
+        elements = []
+        starts = []
+        ends = []
+        content_starts = []
+        content_ends = []
+        parents = []
+        token_starts = []
+        token_ends = []
+        tokens = []
+
+        stack = [parent]
+        index_stack = [parent_index]
+        # like XML_Document, a stray closing tag may close the document
+        # itself, as long as nothing comes after it
+        closed = False
+
+        for token_start, token_end, token in iter_token_spans(self.text, start, end):
+            if (closed):
+                raise ValueError(f"Token {token!r} at index {token_start} is after the end of the document.")
+            # an unclosed comment may end past the span, in the rest of the text
+            if (partial and token[0] == '<' and COMMENT_START_PATTERN.match(self.text, token_start)):
+                raise ValueError(f"Comment at index {token_start} is not closed.")
+            tokens.append(token)
+
+            # Opening tag
+            if (token[0] == '<' and (token[1] != '/' or token[-2] == '/')):
+                name, list_of_attributes = get_attr(token)
+                new_element = Element(name, stack[-1], list_of_attributes)
+                add_child(stack[-1], new_element)
+
+                elements.append(new_element)
+                starts.append(token_start)
+                parents.append(index_stack[-1])
+                token_starts.append(first_token + len(tokens) - 1)
+
+                # Not a self-closing tag, the rest is filled in when it closes
+                if (token[-2] != "/"):
+                    ends.append(None)
+                    content_starts.append(token_end)
+                    content_ends.append(None)
+                    token_ends.append(None)
+                    stack.append(new_element)
+                    index_stack.append(first_index + len(elements) - 1)
+                else:
+                    ends.append(token_end)
+                    content_starts.append(token_end)
+                    content_ends.append(token_start)
+                    token_ends.append(first_token + len(tokens))
+
+            # Closing tag
+            elif (token[0] == '<' and token[1] == '/'):
+                if (len(stack) == 1):
+                    if (partial):
+                        raise ValueError(f"Closing tag {token} at index {token_start} was never opened.")
+                    parent.content = parent.content.rstrip()
+                    closed = True
+                    continue
+                stack[-1].content = stack[-1].content.rstrip()
+                stack.pop()
+                i = index_stack.pop() - first_index
+                ends[i] = token_end
+                content_ends[i] = token_start
+                token_ends[i] = first_token + len(tokens)
+
+            # Text content between tags
+            else:
+                stack[-1].content += token + ' '
+
+        if (len(stack) > 1):
+            if (partial):
+                raise ValueError(f"Tag <{stack[-1].name}> is not closed.")
+            while (len(stack) > 1):
+                stack.pop()
+                i = index_stack.pop() - first_index
+                ends[i] = content_ends[i] = end
+                token_ends[i] = first_token + len(tokens)
+
+        return (elements, starts, ends, content_starts, content_ends,
+                parents, token_starts, token_ends, tokens)
+
+    def find_enclosing(self, start, end):
+        """
+        Finds the innermost element whose content, between its two tags,
+        contains text[start:end].
+
+        Parameters:
+        ----------
+        - start, end (int):
+            Span of text.
+
+        Returns:
+        --------
+        int:
+            Index of the element in self.elements, -1 if there is none.
+        """
+
+        # any element containing start is the last element opened before
+        # it, or one of that element's ancestors
+        index = bisect_right(self.starts, start) - 1
+        while (index >= 0 and not (self.content_starts[index] <= start and end <= self.content_ends[index])):
+            index = self.parents[index]
+        return index
+
+    def edit(self, start, end, replacement):
+        """
+        Replaces text[start:end] with replacement, then re-parses the
+        smallest element containing the edit, or the whole text if the
+        edit is not inside any element's content, leaves it unbalanced or
+        may start or end a comment, see near_comment_delimiter().
+
+        Parameters:
+        ----------
+        - start, end (int):
+            Span of the current text to replace.
+        - replacement (str):
+            New text for that span.
+        """
+
+        index = self.find_enclosing(start, end)
+        delta = len(replacement) - (end - start)
+        # a comment opened or closed here may reach past the element
+        comment = self.unclosed_comment or near_comment_delimiter(self.text, start, end)
+        self.text = self.text[:start] + replacement + self.text[end:]
+        comment = comment or near_comment_delimiter(self.text, start, start + len(replacement))
+
+        if (index < 0 or comment):
+            self.parse()
+            return
+
+        try:
+            self.reparse(index, delta)
+        except ValueError:
+            self.parse()
+
+    def reparse(self, index, delta):
+        """
+        Internal method that re-parses one element after its content changed
+        length by delta, and splices the result into the tree. This updates
+        the tree and all position lists in-place.
+
+        Raises:
+        -------
+        ValueError:
+            If the element's new text is not exactly one whole element with
+            the same name. Nothing is changed in that case.
+        """
+
+        old_element = self.elements[index]
+        parent = old_element.parent
+        start = self.starts[index]
+        old_end = self.ends[index]
+        # elements after the old subtree start at or after its end
+        subtree_end = bisect_left(self.starts, old_end, index + 1)
+        token_start = self.token_starts[index]
+        token_end = self.token_ends[index]
+
+        scratch = Element(parent.name, None, [])
+        parsed = self.build(start, old_end + delta, scratch, self.parents[index],
+                            index, token_start, partial=True)
+        if (len(scratch.children) != 1 or len(scratch.children[0]) != 1
+                or scratch.content or scratch.children[0][0].name != old_element.name):
+            raise ValueError("Edit changed the structure around the element.")
+
+        new_element = scratch.children[0][0]
+        new_element.parent = parent
+        siblings = parent.child_index[old_element.name]
+        siblings[siblings.index(old_element)] = new_element
+
+        (elements, starts, ends, content_starts, content_ends,
+         parents, token_starts, token_ends, tokens) = parsed
+
+        # the new elements take the places of the old ones in tag_index if
+        # they have the same names, e.g. after an edit of text content
+        if (self.tag_index is not None):
+            old_elements = self.elements[index:subtree_end]
+            if (len(elements) == len(old_elements)
+                    and all(new.name == old.name for new, old in zip(elements, old_elements))):
+                for element, position in zip(elements, self.tag_positions[index:subtree_end]):
+                    self.tag_index[element.name][position] = element
+            else:
+                self.tag_index = None
+                self.tag_positions = []
+        count_delta = len(elements) - (subtree_end - index)
+        token_delta = len(tokens) - (token_end - token_start)
+
+        self.elements[index:subtree_end] = elements
+        self.starts[index:subtree_end] = starts
+        self.ends[index:subtree_end] = ends
+        self.content_starts[index:subtree_end] = content_starts
+        self.content_ends[index:subtree_end] = content_ends
+        self.parents[index:subtree_end] = parents
+        self.token_starts[index:subtree_end] = token_starts
+        self.token_ends[index:subtree_end] = token_ends
+        self.tokens[token_start:token_end] = tokens
+
+        # everything after the new subtree moves
+        following = index + len(elements)
+        if (delta):
+            for positions in (self.starts, self.ends, self.content_starts, self.content_ends):
+                positions[following:] = [position + delta for position in positions[following:]]
+        if (count_delta):
+            self.parents[following:] = [i + count_delta if i >= subtree_end else i
+                                        for i in self.parents[following:]]
+        if (token_delta):
+            for positions in (self.token_starts, self.token_ends):
+                positions[following:] = [position + token_delta for position in positions[following:]]
+
+        # and the ancestors grow or shrink around it
+        ancestor = self.parents[index]
+        while (ancestor >= 0):
+            self.ends[ancestor] += delta
+            self.content_ends[ancestor] += delta
+            self.token_ends[ancestor] += token_delta
+            ancestor = self.parents[ancestor]
+
+    def update(self, text):
+        """
+        Brings the tree up to date with a new version of the whole text,
+        e.g. the contents of an editor, treating everything between the
+        common prefix and suffix of the old and new text as one edit.
+
+        Parameters:
+        ----------
+        - text (str):
+            New XML string.
+        """
+
+        if (text == self.text):
+            return
+
+        prefix = common_prefix_length(self.text, text)
+        suffix = common_suffix_length(self.text, text, min(len(self.text), len(text)) - prefix)
+        self.edit(prefix, len(self.text) - suffix, text[prefix:len(text) - suffix])
+
+    def prettify(self, tab_length=4):
+        """
+        Prettifies the current text without tokenizing it again.
+
+        Parameters:
+        ----------
+        - tab_length (int, optional):
+            Desired tab length (in spaces) for indentation. (Default is 4)
+
+        Returns:
+        --------
+        str:
+            Prettified text, as formatting.prettify(self.text).
+        """
+
+        if (not self.indexed):
+            return prettify(self.text, tab_length)
+        return ''.join(prettify_chunks([''.join(self.tokens)], tab_length))
+
+    def index_tags(self):
+        """
+        Internal method that builds tag_index and tag_positions from elements.
+        """
+
+        self.tag_index = {}
+        self.tag_positions = []
+        for element in self.elements:
+            elements = self.tag_index.get(element.name)
+            if (elements is None):
+                elements = self.tag_index[element.name] = []
+            self.tag_positions.append(len(elements))
+            elements.append(element)
+
+    def query(self, path):
+        """
+        Finds the elements matching an XPath-like path, see xml_query.query().
+        Descendant steps look elements up in tag_index, which is built again
+        only after an edit changed which elements there are.
+        """
+
+        if (self.tag_index is None):
+            self.index_tags()
+        return query(self.root, path, self.tag_index)
+
+def near_comment_delimiter(text, start, end):
+    """
+    Checks whether changing text[start:end] may start or end a comment:
+    whether it holds a '-', or touches a run of whitespace, '<', '!', '-'
+    and '>' (the characters of COMMENT_PATTERN's delimiters) holding one.
+    """
+
+    while (start > 0 and (text[start - 1] in '<!->' or text[start - 1].isspace())):
+        start -= 1
+    while (end < len(text) and (text[end] in '<!->' or text[end].isspace())):
+        end += 1
+    return '-' in text[start:end]
+
+def common_prefix_length(first, second):
+    """
+    Gets the length of the longest common prefix of two strings, comparing
+    blocks of doubling size so the work stays linear.
+    """
+
+    length = 0
+    block = 1024
+    limit = min(len(first), len(second))
+    while (length < limit):
+        size = min(block, limit - length)
+        if (first[length:length + size] == second[length:length + size]):
+            length += size
+            block *= 2
+        elif (size == 1):
+            break
+        else:
+            block = size // 2
+    return length
+
+def common_suffix_length(first, second, limit):
+    """
+    Gets the length of the longest common suffix of two strings, up to limit.
+    """
+
+    length = 0
+    block = 1024
+    while (length < limit):
+        size = min(block, limit - length)
+        if (first[len(first) - length - size:len(first) - length]
+                == second[len(second) - length - size:len(second) - length]):
+            length += size
+            block *= 2
+        elif (size == 1):
+            break
+        else:
+            block = size // 2
+    return length
@@ -0,0 +1,364 @@
+import re
+import json
+from formatting import iter_text_chunks, prettify_chunks
+
+# One JSON token after optional whitespace: punctuation, a string (its
+# raw contents in group 2), a number or a literal.
+JSON_TOKEN_PATTERN = re.compile(r'[ \t\n\r]*(?:([{}\[\]:,])'
+                                r'|"((?:[^"\\\x00-\x1f]|\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4}))*)"'
+                                r'|(-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?)'
+                                r'|(true|false|null))')
+JSON_SPACE_PATTERN = re.compile(r'[ \t\n\r]*')
+# Keys that can be used as element and attribute names.
+NAME_PATTERN = re.compile(r'[^\s<>&"\'=/!?]+')
+# Characters escaped in text content and attribute values. An '&' that
+# already starts an entity is kept, XML2JSON does not decode them either.
+TEXT_ESCAPE_PATTERN = re.compile(r'&(?!(?:[A-Za-z_][\w.-]*|#[0-9]+|#x[0-9A-Fa-f]+);)|[<>]')
+ATTRIBUTE_ESCAPE_PATTERN = re.compile(r'&(?!(?:[A-Za-z_][\w.-]*|#[0-9]+|#x[0-9A-Fa-f]+);)|[<>"]')
+XML_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'}
+# Minified output is handed on in pieces of about this many characters.
+OUTPUT_CHUNK_SIZE = 1 << 16
+
+def iter_json_events(source, chunk_size=1 << 16):
+    """
+    Parses JSON while reading it, yielding one event per token, so
+    documents far larger than memory can be read.
+
+    Parameters:
+    ----------
+    - source (str, file-like object or iterable of str/bytes):
+        JSON text, see formatting.iter_text_chunks().
+    - chunk_size (int, optional):
+        Read size for file-like objects. (Default is 65536)
+
+    Returns:
+    --------
+    generator of tuple:
+        ("start_map", None), ("key", str), ("end_map", None),
+        ("start_array", None), ("end_array", None), ("string", str),
+        ("number", str) with the number as written, ("boolean", bool)
+        and ("null", None), in document order.
+
+    Raises:
+    -------
+    ValueError:
+        If the text is not valid JSON.
+    """
+
+    chunks = iter_text_chunks(source, chunk_size)
+    buffer = ""
+    position = 0
+    # characters dropped from the front of buffer, for error messages
+    offset = 0
+    at_end = False
+
+    # containers open around the current token, '{' or '['
+    stack = []
+    # what may come next: "value", "key", "colon", "comma", "first value"
+    # or "first key" right after a '[' or '{', and "end" after the
+    # top-level value
+    expected = "value"
+
+    while (True):
+        match = JSON_TOKEN_PATTERN.match(buffer, position)
+        # a token touching the end of the buffer may go on in the next
+        # chunk, and a number may be followed by the start of ".5" or "e+5"
+        if (not at_end and (match is None or match.end() == len(buffer)
+                            or (match.group(3) and len(buffer) - match.end() < 3))):
+            chunk = next(chunks, None)
+            if (chunk is None):
+                at_end = True
+            else:
+                offset += position
+                buffer = buffer[position:] + chunk
+                position = 0
+            continue
+
+        if (match is None):
+            position = JSON_SPACE_PATTERN.match(buffer, position).end()
+            if (position == len(buffer) and expected == "end"):
+                return
+            found = repr(buffer[position]) if position < len(buffer) else "end of text"
+            raise ValueError(f"Invalid JSON: unexpected {found} at character {offset + position}.")
+
+        punctuation, string, number, literal = match.groups()
+        start = match.start(match.lastindex)
+        position = match.end()
+
+        if (punctuation == ','):
+            if (expected != "comma"):
+                raise ValueError(f"Invalid JSON: unexpected ',' at character {offset + start}.")
+            expected = "key" if stack[-1] == '{' else "value"
+            continue
+        if (punctuation == ':'):
+            if (expected != "colon"):
+                raise ValueError(f"Invalid JSON: unexpected ':' at character {offset + start}.")
+            expected = "value"
+            continue
+        if (punctuation in ('}', ']')):
+            opener = '{' if punctuation == '}' else '['
+            if (not stack or stack[-1] != opener
+                    or expected not in ("comma", "first key" if opener == '{' else "first value")):
+                raise ValueError(f"Invalid JSON: unexpected {punctuation!r} at character {offset + start}.")
+            stack.pop()
+            expected = "comma" if stack else "end"
+            yield ("end_map" if opener == '{' else "end_array", None)
+            continue
+
+        if (string is not None and '\\' in string):
+            string = json.loads(f'"{string}"')
+        if (expected in ("key", "first key")):
+            if (string is None):
+                raise ValueError(f"Invalid JSON: expected a key at character {offset + start}.")
+            expected = "colon"
+            yield ("key", string)
+            continue
+        if (expected not in ("value", "first value")):
+            raise ValueError(f"Invalid JSON: unexpected value at character {offset + start}.")
+
+        if (punctuation == '{'):
+            stack.append('{')
+            expected = "first key"
+            yield ("start_map", None)
+            continue
+        if (punctuation == '['):
+            stack.append('[')
+            expected = "first value"
+            yield ("start_array", None)
+            continue
+
+        expected = "comma" if stack else "end"
+        if (string is not None):
+            yield ("string", string)
+        elif (number is not None):
+            yield ("number", number)
+        elif (literal == "null"):
+            yield ("null", None)
+        else:
+            yield ("boolean", literal == "true")
+
+def escape_text(text):
+    """
+    Escapes '&', '<' and '>' in text content, see TEXT_ESCAPE_PATTERN.
+    """
+
+    return TEXT_ESCAPE_PATTERN.sub(lambda match: XML_ESCAPES[match.group()[0]], text)
+
+def escape_attribute(text):
+    """
+    Escapes '&', '<', '>' and '"' in an attribute value, see
+    ATTRIBUTE_ESCAPE_PATTERN.
+    """
+
+    return ATTRIBUTE_ESCAPE_PATTERN.sub(lambda match: XML_ESCAPES[match.group()[0]], text)
+
+def scalar_text(event, value):
+    """
+    Internal function that gets the XML text of a JSON string, number,
+    boolean or null, None if the event is not one of them.
+    """
+
+    if (event == "string" or event == "number"):
+        return value
+    if (event == "boolean"):
+        return "true" if value else "false"
+    if (event == "null"):
+        return ""
+    return None
+
+def check_name(name):
+    """
+    Internal function that checks a key can be used as an XML name.
+
+    Raises:
+    -------
+    ValueError:
+        If it can not.
+    """
+
+    if (not NAME_PATTERN.fullmatch(name)):
+        raise ValueError(f"{name!r} can not be used as an XML name.")
+
+def iter_xml(events):
+    """
+    Converts JSON events to minified XML, reading the JSON the way
+    XML2JSON writes it: object keys are child elements, "_text" is text
+    content, "#name" keys are attributes, and an array is one element per
+    member, all with the array's key as name. Strings, numbers and
+    booleans become text content, empty strings and null empty elements.
+
+    Parameters:
+    ----------
+    - events (iterable of tuple):
+        JSON events, see iter_json_events(). The top-level value must be
+        an object, its keys are the top-level elements.
+
+    Returns:
+    --------
+    generator of str:
+        Minified XML, split only between two tags.
+
+    Raises:
+    -------
+    ValueError:
+        If the JSON has no XML form, e.g. a key is not a valid name, an
+        attribute is not a scalar, comes after its element's children,
+        or an array holds arrays.
+    """
+
+    events = iter(events)
+    event, _ = next(events, (None, None))
+    if (event != "start_map"):
+        raise ValueError("The top-level JSON value must be an object.")
+
+    pieces = []
+    size = 0
+    # whether the last piece is text content, which must be followed by a
+    # tag in the same chunk
+    after_text = False
+    # One frame per open JSON container: [name, kind, pending key, whether
+    # the opening tag still takes attributes, text content read before the
+    # opening tag was finished]. kind is "document" for the top-level
+    # object, "element" for other objects and "array".
+    stack = [[None, "document", None, False, ""]]
+
+    for event, value in events:
+        frame = stack[-1]
+        name, kind, key, open_tag, pending_text = frame
+
+        if (event == "key"):
+            if (kind == "document" and (value == "_text" or value[:1] == '#')):
+                raise ValueError(f"Top-level key {value!r} has no element to belong to.")
+            frame[2] = value
+            continue
+
+        if (event == "end_map" or event == "end_array"):
+            stack.pop()
+            if (kind == "element"):
+                if (open_tag and not pending_text):
+                    pieces.append("/>")
+                elif (open_tag):
+                    pieces.append(f">{escape_text(pending_text)}</{name}>")
+                else:
+                    pieces.append(f"</{name}>")
+                size += len(name) + len(pending_text) + 3
+                after_text = False
+            continue
+
+        text = scalar_text(event, value)
+
+        if (kind == "array"):
+            child = name
+        else:
+            child = key
+            frame[2] = None
+
+            # XML2JSON writes the text before the attributes, so it waits
+            # until the opening tag is finished
+            if (kind == "element" and child == "_text"):
+                if (text is None):
+                    raise ValueError(f"_text of <{name}> must be a string, number, boolean or null.")
+                if (open_tag):
+                    frame[4] += text
+                elif (text):
+                    pieces.append(escape_text(text))
+                    size += len(text)
+                    after_text = True
+                continue
+
+            if (kind == "element" and child[0] == '#'):
+                if (text is None):
+                    raise ValueError(f"Attribute {child} of <{name}> must be a string, number, boolean or null.")
+                if (not open_tag):
+                    raise ValueError(f"Attribute {child} of <{name}> comes after its children.")
+                check_name(child[1:])
+                pieces.append(f' {child[1:]}="{escape_attribute(text)}"')
+                size += len(child) + len(text) + 4
+                continue
+
+            # a child element, the parent's opening tag is complete
+            if (open_tag):
+                pieces.append('>')
+                if (pending_text):
+                    pieces.append(escape_text(pending_text))
+                    size += len(pending_text)
+                    after_text = True
+                frame[3] = False
+                frame[4] = ""
+
+        # between two tags, a safe point to hand the XML so far on
+        if (size >= OUTPUT_CHUNK_SIZE and not after_text):
+            yield ''.join(pieces)
+            pieces = []
+            size = 0
+
+        if (event == "start_array"):
+            if (kind == "array"):
+                raise ValueError(f"Array of arrays in {name!r} has no XML form.")
+            check_name(child)
+            stack.append([child, "array", None, False, ""])
+        elif (event == "start_map"):
+            check_name(child)
+            pieces.append(f'<{child}')
+            size += len(child) + 1
+            after_text = False
+            stack.append([child, "element", None, True, ""])
+        else:
+            check_name(child)
+            if (text):
+                pieces.append(f'<{child}>{escape_text(text)}</{child}>')
+            else:
+                pieces.append(f'<{child}/>')
+            size += 2 * len(child) + len(text) + 5
+            after_text = False
+
+    if (len(stack) > 0):
+        raise ValueError("Invalid JSON: the text ends inside an object or array.")
+    if (pieces):
+        yield ''.join(pieces)
+
+def json2xml_stream(source, sink, tab_length=None, chunk_size=1 << 16):
+    """
+    Converts JSON to XML while reading it, writing the XML to sink as it
+    is produced, so memory stays bounded whatever the size of the JSON.
+
+    Parameters:
+    ----------
+    - source (str, file-like object or iterable of str/bytes):
+        JSON text, see formatting.iter_text_chunks().
+    - sink (file-like object):
+        Text sink, anything with a write(str) method.
+    - tab_length (int, optional):
+        Indentation of prettified output. (Default is None, minified)
+    - chunk_size (int, optional):
+        Read size for file-like objects. (Default is 65536)
+    """
+
+    chunks = iter_xml(iter_json_events(source, chunk_size))
+    if (tab_length is not None):
+        chunks = prettify_chunks(chunks, tab_length)
+    for chunk in chunks:
+        sink.write(chunk)
+
+def json2xml(text, tab_length=None):
+    """
+    Wrapper function that converts a JSON string to XML, the reverse of
+    xml2json.xml2json().
+
+    Parameters:
+    ----------
+    - text (str):
+        JSON string, see iter_xml() for how it maps to XML.
+    - tab_length (int, optional):
+        Indentation of prettified output. (Default is None, minified)
+
+    Returns:
+    --------
+    str:
+        XML text.
+    """
+
+    chunks = iter_xml(iter_json_events(text))
+    if (tab_length is not None):
+        chunks = prettify_chunks(chunks, tab_length)
+    return ''.join(chunks)
@@ -0,0 +1,205 @@
+import sys
+from collections import OrderedDict
+from hashlib import blake2b
+
+# Default memory budget of the shared cache, in bytes.
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Rough memory used by a tree or social graph per character of the text
+# it was built from, for artifacts whose size can not be measured directly.
+OBJECT_BYTES_PER_CHARACTER = 8
+
+class Parse_Cache:
+    """
+    Least recently used cache of artifacts built from XML text, such as
+    the output of each GUI operation or its social graph. Entries are
+    keyed by a hash of the text, so asking again for the same text, e.g.
+    the unchanged editor content, skips building the artifact again.
+
+    Attributes:
+    ----------
+    - max_bytes (int):
+        Memory budget. The least recently used texts are evicted once the
+        estimated size of all artifacts goes over it.
+    - size (int):
+        Estimated size in bytes of all cached artifacts.
+    - hits, misses, evictions (int):
+        Number of artifacts found in the cache, built, and evicted.
+    - entries (OrderedDict of bytes to dict):
+        Artifacts of each text by kind, least recently used text first.
+
+    Methods:
+    --------
+    - get(text, kind, build):
+        Gets an artifact of text, building and caching it on a miss.
+    - peek(text, kind):
+        Gets an artifact of text if it is cached, without building it.
+    - put(text, kind, value):
+        Caches an artifact of text.
+    - clear():
+        Removes all artifacts.
+    - stats():
+        Summary of the counters.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Parameters:
+        ----------
+        - max_bytes (int, optional):
+            Memory budget in bytes. (Default is 256 MiB)
+        """
+
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.entries = OrderedDict()
+
+    def get(self, text, kind, build):
+        """
+        Gets an artifact of text, building and caching it if it is not
+        cached yet.
+
+        Parameters:
+        ----------
+        - text (str):
+            Text the artifact is built from.
+        - kind (str):
+            Name of the artifact, e.g. "json" or "graph".
+        - build (function):
+            Called with text on a miss, returns the artifact.
+
+        Returns:
+        --------
+        object:
+            The artifact.
+        """
+
+        key = text_key(text)
+        entry = self.entries.get(key)
+        if (entry is not None and kind in entry):
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[kind][0]
+
+        self.misses += 1
+        value = build(text)
+        self.store(key, kind, value, estimate_size(value, text))
+        return value
+
+    def peek(self, text, kind):
+        """
+        Gets an artifact of text if it is cached, without building it or
+        changing the counters.
+
+        Returns:
+        --------
+        object:
+            The artifact, None if it is not cached.
+        """
+
+        entry = self.entries.get(text_key(text))
+        if (entry is None or kind not in entry):
+            return None
+        return entry[kind][0]
+
+    def put(self, text, kind, value):
+        """
+        Caches an artifact of text, replacing any artifact of the same kind.
+        """
+
+        self.store(text_key(text), kind, value, estimate_size(value, text))
+
+    def store(self, key, kind, value, size):
+        """
+        Internal method that adds an artifact under a text's key and evicts
+        the least recently used texts until the cache fits its budget.
+        Artifacts larger than the whole budget are not cached.
+        """
+
+        if (size > self.max_bytes):
+            return
+
+        entry = self.entries.get(key)
+        if (entry is None):
+            entry = self.entries[key] = {}
+        elif (kind in entry):
+            self.size -= entry[kind][1]
+        entry[kind] = (value, size)
+        self.size += size
+        self.entries.move_to_end(key)
+
+        while (self.size > self.max_bytes):
+            _, evicted = self.entries.popitem(last=False)
+            for _, evicted_size in evicted.values():
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Removes all artifacts. The counters are kept.
+        """
+
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        """
+        Gets a one-line summary of the counters.
+
+        Returns:
+        --------
+        str:
+            Hits, misses, hit rate, evictions and memory use.
+        """
+
+        lookups = self.hits + self.misses
+        rate = 100 * self.hits / lookups if lookups else 0
+        return (f"{self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate), "
+                f"{self.evictions} evictions, {self.size / 1e6:.1f} of "
+                f"{self.max_bytes / 1e6:.1f} MB used by {len(self.entries)} texts")
+
+def text_key(text):
+    """
+    Gets the cache key of a text, a 128-bit BLAKE2 hash of its contents.
+
+    Parameters:
+    ----------
+    - text (str):
+        Text to hash.
+
+    Returns:
+    --------
+    bytes:
+        16-byte digest.
+    """
+
+    return blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+def estimate_size(value, text):
+    """
+    Estimates the memory used by an artifact. Strings and lists of strings
+    are measured, anything else is assumed to grow with the text.
+
+    Parameters:
+    ----------
+    - value (object):
+        Artifact to measure.
+    - text (str):
+        Text the artifact was built from.
+
+    Returns:
+    --------
+    int:
+        Size in bytes.
+    """
+
+    if (isinstance(value, str)):
+        return sys.getsizeof(value)
+    if (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+        return sys.getsizeof(value) + sum(map(sys.getsizeof, value))
+    return OBJECT_BYTES_PER_CHARACTER * len(text)
+
+# Cache shared by everything in the process.
+parse_cache = Parse_Cache()
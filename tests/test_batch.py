@@ -0,0 +1,30 @@
+import io
+import os
+import shutil
+
+from batch import find_input_files, run_batch
+
+TEST_FILES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_files')
+
+
+def test_rerun_in_the_same_directory_skips_outputs(tmp_path):
+    shutil.copy(os.path.join(TEST_FILES, 'sample_input.xml'), tmp_path / 'a.xml')
+    shutil.copy(os.path.join(TEST_FILES, 'repeated_elements.xml'), tmp_path / 'b.xml')
+    pattern = str(tmp_path / '*.xml')
+
+    for operation in ('minify', 'prettify', 'correct_xml', 'minify', 'prettify'):
+        files = find_input_files([pattern])
+        assert [os.path.basename(path) for path in files] == ['a.xml', 'b.xml']
+        assert run_batch(files, operation, workers=1, out=io.StringIO()) == 0
+
+    assert sorted(os.listdir(tmp_path)) == sorted(name + suffix for name in ('a', 'b')
+                                                  for suffix in ('.xml', '.min.xml', '.pretty.xml', '.corrected.xml'))
+    assert find_input_files([str(tmp_path)]) == find_input_files([pattern])
+
+
+def test_output_given_by_name_is_kept(tmp_path):
+    path = tmp_path / 'a.min.xml'
+    path.write_text('<a/>')
+
+    assert find_input_files([str(path)]) == [str(path)]
+    assert find_input_files([str(tmp_path / '*.xml')]) == []
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from correct_xml import correct_xml, correct_xml_file, correction_edits, apply_edits
+from formatting import minify, prettify
+
+TEST_FILES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_files')
+NAMES = sorted(name for name in os.listdir(TEST_FILES) if name.endswith('.xml'))
+
+
+@pytest.mark.parametrize('name', NAMES)
+def test_edits_give_the_same_text_as_correct_xml(name, tmp_path):
+    path = os.path.join(TEST_FILES, name)
+    with open(path, encoding='utf-8') as file:
+        xml = file.read()
+    expected = correct_xml(xml)
+
+    assert prettify(minify(apply_edits(xml, correction_edits(xml)))) == expected
+    # tiny reads only on small files, to keep the test fast
+    chunk_sizes = (1, 7, 1 << 16) if os.path.getsize(path) < 1 << 16 else (4093, 1 << 16)
+    for chunk_size in chunk_sizes:
+        destination = tmp_path / 'corrected.xml'
+        correct_xml_file(path, str(destination), chunk_size)
+        assert prettify(minify(destination.read_text(encoding='utf-8'))) == expected
+
+
+def test_edits_keep_spaces_like_correct_xml():
+    xml = '<r><a >x \n  y  z</a>< b x="1">\t u  v <c>w  \t t</b>'
+    assert prettify(minify(apply_edits(xml, correction_edits(xml)))) == correct_xml(xml)
@@ -0,0 +1,48 @@
+import random
+
+from formatting import Safe_Cut_Finder, find_safe_cut, minify, minify_stream
+
+LONG_TEXT = '<r><a>x</a><t>' + 'word ' * 200000 + '</t><a> y </a></r>'
+LONG_COMMENT = '<r><a>x</a><!-- ' + 'note ' * 200000 + ' --><a> y </a></r>'
+
+
+def split(text, size):
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+def test_long_text_and_comment_are_read_once():
+    for document in (LONG_TEXT, LONG_COMMENT):
+        finder = Safe_Cut_Finder()
+        pending = ''
+        reread = 0
+        for chunk in split(document, 1024):
+            # an open comment is only searched for its end
+            start = finder.start if finder.comment_end is None else finder.comment_end
+            reread += len(pending) - start
+            pending += chunk
+            cut = finder.find(pending)
+            if (cut):
+                pending = pending[cut:]
+
+        # only the few characters before each chunk are read again
+        assert reread < len(document) // 100
+        assert ''.join(minify_stream(split(document, 1024))) == minify(document)
+
+
+def test_finder_matches_find_safe_cut():
+    pieces = ['<a>', '</a>', ' ', '\n', 'text', '<!-- c -->', '<!--x - y-->', '<!-- <a> > -->',
+              '<b x="1">', '<c/>', '< b >', '</ b>', '>']
+    for seed in range(2000):
+        rnd = random.Random(seed)
+        document = ''.join(rnd.choice(pieces) for _ in range(rnd.randint(1, 30)))
+        finder = Safe_Cut_Finder()
+        pending = ''
+        position = 0
+        while (position < len(document)):
+            size = rnd.randint(1, 5)
+            pending += document[position:position + size]
+            position += size
+            cut = finder.find(pending)
+            assert cut == find_safe_cut(pending)
+            if (cut):
+                pending = pending[cut:]
@@ -0,0 +1,60 @@
+import os
+import random
+
+from incremental_document import Incremental_XML_Document
+from xml_document import XML_Document
+
+TEST_FILES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_files')
+
+
+def insert(document, index, text):
+    document.edit(index, index, text)
+
+
+def test_comment_closed_after_the_element():
+    document = Incremental_XML_Document('<r><a>one</a><b>two</b></r>')
+    insert(document, document.text.index('<a>'), '<!--')
+    insert(document, document.text.index('two') + len('two'), '-->')
+
+    assert document.text == '<r><!--<a>one</a><b>two--></b></r>'
+    assert document.tokens == XML_Document(document.text).tokens == ['<r>', '</b>', '</r>']
+
+
+def test_comment_delimiter_completed_by_an_edit():
+    document = Incremental_XML_Document('<r><a>one</a><b>tw- -o</b></r>')
+    insert(document, document.text.index('<a>'), '<!--')
+    # '- -' followed by '>' ends the comment
+    insert(document, document.text.index('o</b>'), '>')
+
+    assert document.tokens == XML_Document(document.text).tokens
+
+
+def test_query_after_edits_uses_document_order():
+    document = Incremental_XML_Document('<r><x>1</x><x>2</x><y><x>3</x></y><x>4</x></r>')
+    insert(document, document.text.index('3'), '0')
+
+    assert [element.content for element in document.query('//x')] == ['1', '2', '03', '4']
+    insert(document, document.text.index('<y>') + 3, '<x>5</x>')
+    assert [element.content for element in document.query('//x')] == ['1', '2', '5', '03', '4']
+
+
+def test_random_edits_match_a_fresh_parse():
+    with open(os.path.join(TEST_FILES, 'sample_input.xml'), encoding='utf-8') as file:
+        text = file.read()
+    pieces = ['<!--', '-->', '--', '-', '<', '>', '<a>', '</a>', 'x', ' ', '<b/>', '</id>']
+    generator = random.Random(5)
+
+    for _ in range(40):
+        document = Incremental_XML_Document(text)
+        for _ in range(20):
+            start = generator.randint(0, len(document.text))
+            end = min(len(document.text), start + generator.choice([0, 0, 1, 3]))
+            try:
+                document.edit(start, end, generator.choice(pieces))
+                expected = XML_Document(document.text)
+            except IndexError:
+                # more closing tags than opening tags
+                break
+            assert document.tokens == expected.tokens
+            assert ([element.content for element in document.query('//id')]
+                    == [element.content for element in expected.query('//id')])
@@ -0,0 +1,54 @@
+import io
+import json
+import tracemalloc
+
+import xml2json
+from xml2json import xml2json_stream
+
+RECORD = '<user id="{0}"><name>User {0}</name><posts><post>a</post><post>b</post></posts></user>'
+
+
+class Counting_Sink:
+    """Sink that only counts what is written to it."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text)
+
+
+def stream(source):
+    sink = io.StringIO()
+    xml2json_stream(source, sink)
+    return sink.getvalue()
+
+
+def test_stream_matches_xml2json():
+    for xml in ('<a>1</a><a>2</a>',
+                '<r><meta>m</meta><users><user>1</user><user>2</user></users></r>',
+                '<r><meta>m</meta><u>1</u><u x="2">2</u><meta>z</meta><u/></r>',
+                '<r a="1"><b><c>1</c></b><b>2</b><d/></r>'):
+        assert stream(xml) == xml2json.xml2json(xml)
+
+
+def peak_memory(xml):
+    chunks = (xml[start:start + 4096] for start in range(0, len(xml), 4096))
+    tracemalloc.start()
+    try:
+        xml2json_stream(chunks, Counting_Sink())
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_stream_memory_is_bounded_for_a_repeated_group_that_is_not_first(monkeypatch):
+    monkeypatch.setattr(xml2json, 'JSON_BUFFER_SIZE', 1 << 12)
+
+    for template in ('<root><meta>m</meta><users>{}</users></root>', '<root><meta>m</meta>{}</root>'):
+        small, large = (template.format(''.join(RECORD.format(index) for index in range(count)))
+                        for count in (1000, 4000))
+        assert json.loads(stream(small)) == json.loads(xml2json.xml2json(small))
+
+        # four times the records, about the same memory
+        assert peak_memory(large) < 2 * peak_memory(small)
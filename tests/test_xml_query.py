@@ -0,0 +1,92 @@
+import os
+import random
+
+import pytest
+
+from xml_document import XML_Document
+from xml_query import query
+
+TEST_FILES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_files')
+
+
+def contents(elements):
+    return [element.content for element in elements]
+
+
+def test_descendants_without_index_in_document_order():
+    document = XML_Document('<r><x>1</x><y><x>2</x><x>3</x></y><z><x>4</x></z></r>')
+
+    assert contents(query(document.root, '//x')) == ['1', '2', '3', '4']
+    assert contents(query(document.root, '//x')) == contents(document.query('//x'))
+
+
+def test_descendants_of_interleaved_siblings_in_document_order():
+    document = XML_Document('<r><x>1</x><x>2</x><y><x>3</x></y><x>4</x><y><x>5</x></y><x>6</x></r>')
+
+    assert contents(query(document.root, '//x')) == ['1', '2', '3', '4', '5', '6']
+    assert contents(document.query('//x')) == ['1', '2', '3', '4', '5', '6']
+    assert [element.name for element in document.root.get_children('r')[0].iter_children()] == [
+        'x', 'x', 'y', 'x', 'y', 'x']
+
+
+def test_interleaved_siblings_keep_their_order_in_snapshots(tmp_path):
+    text = '<r><a>1</a><b><a>2</a></b><a>3</a><c/><b><a>4</a></b></r>'
+    XML_Document(text).save_snapshot(str(tmp_path / 'snapshot'))
+    document = XML_Document.from_snapshot(str(tmp_path / 'snapshot'), text)
+
+    assert contents(query(document.root, '//a')) == ['1', '2', '3', '4']
+
+
+def test_random_documents_give_the_same_order_with_and_without_index():
+    generator = random.Random(7)
+    for _ in range(200):
+        parts = []
+        for count in range(generator.randint(1, 30)):
+            parts.append(generator.choice(['<a>{}</a>', '<b>{}</b>', '<c><a>{}</a></c>', '<b><a>{}</a><c/></b>'])
+                         .format(count))
+        document = XML_Document('<r>' + ''.join(parts) + '</r>')
+
+        for path in ('//a', '//b', '//c', 'r//a', '//b//a'):
+            expected = [id(element) for element in document.query(path)]
+            assert [id(element) for element in query(document.root, path)] == expected
+
+
+@pytest.mark.parametrize('path', ['//user', '//name', '//post/topics/topic', 'users//id',
+                                  '//user[id=2]//topic', '//follower/id', '//*'])
+def test_indexed_and_unindexed_descendants_agree(path):
+    with open(os.path.join(TEST_FILES, 'sample_more_users_network.xml'), encoding='utf-8') as file:
+        document = XML_Document(file.read())
+
+    indexed = document.query(path)
+    assert indexed
+    assert [id(element) for element in query(document.root, path)] == [id(element) for element in indexed]
+
+
+POSITIONS = '<r><a>1</a><b>2</b><a>3</a><c><a>4</a><a>5</a><b>6</b></c><a>7</a></r>'
+
+
+def test_position_counts_siblings_of_the_same_name():
+    document = XML_Document(POSITIONS)
+
+    assert contents(document.query('/r/a[2]')) == ['3']
+    assert contents(document.query('//a[1]')) == ['1', '4']
+    assert contents(document.query('//a[2]')) == ['3', '5']
+    assert contents(document.query('//a[3]')) == ['7']
+
+
+def test_position_after_a_star_step_counts_each_name_on_its_own():
+    document = XML_Document(POSITIONS)
+
+    assert sorted((element.name, element.content) for element in document.query('/r/*[1]')) == [
+        ('a', '1'), ('b', '2'), ('c', '')]
+    assert sorted(contents(document.query('//c/*[1]'))) == ['4', '6']
+    assert contents(document.query('//*[2]')) == ['3', '5']
+    assert contents(query(document.root, '//*[2]')) == ['3', '5']
+
+
+def test_position_zero_or_past_the_end_matches_nothing():
+    document = XML_Document(POSITIONS)
+
+    for path in ('//a[0]', '/r/a[4]', '//b[2]', '//*[0]', '/r/*[9]'):
+        assert document.query(path) == []
+        assert query(document.root, path) == []
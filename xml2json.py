@@ -1,6 +1,24 @@
+import os
 import re
-from formatting import minify
-from xml_document import XML_Document
+import json
+import mmap
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from formatting import minify, iter_tokens, TOKEN_PATTERN
+from file_splitting import find_record_cuts, decode_text, MIN_PART_SIZE
+from xml_document import XML_Document, get_attr, iterparse, parse_events
+from xml_document_parts import Element
+
+# Characters that must be escaped inside JSON strings.
+JSON_ESCAPE_PATTERN = re.compile(r'["\\\x00-\x1f]')
+JSON_ESCAPES = {'"': '\\"', '\\': '\\\\', '\n': '\\n', '\r': '\\r', '\t': '\\t',
+                '\b': '\\b', '\f': '\\f'}
+# Commas XML2JSON leaves before a closing brace or bracket, or at the end.
+TRAILING_COMMA_PATTERN = re.compile(r',(?=\s+})|,(?=\s+])|,(?=\s+$)')
+# Characters of JSON XML2JSON_Stream keeps in memory for one child before
+# moving it to a temporary file, and reads back at a time.
+JSON_BUFFER_SIZE = 1 << 20
+JSON_COPY_SIZE = 1 << 16
 
 class XML2JSON:
     """
@@ -24,7 +42,7 @@ class XML2JSON:
         Internal method for parsing the xml text and constructing the json_list.
     """
 
-    def __init__(self, text, tab_length):
+    def __init__(self, text, tab_length, xml_tree=None):
         """
         Parameters:
         ----------
@@ -32,9 +50,12 @@ class XML2JSON:
             syntactically correct XML string.
         - tab_length (int):
             Desired tab length in spaces for the output JSON file.
+        - xml_tree (XML_Document, optional):
+            Already parsed tree of text, e.g. an Incremental_XML_Document
+            kept up to date by the editor. (Default is None, parse text)
         """
 
-        self.xml_tree = XML_Document(text)
+        self.xml_tree = xml_tree if xml_tree is not None else XML_Document(text)
         self.tab_length = tab_length
 
         self.json_list = []
@@ -42,7 +63,7 @@ class XML2JSON:
 
         self.json_text = ''.join(self.json_list)
         # Remove extra commas after every last nested child
-        self.json_text = re.sub(r',(?=\s+})|,(?=\s+])|,(?=\s+$)', r'', self.json_text)
+        self.json_text = TRAILING_COMMA_PATTERN.sub('', self.json_text)
 
     def add_json_children(self, node, single=True, tabs=""):
         """
@@ -113,3 +134,699 @@ def xml2json(text, tab_length=4):
     """
 
     return XML2JSON(text, tab_length).json_text
+
+def xml2json_parallel(path, tab_length=4, workers=None, parts=None):
+    """
+    Converts an XML file to JSON in several processes, giving the same text
+    as xml2json() on the file's contents.
+
+    The children of the top element, e.g. every <user> of <users>, are
+    split into byte ranges of about equal size by
+    file_splitting.find_record_cuts(). Each range is parsed and converted by
+    a worker process, while this process parses the text before the first
+    range and after the last one, then joins the converted children back
+    in document order. Files that can not be split this way are converted
+    in this process alone.
+
+    Parameters:
+    ----------
+    - path (str):
+        Path of a syntactically correct XML file, encoded as UTF-8.
+    - tab_length (int, optional):
+        Desired tab width for the output JSON string. (Default is 4)
+    - workers (int, optional):
+        Number of worker processes. (Default is None, one per CPU)
+    - parts (int, optional):
+        Number of ranges to split the file into. (Default is None, four per
+        worker, each at least MIN_PART_SIZE bytes)
+
+    Returns:
+    --------
+    str:
+        JSON representation of the file.
+    """
+
+    workers = workers or os.cpu_count() or 1
+    with open(path, 'rb') as file:
+        size = file.seek(0, 2)
+        if (parts is None):
+            parts = min(4 * workers, size // MIN_PART_SIZE)
+        cuts = []
+        if (workers > 1 and parts > 2):
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                cuts = find_record_cuts(mapped, parts)
+                head = mapped[:cuts[0]] if cuts else b''
+                tail = mapped[cuts[-1]:] if cuts else b''
+
+    # at least two ranges for the workers
+    if (len(cuts) >= 3):
+        try:
+            return convert_in_parts(path, cuts, head, tail, tab_length, workers)
+        except (ValueError, IndexError):
+            # the ranges were not whole elements, e.g. a '/>' in text
+            # content threw the count off
+            pass
+
+    with open(path, encoding='utf-8') as file:
+        return xml2json(file.read(), tab_length)
+
+def convert_in_parts(path, cuts, head, tail, tab_length, workers):
+    """
+    Internal function for xml2json_parallel() that converts the ranges
+    between cuts in worker processes and head and tail, the bytes before
+    the first cut and after the last one, in this one.
+
+    Raises:
+    -------
+    ValueError, IndexError:
+        If a range does not hold whole elements.
+    """
+
+    tab = ' ' * tab_length
+    root = Element("root", None, [])
+    root.parent = root
+    stack = [root]
+
+    # The head leaves the element holding the ranges open, collect its
+    # children and content so far, then let the tail close it
+    for _ in parse_events(tokenize(decode_text(head)), stack):
+        pass
+    parent = stack[-1]
+    head_groups = parent.children
+    head_content = parent.content
+    parent.children = []
+    parent.child_index = None
+    parent.child_runs = None
+    parent.content = ""
+    for _ in parse_events(tokenize(decode_text(tail)), stack):
+        pass
+    tail_groups = parent.children
+    closed = all(element is not parent for element in stack)
+
+    # The converted children all go where this placeholder is
+    placeholder = Element("\0", parent, [])
+    parent.children = [[placeholder]]
+    parent.child_index = {placeholder.name: parent.children[0]}
+    parent.child_runs = None
+
+    tabs = ""
+    element = parent
+    while (element.parent is not element):
+        tabs += tab if len(element.parent.child_index[element.name]) == 1 else tab * 2
+        element = element.parent
+
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(convert_range, path, start, end, tab_length, tabs)
+                   for start, end in zip(cuts, cuts[1:])]
+        converter = XML2JSON("", tab_length)
+        parts = [render_groups(converter, head_groups, tabs)]
+        tail_part = render_groups(converter, tail_groups, tabs)
+        contents = [head_content]
+        for future in futures:
+            content, groups = future.result()
+            contents.append(content)
+            parts.append(groups)
+        parts.append(tail_part)
+
+    contents.append(parent.content)
+    parent.content = ''.join(contents)
+    if (closed):
+        parent.content = parent.content.rstrip()
+
+    # Groups of the same name from different parts are one group, in the
+    # order their names first appear
+    merged = {}
+    for groups in parts:
+        for name, members, single in groups:
+            group = merged.get(name)
+            if (group is None):
+                merged[name] = [members, single]
+            else:
+                group[0].extend(members)
+                group[1] = None
+
+    extra_tabs = tabs + tab
+    entries = []
+    for name, (members, single) in merged.items():
+        if (len(members) == 1):
+            entries.append(f'{extra_tabs}"{name}": {single}')
+        else:
+            entries.append(f'{extra_tabs}"{name}": [\n' + ',\n'.join(members) + f'\n{extra_tabs}]')
+
+    json_text = TRAILING_COMMA_PATTERN.sub('', render_element(converter, root, True, ""))
+    # the placeholder is the last entry of its parent, so has no comma
+    return json_text.replace(f'{extra_tabs}"{placeholder.name}": ""', ',\n'.join(entries), 1)
+
+def convert_range(path, start, end, tab_length, tabs):
+    """
+    Internal function run by xml2json_parallel() workers, converts the
+    elements in a byte range of a file.
+
+    Parameters:
+    ----------
+    - path (str):
+        XML file path.
+    - start, end (int):
+        Byte range holding whole sibling elements.
+    - tab_length (int):
+        Desired tab width for the output JSON string.
+    - tabs (str):
+        Indentation of the elements' parent.
+
+    Returns:
+    --------
+    str:
+        Text content between the elements, as XML_Document adds it to
+        their parent.
+    list of tuple:
+        The elements, converted by render_groups().
+
+    Raises:
+    -------
+    ValueError:
+        If the range does not hold whole elements.
+    """
+
+    with open(path, 'rb') as file:
+        file.seek(start)
+        text = decode_text(file.read(end - start))
+
+    parent = Element("root", None, [])
+    stack = [parent]
+    try:
+        for _ in parse_events(tokenize(text), stack):
+            pass
+    except IndexError:
+        raise ValueError(f"Bytes {start} to {end} close an element they do not open.")
+    if (stack != [parent]):
+        raise ValueError(f"Bytes {start} to {end} do not hold whole elements.")
+
+    return parent.content, render_groups(XML2JSON("", tab_length), parent.children, tabs)
+
+def render_groups(converter, groups, tabs):
+    """
+    Internal function that converts groups of sibling elements, as in
+    Element.children, the way XML2JSON does under a parent indented by tabs.
+    Whether each element is written alone or in an array depends on the
+    size of its whole group, so both are kept when only one is known.
+
+    Returns:
+    --------
+    list of tuple of (str, list of str, str):
+        For each group, its name, its elements as array members and, if it
+        has a single element, that element on its own, else None. Trailing
+        commas are left out.
+    """
+
+    tab = ' ' * converter.tab_length
+    single_tabs = tabs + tab
+    member_tabs = single_tabs + tab
+    converted = []
+    for siblings in groups:
+        # the text ends with ",\n", dropped along with the comma that
+        # XML2JSON would remove once the whole text is known
+        members = [TRAILING_COMMA_PATTERN.sub('', render_element(converter, element, False, member_tabs)[:-2])
+                   for element in siblings]
+        single = None
+        if (len(siblings) == 1):
+            single = TRAILING_COMMA_PATTERN.sub('', render_element(converter, siblings[0], True, single_tabs)[:-2])
+        converted.append((siblings[0].name, members, single))
+    return converted
+
+def render_element(converter, element, single, tabs):
+    """
+    Internal function that converts one element with converter's
+    add_json_children(), see XML2JSON.
+
+    Returns:
+    --------
+    str:
+        JSON text of the element, before trailing commas are removed.
+    """
+
+    converter.json_list = []
+    converter.add_json_children(element, single, tabs)
+    return ''.join(converter.json_list)
+
+def tokenize(text):
+    """
+    Internal function that gets the tokens of text, like XML_Document.tokens.
+    """
+
+    return TOKEN_PATTERN.findall(minify(text))
+
+def json_string(text):
+    """
+    Quotes text as a JSON string, escaping quotes, backslashes and control
+    characters.
+
+    Parameters:
+    ----------
+    - text (str):
+        Text to quote.
+
+    Returns:
+    --------
+    str:
+        JSON string literal.
+    """
+
+    return '"' + JSON_ESCAPE_PATTERN.sub(
+        lambda match: JSON_ESCAPES.get(match.group(), f'\\u{ord(match.group()):04x}'), text) + '"'
+
+class JSON_Buffer:
+    """
+    JSON text of a group of children in XML2JSON_Stream, kept until their
+    parent closes. It is held in memory up to JSON_BUFFER_SIZE characters
+    and moved to a temporary file beyond.
+
+    Attributes:
+    ----------
+    - count (int):
+        Number of children in the buffer.
+    - parts (list of str):
+        Text held in memory, until the buffer is moved to a file.
+    - size (int):
+        Number of characters in parts.
+    - file (file object or None):
+        Temporary file holding the text, once moved there.
+    """
+
+    __slots__ = ("count", "parts", "size", "file")
+
+    def __init__(self):
+        self.count = 0
+        self.parts = []
+        self.size = 0
+        self.file = None
+
+    def write(self, text):
+        """
+        Adds text to the end of the buffer.
+        """
+
+        if (self.file is not None):
+            self.file.write(text)
+            return
+        self.parts.append(text)
+        self.size += len(text)
+        if (self.size > JSON_BUFFER_SIZE):
+            self.file = tempfile.TemporaryFile('w+', encoding='utf-8')
+            self.file.write(''.join(self.parts))
+            self.parts = []
+
+    def copy_to(self, write, indent=None, tab=''):
+        """
+        Writes the text and frees the buffer. With an indent, the text is
+        written after it and every line break gets tab after it.
+        """
+
+        if (indent is not None):
+            write(indent)
+        if (self.file is None):
+            blocks = [''.join(self.parts)]
+        else:
+            self.file.seek(0)
+            blocks = iter(lambda: self.file.read(JSON_COPY_SIZE), '')
+        for block in blocks:
+            write(block if indent is None else block.replace('\n', '\n' + tab))
+        if (self.file is not None):
+            self.file.close()
+        self.parts = []
+        self.file = None
+
+class JSON_Frame:
+    """
+    Conversion state of one open element in XML2JSON_Stream.
+
+    Attributes:
+    ----------
+    - name (str):
+        Element's name.
+    - attributes (list of Attribute):
+        Element's attributes.
+    - content (str):
+        Element's text content read so far.
+    - tabs (str):
+        Indentation of the element's closing brace.
+    - write (function):
+        Where the element's JSON goes: the sink, or the buffer of a child
+        whose place in its parent's JSON is not known yet.
+    - groups (dict of str to JSON_Buffer):
+        JSON of the children that are not written yet, grouped by name in
+        order of first appearance. Each is indented as a single child,
+        and children of the same name are separated by ',\\n' and the
+        element's indentation, so indenting them once more makes them an
+        array.
+    - open_group (str or None):
+        Name of the children being written as an array straight to write.
+    - header_written (bool):
+        Whether the element's '{' and attributes are written.
+    """
+
+    __slots__ = ("name", "attributes", "content", "tabs", "write", "groups",
+                 "open_group", "header_written")
+
+    def __init__(self, name, attributes, tabs, write):
+        self.name = name
+        self.attributes = attributes
+        self.content = ""
+        self.tabs = tabs
+        self.write = write
+        self.groups = {}
+        self.open_group = None
+        self.header_written = False
+
+class XML2JSON_Stream:
+    """
+    Converts XML to the same JSON as XML2JSON while reading it, writing
+    to a sink as elements close instead of building the tree and the
+    whole output first.
+
+    An element's JSON depends on all of its children: its repeated
+    children form arrays and single ones do not. So each child is written
+    to a buffer until its parent closes and can place it. Once a second
+    child with the name of its parent's first children arrives, the array
+    is written and the remaining children of that name go straight into
+    it. Buffers are kept in memory up to JSON_BUFFER_SIZE characters and
+    in a temporary file beyond, so a document with long runs of records
+    needs memory for about one buffer per level, wherever the runs are.
+    Several top-level elements with the same name form an array too, so
+    the document element is only written to the sink once the document
+    ends.
+
+    Strings are escaped, so the output is valid JSON even when xml2json()
+    would copy quotes into it. For elements whose array is written before
+    they close, "_text" comes after the children instead of first.
+
+    Attributes:
+    ----------
+    - sink (file-like object):
+        Where the JSON text is written.
+    - tab_length (int):
+        Desired tab length in spaces for the output JSON.
+    - stack (list of JSON_Frame):
+        Frames of the open elements, the document root first.
+
+    Methods:
+    --------
+    - convert(tokens):
+        Converts a stream of tokens, writing the JSON to the sink.
+    """
+
+    def __init__(self, sink, tab_length=4):
+        """
+        Parameters:
+        ----------
+        - sink (file-like object):
+            Text sink, anything with a write(str) method.
+        - tab_length (int, optional):
+            Desired tab length in spaces. (Default is 4)
+        """
+
+        self.sink = sink
+        self.tab = ' ' * tab_length
+        self.stack = []
+
+    def convert(self, tokens):
+        """
+        Converts tokens of minified XML, like XML_Document.tokens, writing
+        the JSON to the sink.
+
+        Parameters:
+        ----------
+        - tokens (iterable of str):
+            Tags and text content of minified XML.
+
+        Raises:
+        -------
+        ValueError:
+            If a token comes after a stray closing tag ended the document.
+        """
+
+        stack = self.stack = [JSON_Frame("root", [], "", self.sink.write)]
+        closed = False
+
+        for token in tokens:
+            if (closed):
+                raise ValueError(f"Token {token!r} is after the end of the document.")
+
+            # Opening tag
+            if (token[0] == '<' and (token[1] != '/' or token[-2] == '/')):
+                name, attributes = get_attr(token)
+                frame = self.open_child(stack[-1], name, attributes)
+                if (token[-2] == '/'):
+                    self.close(frame)
+                else:
+                    stack.append(frame)
+
+            # Closing tag, a stray one at the top level ends the document
+            elif (token[0] == '<' and token[1] == '/'):
+                frame = stack[-1]
+                frame.content = frame.content.rstrip()
+                if (len(stack) == 1):
+                    closed = True
+                    continue
+                stack.pop()
+                self.close(frame)
+
+            # Text content between tags
+            else:
+                stack[-1].content += token + ' '
+
+        # elements left open end with the document, as in XML_Document
+        while (len(stack) > 1):
+            self.close(stack.pop())
+
+        self.close(stack[0])
+        self.sink.write('\n')
+
+    def open_child(self, parent, name, attributes):
+        """
+        Internal method that makes the frame of a new child of parent,
+        writing it into the array open in its parent if there is one.
+        """
+
+        extra = parent.tabs + self.tab
+        write = parent.write
+
+        # Another child for the array open in the parent
+        if (parent.open_group == name):
+            write(',\n' + extra + self.tab)
+            return JSON_Frame(name, attributes, extra + self.tab, write)
+
+        # The second child named like the parent's first children, they
+        # form an array which can be written now
+        group = parent.groups.get(name)
+        if (group is not None and parent.open_group is None and next(iter(parent.groups)) == name):
+            self.write_header(parent)
+            write(f'{extra}{json_string(name)}: [\n')
+            group.copy_to(write, extra + self.tab, self.tab)
+            write(',\n' + extra + self.tab)
+            del parent.groups[name]
+            parent.open_group = name
+            return JSON_Frame(name, attributes, extra + self.tab, write)
+
+        # Anything else waits in its group's buffer until the parent closes
+        if (group is None):
+            group = parent.groups[name] = JSON_Buffer()
+        elif (group.count > 0):
+            group.write(',\n' + extra)
+        group.count += 1
+        return JSON_Frame(name, attributes, extra, group.write)
+
+    def close(self, frame):
+        """
+        Internal method that finishes an element, writing what is left of
+        its JSON.
+        """
+
+        write = frame.write
+        extra = frame.tabs + self.tab
+
+        if (frame.header_written):
+            write('\n' + extra + ']')
+            for name, group in frame.groups.items():
+                write(',\n')
+                self.write_group(name, group, extra, write)
+            if (frame.content):
+                write(f',\n{extra}"_text": {json_string(frame.content)}')
+            write('\n' + frame.tabs + '}')
+            return
+
+        # The whole element, indented as a single child, the same as
+        # XML2JSON.add_json_children()
+        if (not frame.attributes and not frame.groups):
+            write(json_string(frame.content))
+            return
+        items = []
+        if (frame.content):
+            items.append(f'{extra}"_text": {json_string(frame.content)}')
+        for attribute in frame.attributes:
+            items.append(f'{extra}{json_string("#" + attribute.key)}: {json_string(attribute.value)}')
+        write('{\n' + ',\n'.join(items))
+        separator = ',\n' if items else ''
+        for name, group in frame.groups.items():
+            write(separator)
+            self.write_group(name, group, extra, write)
+            separator = ',\n'
+        write('\n' + frame.tabs + '}')
+
+    def write_header(self, frame):
+        """
+        Internal method that writes the opening brace and attributes of an
+        element that is not closed yet.
+        """
+
+        extra = frame.tabs + self.tab
+        frame.write('{\n')
+        for attribute in frame.attributes:
+            frame.write(f'{extra}{json_string("#" + attribute.key)}: {json_string(attribute.value)},\n')
+        frame.header_written = True
+
+    def write_group(self, name, group, extra, write):
+        """
+        Internal method that writes a group of buffered children with the
+        same name, a single value or an array.
+        """
+
+        if (group.count == 1):
+            write(f'{extra}{json_string(name)}: ')
+            group.copy_to(write)
+            return
+        write(f'{extra}{json_string(name)}: [\n')
+        group.copy_to(write, extra + self.tab, self.tab)
+        write('\n' + extra + ']')
+
+def xml2json_stream(source, sink, tab_length=4, chunk_size=1 << 16):
+    """
+    Converts XML to JSON while reading it, writing the JSON to sink as
+    elements close, see XML2JSON_Stream.
+
+    Parameters:
+    ----------
+    - source (str, file-like object or iterable of str/bytes):
+        Syntactically correct XML, see formatting.iter_text_chunks().
+    - sink (file-like object):
+        Text sink, anything with a write(str) method.
+    - tab_length (int, optional):
+        Desired tab width for the output JSON string. (Default is 4)
+    - chunk_size (int, optional):
+        Read size for file-like objects. (Default is 65536)
+    """
+
+    XML2JSON_Stream(sink, tab_length).convert(iter_tokens(source, chunk_size))
+
+def element_to_object(element):
+    """
+    Converts an element to the Python value XML2JSON writes for it: its
+    text content if it has no attributes or children, otherwise a dict
+    with "_text", "#attribute" keys and one key per child name, holding a
+    list when there are several children of that name.
+
+    Parameters:
+    ----------
+    - element (Element):
+        Element to convert, with its subtree.
+
+    Returns:
+    --------
+    str or dict:
+        Value of the element, ready for json.dumps().
+    """
+
+    if (not element.attributes and not element.children):
+        return element.content
+
+    value = {}
+    if (element.content):
+        value["_text"] = element.content
+    for attribute in element.attributes:
+        value["#" + attribute.key] = attribute.value
+    for siblings in element.children:
+        if (len(siblings) == 1):
+            value[siblings[0].name] = element_to_object(siblings[0])
+        else:
+            value[siblings[0].name] = [element_to_object(child) for child in siblings]
+    return value
+
+def iter_records(source, record_path, chunk_size=1 << 16):
+    """
+    Reads XML and yields the value of every element at record_path as
+    soon as it closes, converted by element_to_object(). Records are
+    dropped from the tree once yielded, so memory stays bounded by the
+    largest record.
+
+    Parameters:
+    ----------
+    - source (str, file-like object or iterable of str/bytes):
+        Syntactically correct XML, see formatting.iter_text_chunks().
+    - record_path (str):
+        Names from the top-level element down to the records, separated
+        by '/', e.g. "users/user". A '*' step matches any name.
+    - chunk_size (int, optional):
+        Read size for file-like objects. (Default is 65536)
+
+    Returns:
+    --------
+    generator of str or dict:
+        Value of each record, in document order.
+    """
+
+    steps = [step.strip() for step in record_path.strip().strip('/').split('/')]
+    if (not all(steps)):
+        raise ValueError(f"Invalid record path: {record_path!r}")
+
+    path = []
+    for event, element in iterparse(source, ("start", "end"), chunk_size):
+        if (event == "start"):
+            path.append(element.name)
+            continue
+
+        is_record = (len(path) == len(steps)
+                     and all(step == '*' or step == name for step, name in zip(steps, path)))
+        path.pop()
+        if (is_record):
+            yield element_to_object(element)
+
+            # the record is the last child of its name, drop it
+            parent = element.parent
+            siblings = parent.child_index[element.name]
+            siblings.pop()
+            runs = parent.child_runs
+            if (runs is not None):
+                runs[-1][1] -= 1
+                if (runs[-1][1] == 0):
+                    runs.pop()
+            if (not siblings):
+                del parent.child_index[element.name]
+                parent.children = [group for group in parent.children if group is not siblings]
+
+def xml2jsonl(source, sink, record_path, chunk_size=1 << 16):
+    """
+    Converts the records of an XML document to JSON Lines, one compact
+    JSON object per record and line, while reading it. The lines can be
+    split and consumed in parallel.
+
+    Parameters:
+    ----------
+    - source (str, file-like object or iterable of str/bytes):
+        Syntactically correct XML, see formatting.iter_text_chunks().
+    - sink (file-like object):
+        Text sink, anything with a write(str) method.
+    - record_path (str):
+        Path of the records, e.g. "users/user", see iter_records().
+    - chunk_size (int, optional):
+        Read size for file-like objects. (Default is 65536)
+
+    Returns:
+    --------
+    int:
+        Number of records written.
+    """
+
+    count = 0
+    for record in iter_records(source, record_path, chunk_size):
+        sink.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        count += 1
+    return count
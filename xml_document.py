@@ -1,6 +1,10 @@
 import re
-from formatting import minify
+from sys import intern
+from formatting import minify, iter_tokens
 from xml_document_parts import Element, Attribute
+from xml_query import query
+from xml_snapshot import write_snapshot, read_snapshot, is_current
+from xml_positions import Position_Index
 
 class XML_Document:
     """
@@ -17,6 +21,10 @@ class XML_Document:
         Root of the document, used to access any and all children.
     - stack (list of Element):
         Stack used for parsing the XML text.
+    - tag_index (dict of str to list of Element):
+        All elements of each name in document order, used by query().
+    - positions (Position_Index or None):
+        Where each element is in text, if asked for.
 
     Methods:
     --------
@@ -28,15 +36,24 @@ class XML_Document:
         Checks if current child has duplicates (siblings) to append
         to respective list in the parent's children. Used for JSON construction
         later.
+    - query(path):
+        Finds the elements matching an XPath-like path.
+    - save_snapshot(path):
+        Saves the tree to a binary snapshot file.
+    - from_snapshot(path, text):
+        Loads a tree saved by save_snapshot() without parsing again.
     """
 
-    def __init__(self, text):
+    def __init__(self, text, positions=False):
         """
         Parameters:
         ----------
 
         - text (str):
             syntactically correct XML string.
+        - positions (bool, optional):
+            Whether to record where each element is in text, see
+            xml_positions.Position_Index. (Default is False)
         """
 
         self.text = text
@@ -46,95 +63,311 @@ class XML_Document:
         self.root.parent = self.root
 
         self.stack = []
-        self.parse()
+        self.tag_index = {}
+        self.positions = None
+        self.parse(positions)
 
-    def parse(self):
+    def parse(self, positions=False):
         """
         Parses the XML file to construct tree. This updates
         self.stack and self.root in-place.
+
+        Parameters:
+        ----------
+        - positions (bool, optional):
+            Whether to also build self.positions. (Default is False)
         """
 
         self.stack.append(self.root)
-        for token in self.tokens:
-            # Opening tag
-            if (token[0] == '<' and (token[1] != '/' or token[-2] == '/')):
-                name, list_of_attributes = self.get_attr(token)
-                new_element = Element(name, self.stack[-1], list_of_attributes)
-                self.check_siblings_and_add_child(new_element)
-
-                # Not a self-closing tag
-                if (token[-2] != "/"):
-                    self.stack.append(new_element)
-
-            # Closing tag
-            elif (token[0] == '<' and token[1] == '/'):
-                self.stack[-1].content = self.stack[-1].content.rstrip()
-                self.stack.pop()
-
-            # Text content between tags
-            else:
-                self.stack[-1].content += token + ' '
+        if (not positions):
+            for _ in parse_events(self.tokens, self.stack, tag_index=self.tag_index):
+                pass
+            return
+
+        elements = [element for _, element in parse_events(self.tokens, self.stack, ("start",), self.tag_index)]
+        self.positions = Position_Index(self.text, elements)
 
     def get_attr(self, text):
         """
-        Gets attributes in a given tag text.
+        Gets attributes in a given tag text, see get_attr().
+        """
+
+        return get_attr(text)
+
+    def check_siblings_and_add_child(self, element):
+        """
+        Adds element to the children of the element on top of the stack,
+        see add_child().
 
         Parameters:
         ----------
-        - text (str):
-            Tag text, i.e. text between < >
+        - element (Element):
+            An Element object to perform function on.
+        """
+
+        add_child(self.stack[-1], element)
+
+    def query(self, path):
+        """
+        Finds the elements matching an XPath-like path, see xml_query.query().
+
+        Parameters:
+        ----------
+        - path (str):
+            Path such as "/users/user[id=5]/name" or "//topic".
 
         Returns:
         --------
-        str:
-            Tag name extracted from tag text.
-        list of Attribute:
-            List of Attribute objects, if there are none, returns empty list.
+        list of Element:
+            Matching elements.
         """
-        if (text[-2] == '/'):
-            text = text[1:-2]
-        else:
-            text = text[1:-1]
 
-        attributes = []
-        returned_list = []
+        return query(self.root, path, self.tag_index)
 
-        first_space_index = len(text)
-        for i in range(len(text)):
-            if (text[i] == ' '):
-                first_space_index = i
-                break
-
-        # insert tag name as first element
-        attributes.append(text[:first_space_index])
-        text = text[first_space_index:]
+    def save_snapshot(self, path):
+        """
+        Saves the tree to a binary snapshot file, see xml_snapshot. The
+        snapshot records a checksum of self.text so it can be checked
+        against the source before it is loaded.
 
-        # matches sometext="sometext"
-        attributes.extend(re.findall(r'\S+="[\s\S]*?"', text))
+        Parameters:
+        ----------
+        - path (str):
+            Snapshot file path.
+        """
 
-        for attribute in attributes[1:]:
-            key, _, value = attribute.partition('=')
-            returned_list.append(Attribute(key, value[1:-1]))
-        return attributes[0], returned_list
+        write_snapshot(path, self.root, self.tokens, self.tag_index, self.text)
 
-    def check_siblings_and_add_child(self, element):
+    @classmethod
+    def from_snapshot(cls, path, text=None):
         """
-        Checks for given Element object if its parent has other children
-        of the same name, if so, adds it to its respective list, otherwise
-        creates a new list for the element. This is helpful for JSON parsing later.
+        Loads a tree saved by save_snapshot(), which is much faster than
+        minifying, tokenizing and parsing the text again.
 
         Parameters:
         ----------
-        - element (Element):
-            An Element object to perform function on.
+        - path (str):
+            Snapshot file path.
+        - text (str, optional):
+            Source text. If given, the snapshot must have been taken of it.
+            (Default is None, do not check, and the document's text is None)
+
+        Returns:
+        --------
+        XML_Document:
+            Document with the saved tree, tokens and tag index.
+
+        Raises:
+        -------
+        ValueError:
+            If the file is not a snapshot of this version, or is stale.
         """
-        has_siblings_flag = False
 
-        for child in self.stack[-1].children:
-            if (child[0].name == element.name):
-                child.append(element)
-                has_siblings_flag = True
-                break
+        document = cls.__new__(cls)
+        document.text = text
+        document.root, document.tokens, document.tag_index = read_snapshot(path, text)
+        document.stack = [document.root]
+        document.positions = None
+        return document
+
+def load_document(text, snapshot_path):
+    """
+    Gets the tree of text from a snapshot if there is a current one,
+    otherwise parses text and saves a snapshot for the next time.
+
+    Parameters:
+    ----------
+    - text (str):
+        syntactically correct XML string.
+    - snapshot_path (str):
+        Snapshot file path, e.g. the XML file path with a ".snap" suffix.
+
+    Returns:
+    --------
+    XML_Document:
+        Tree of text.
+    """
+
+    if (is_current(snapshot_path, text)):
+        return XML_Document.from_snapshot(snapshot_path, text)
+
+    document = XML_Document(text)
+    document.save_snapshot(snapshot_path)
+    return document
+
+def get_attr(text):
+    """
+    Gets attributes in a given tag text. Tag names and attribute keys are
+    interned, so elements sharing a name share one string.
+
+    Parameters:
+    ----------
+    - text (str):
+        Tag text, i.e. text between < >
+
+    Returns:
+    --------
+    str:
+        Tag name extracted from tag text.
+    list of Attribute:
+        List of Attribute objects, if there are none, returns empty list.
+    """
+    if (text[-2] == '/'):
+        text = text[1:-2]
+    else:
+        text = text[1:-1]
+
+    attributes = []
+    returned_list = []
+
+    first_space_index = len(text)
+    for i in range(len(text)):
+        if (text[i] == ' '):
+            first_space_index = i
+            break
+
+    # insert tag name as first element
+    attributes.append(intern(text[:first_space_index]))
+    text = text[first_space_index:]
+
+    # matches sometext="sometext"
+    attributes.extend(re.findall(r'\S+="[\s\S]*?"', text))
+
+    for attribute in attributes[1:]:
+        key, _, value = attribute.partition('=')
+        returned_list.append(Attribute(intern(key), value[1:-1]))
+    return attributes[0], returned_list
+
+def add_child(parent, element):
+    """
+    Checks for given Element object if its parent has other children
+    of the same name, if so, adds it to its respective list, otherwise
+    creates a new list for the element. This is helpful for JSON parsing later.
+    The parent's child_index finds the list without scanning children, and
+    its child_runs keeps the document order once names are interleaved.
+
+    Parameters:
+    ----------
+    - parent (Element):
+        Element to add the child to.
+    - element (Element):
+        An Element object to perform function on.
+    """
+    index = parent.child_index
+    if (index is None):
+        index = parent.child_index = {}
+
+    siblings = index.get(element.name)
+    if (siblings is None):
+        siblings = index[element.name] = []
+        parent.children.append(siblings)
+    elif (parent.child_runs is None and siblings is not parent.children[-1]):
+        # a name seen before comes back after other names, from now on
+        # the groups alone do not give the document order
+        parent.child_runs = [[group, len(group)] for group in parent.children]
+
+    runs = parent.child_runs
+    if (runs is not None):
+        if (runs[-1][0] is siblings):
+            runs[-1][1] += 1
+        else:
+            runs.append([siblings, 1])
+    siblings.append(element)
+
+def parse_events(tokens, stack, events=(), tag_index=None):
+    """
+    Builds a tree from tokens under the element on top of stack,
+    yielding parsing events as it goes. This updates stack in-place.
+
+    Parameters:
+    ----------
+    - tokens (iterable of str):
+        Tags and text content of minified XML.
+    - stack (list of Element):
+        Open elements, the last one receives the first token.
+    - events (collection of str, optional):
+        Events to yield, any of "start", "text" and "end". (Default is
+        (), only build the tree)
+    - tag_index (dict of str to list of Element, optional):
+        If given, every new element is appended to the list for its name.
+        (Default is None)
+
+    Returns:
+    --------
+    generator of tuple:
+        ("start", Element) once an element and its attributes are read,
+        ("text", str) for each piece of text content, and
+        ("end", Element) once an element's children and content are read.
+    """
+
+    start = "start" in events
+    text = "text" in events
+    end = "end" in events
+
+    for token in tokens:
+        # Opening tag
+        if (token[0] == '<' and (token[1] != '/' or token[-2] == '/')):
+            name, list_of_attributes = get_attr(token)
+            new_element = Element(name, stack[-1], list_of_attributes)
+            add_child(stack[-1], new_element)
+            if (tag_index is not None):
+                elements = tag_index.get(name)
+                if (elements is None):
+                    elements = tag_index[name] = []
+                elements.append(new_element)
+            if (start):
+                yield ("start", new_element)
+
+            # Not a self-closing tag
+            if (token[-2] != "/"):
+                stack.append(new_element)
+            elif (end):
+                yield ("end", new_element)
+
+        # Closing tag
+        elif (token[0] == '<' and token[1] == '/'):
+            stack[-1].content = stack[-1].content.rstrip()
+            element = stack.pop()
+            if (end):
+                yield ("end", element)
+
+        # Text content between tags
+        else:
+            stack[-1].content += token + ' '
+            if (text):
+                yield ("text", token)
+
+def iterparse(source, events=("end",), chunk_size=1 << 16):
+    """
+    Parses XML incrementally, yielding events while reading it, without
+    building the whole token list first.
+
+    Elements are added to the tree as they are read, so an "end" event
+    gives a complete subtree. Call clear() on elements that are no longer
+    needed, typically the parent of each processed record, to keep memory
+    bounded:
+
+    >>> for event, element in iterparse(open("users.xml", "rb")):
+    ...     if (element.name == "user"):
+    ...         handle(element)
+    ...         element.parent.clear()
+
+    Parameters:
+    ----------
+    - source (str, file-like object or iterable of str/bytes):
+        Syntactically correct XML, see formatting.iter_text_chunks().
+    - events (collection of str, optional):
+        Events to yield, any of "start", "text" and "end". (Default is
+        ("end",))
+    - chunk_size (int, optional):
+        Read size for file-like objects. (Default is 65536)
+
+    Returns:
+    --------
+    generator of tuple:
+        See parse_events().
+    """
 
-        if (not has_siblings_flag):
-            self.stack[-1].children.append([element])
+    root = Element("root", None, [])
+    root.parent = root
+    return parse_events(iter_tokens(source, chunk_size), [root], events)
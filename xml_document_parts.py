@@ -11,6 +11,9 @@ class Attribute:
         Attribute value.
     """
 
+    # no per-instance __dict__, documents can hold millions of these
+    __slots__ = ("key", "value")
+
     def __init__(self, key, value):
         self.key = key
         self.value = value
@@ -28,19 +31,93 @@ class Element:
     ----------
     - name (str):
         Element/tag name.
-    - children (list of Element obj):
-        Element's children.
+    - children (list of list of Element obj):
+        Element's children, grouped by name in order of first appearance.
+    - child_index (dict of str to list of Element obj, or None):
+        Maps a child name to its group in children. None while the
+        element has no children.
+    - child_runs (list of list, or None):
+        Children in document order as [group, count] runs of consecutive
+        children from one group of children, once children of different
+        names are interleaved. None while each group is contiguous, the
+        groups in order then being the document order.
     - parent (Element):
         Element's parent.
     - attributes (list of Attribute obj):
         Element's attributes.
     - content (str):
         Element's text content.
+
+    Methods:
+    --------
+    - clear():
+        Drops the element's children and text content.
+    - get_children(name):
+        Gets the children with a given name.
+    - iter_children():
+        Gets all children in document order.
     """
 
+    __slots__ = ("name", "children", "child_index", "child_runs", "parent", "attributes", "content")
+
     def __init__(self, name, parent, attributes):
         self.name = name
         self.children = []
+        self.child_index = None
+        self.child_runs = None
         self.parent = parent
         self.attributes = attributes
         self.content = ""
+
+    def clear(self):
+        """
+        Drops the element's children and text content, e.g. once a subtree
+        read by iterparse() has been processed. Name, parent and attributes
+        are kept.
+        """
+
+        self.children = []
+        self.child_index = None
+        self.child_runs = None
+        self.content = ""
+
+    def get_children(self, name):
+        """
+        Gets the children with a given name.
+
+        Parameters:
+        ----------
+        - name (str):
+            Child element/tag name.
+
+        Returns:
+        --------
+        list of Element:
+            Children with that name in document order, empty if none.
+        """
+
+        if (self.child_index is None):
+            return []
+        return self.child_index.get(name, [])
+
+    def iter_children(self):
+        """
+        Gets all children in document order, whatever their names.
+
+        Returns:
+        --------
+        generator of Element:
+            Children in the order of their opening tags.
+        """
+
+        if (self.child_runs is None):
+            for group in self.children:
+                yield from group
+            return
+
+        # how many children of each group the runs so far hold
+        taken = {}
+        for group, count in self.child_runs:
+            start = taken.get(id(group), 0)
+            yield from group[start:start + count]
+            taken[id(group)] = start + count
@@ -1,110 +1,350 @@
-def XML_error_detector(xml):
+import os
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+from file_splitting import decode_text, MIN_PART_SIZE
+
+class XML_Error:
+    """
+    One error found by detect_errors().
+
+    Attributes:
+    - kind (str): What is wrong, one of:
+        "missing_closing_tag": an opening tag left open when one of its ancestors was closed,
+        "mismatched_tag": a closing tag that matches no open tag,
+        "not_opened": a closing tag found while no tag was open,
+        "not_closed": an opening tag still open at the end of the text,
+        "unfinished_tag": a tag without its '>', at the end of the text.
+    - tag (str): Content of the tag, without '<', '/' and '>'.
+    - line (int): Line of the tag's '<', starting at 1.
+    - column (int): Column of the tag's '<', starting at 1.
+    - offset (int): Index of the tag's '<' in the text.
+    - expected (str): For "mismatched_tag", the innermost open tag, None otherwise.
+    """
+
+    __slots__ = ("kind", "tag", "line", "column", "offset", "expected")
+
+    def __init__(self, kind, tag, line, column, offset, expected=None):
+        self.kind = kind
+        self.tag = tag
+        self.line = line
+        self.column = column
+        self.offset = offset
+        self.expected = expected
+
+    def __repr__(self):
+        return (f"XML_Error({self.kind!r}, {self.tag!r}, line={self.line}, "
+                f"column={self.column}, offset={self.offset})")
+
+    def message(self):
+        """
+        Get the error's line(s) in the text report of XML_error_detector().
+
+        Returns:
+        - str: The message, ending with a newline.
+        """
+        if self.kind == "missing_closing_tag":
+            return f"Missing closed tag for opening tag: {self.tag} at line {self.line}\n"
+        if self.kind == "mismatched_tag":
+            return (f"Unmatched tag for opening tag : {self.expected}-> {self.tag}\n"
+                    f" or missing an opening tag for {self.tag} at line {self.line}\n")
+        if self.kind == "not_opened":
+            return f"{self.tag} tag is not opened at line {self.line}\n"
+        if self.kind == "not_closed":
+            return f"{self.tag} tag is not closed at line {self.line}\n"
+        return f"Unfinished tag {self.tag} at line {self.line}\n"
+
+
+def iter_tags(xml):
+    """
+    Find the tags of an XML string the way the error detector reads them: a
+    tag runs from '<' to the next '>', whatever is in between.
+
+    Parameters:
+    - xml (str): The input XML string.
+
+    Returns:
+    - generator of tuple: (kind, tag, line, column, offset) for each tag in order. kind is
+      "open" or "close", or "unfinished" for a last tag without its '>'. tag is the tag's
+      content without '<', '/' and '>', and line, column and offset are those of its '<'.
+    """
+
+    line_number = 1
+    line_start = 0
+    # offset up to which newlines have been counted
+    counted = 0
+
+    i = xml.find('<')
+    while i >= 0:
+        newlines = xml.count('\n', counted, i)
+        if newlines:
+            line_number += newlines
+            line_start = xml.rfind('\n', counted, i) + 1
+        counted = i
+
+        end = xml.find('>', i + 1)
+        if end < 0:
+            yield ("unfinished", xml[i + 1:].strip(), line_number, i - line_start + 1, i)
+            return
+
+        if xml[i + 1] != '/':
+            yield ("open", xml[i + 1:end].replace('<', ''), line_number, i - line_start + 1, i)
+        else:
+            yield ("close", xml[i + 2:end].replace('<', '').replace('/', ''), line_number, i - line_start + 1, i)
+        i = xml.find('<', end + 1)
+
+
+class Tag_Matcher:
+    """
+    Matches the tags found by iter_tags() and collects the errors.
+
+    Attributes:
+    - errors (list): XML_Error objects found so far, in the order of the text report.
+
+    Methods:
+    - add(kind, tag, line, column, offset): Match the next tag.
+    - finish(): Report the tags left open or not opened at the end of the text.
+    """
+
+    def __init__(self):
+        """Initialize a matcher with no open tags."""
+        self.errors = []
+        # open tags as (tag, line, column, offset), and how many of each name are open
+        self.open = []
+        self.open_counts = {}
+        # closing tags found while no tag was open, reported one by one at the
+        # next mismatch or at the end
+        self.stray = []
+
+    def add(self, kind, tag, line, column, offset):
+        """
+        Match the next tag, see iter_tags() for the parameters.
+        """
+        open = self.open
+        open_counts = self.open_counts
+        errors = self.errors
+
+        if kind == "open":
+            open.append((tag, line, column, offset))
+            open_counts[tag] = open_counts.get(tag, 0) + 1
+
+        elif kind == "unfinished":
+            errors.append(XML_Error("unfinished_tag", tag, line, column, offset))
+
+        elif not open:
+            self.stray.append((tag, line, column, offset))
+
+        elif open[-1][0] == tag:
+            open_counts[tag] -= 1
+            open.pop()
+
+        else:
+            if open_counts.get(tag):
+                # the tags opened after the matching one were never closed
+                missing = []
+                while open[-1][0] != tag:
+                    missing.append(open.pop())
+                    open_counts[missing[-1][0]] -= 1
+                open_counts[tag] -= 1
+                open.pop()
+                for name in reversed(missing):
+                    errors.append(XML_Error("missing_closing_tag", *name))
+            else:
+                errors.append(XML_Error("mismatched_tag", tag, line, column, offset, open[-1][0]))
+
+            if self.stray:
+                errors.append(XML_Error("not_opened", *self.stray.pop()))
+
+    def finish(self):
+        """
+        Report the tags still open, innermost first, then the closing tags
+        found while no tag was open, last first.
+        """
+        for tag in reversed(self.open):
+            self.errors.append(XML_Error("not_closed", *tag))
+        for tag in reversed(self.stray):
+            self.errors.append(XML_Error("not_opened", *tag))
+        self.open = []
+        self.open_counts = {}
+        self.stray = []
+
+
+def detect_errors(xml, max_errors=None):
+    """
+    Detect unclosed, unopened and mismatched tags in an XML string in one pass
+    over the text. Open tags are kept on a stack with a count of each name on
+    it, so checking whether a closing tag matches any open tag does not rescan
+    the stack.
+
+    Parameters:
+    - xml (str): The input XML string to be checked for errors.
+    - max_errors (int, optional): Stop after finding this many errors. Default is None, no limit.
+
+    Returns:
+    - list: XML_Error objects, in the order of the text report.
+    """
+
+    if max_errors is not None and max_errors <= 0:
+        return []
+
+    matcher = Tag_Matcher()
+    for tag in iter_tags(xml):
+        matcher.add(*tag)
+        if max_errors is not None and len(matcher.errors) >= max_errors:
+            return matcher.errors[:max_errors]
+    matcher.finish()
+
+    if max_errors is not None:
+        return matcher.errors[:max_errors]
+    return matcher.errors
+
+
+def detect_errors_parallel(path, workers=None, parts=None, max_errors=None):
+    """
+    Detect errors in an XML file in several processes, giving the same errors
+    as detect_errors() on the file's contents.
+
+    The file is split into byte ranges of about equal size right after a '>',
+    where no tag can be cut. Each worker process reduces its range to the tags
+    left once every opening tag directly followed by its closing tag (ignoring
+    the pairs already removed between them) is removed: for a well-formed range,
+    its unmatched closing tags followed by its unmatched opening tags. Removing
+    such pairs never changes what the tags around them match, so this process
+    only has to match the few tags left, range after range, moving their lines,
+    columns and offsets by the newlines and characters of the ranges before.
+
+    Parameters:
+    - path (str): Path of an XML file, encoded as UTF-8.
+    - workers (int, optional): Number of worker processes. Default is None, one per CPU.
+    - parts (int, optional): Number of ranges to split the file into. Default is None,
+      four per worker, each at least MIN_PART_SIZE bytes.
+    - max_errors (int, optional): Stop after finding this many errors. Default is None, no limit.
+
+    Returns:
+    - list: XML_Error objects, in the order of the text report.
+    """
+
+    workers = workers or os.cpu_count() or 1
+    with open(path, 'rb') as file:
+        size = file.seek(0, 2)
+        if parts is None:
+            parts = min(4 * workers, size // MIN_PART_SIZE)
+        cuts = []
+        if workers > 1 and parts > 1 and size > 0:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                cuts = find_tag_cuts(mapped, parts)
+
+    if len(cuts) < 3:
+        with open(path, encoding='utf-8') as file:
+            return detect_errors(file.read(), max_errors)
+    if max_errors is not None and max_errors <= 0:
+        return []
+
+    matcher = Tag_Matcher()
+    # newlines, characters and characters since the last newline before the range
+    lines = 0
+    characters = 0
+    column = 0
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(summarize_range, path, start, end) for start, end in zip(cuts, cuts[1:])]
+        for future in futures:
+            tags, range_lines, range_characters, range_column = future.result()
+            for kind, tag, line, tag_column, offset in tags:
+                matcher.add(kind, tag, lines + line, tag_column if line > 1 else column + tag_column,
+                            characters + offset)
+                if max_errors is not None and len(matcher.errors) >= max_errors:
+                    for rest in futures:
+                        rest.cancel()
+                    return matcher.errors[:max_errors]
+            lines += range_lines
+            characters += range_characters
+            column = range_column if range_lines else column + range_column
+    matcher.finish()
+
+    if max_errors is not None:
+        return matcher.errors[:max_errors]
+    return matcher.errors
+
+
+def find_tag_cuts(data, parts):
+    """
+    Internal function for detect_errors_parallel() that splits bytes into
+    about equal ranges, each ending right after a '>'.
+
+    Returns:
+    - list: Offsets of the cuts, starting with 0 and ending with len(data).
+    """
+
+    cuts = [0]
+    for part in range(1, parts):
+        cut = data.find(b'>', max(len(data) * part // parts, cuts[-1])) + 1
+        if cut <= 0:
+            break
+        if cut > cuts[-1] and cut < len(data):
+            cuts.append(cut)
+    cuts.append(len(data))
+    return cuts
+
+
+def summarize_range(path, start, end):
+    """
+    Internal function run by detect_errors_parallel() workers, reduces the
+    tags in a byte range of a file to those whose match depends on the rest
+    of the file.
+
+    Parameters:
+    - path (str): XML file path.
+    - start, end (int): Byte range, cut right after a '>'.
+
+    Returns:
+    - list: The tags left as in iter_tags(), with lines and offsets counted from the range.
+    - int: Number of newlines in the range.
+    - int: Number of characters in the range.
+    - int: Number of characters after the range's last newline.
+    """
+
+    with open(path, 'rb') as file:
+        file.seek(start)
+        text = decode_text(file.read(end - start))
+
+    tags = []
+    for tag in iter_tags(text):
+        if tag[0] == "close" and tags and tags[-1][0] == "open" and tags[-1][1] == tag[1]:
+            tags.pop()
+        else:
+            tags.append(tag)
+
+    newlines = text.count('\n')
+    return tags, newlines, len(text), len(text) - text.rfind('\n') - 1
+
+
+def format_errors(errors):
+    """
+    Render errors found by detect_errors() as a text report.
+
+    Parameters:
+    - errors (list): XML_Error objects.
+
+    Returns:
+    - str: One message per error, or a message indicating that the XML file is correct if there are none.
+    """
+
+    if errors:
+        return ''.join(error.message() for error in errors)
+    return "correct XML file "
+
+
+def XML_error_detector(xml, max_errors=None):
     """
     Detect errors in an XML string and return error messages with line numbers.
+    Tags that are not closed or not opened are reported at their own line.
 
     Parameters:
     - xml (str): The input XML string to be checked for errors.
+    - max_errors (int, optional): Report at most this many errors. Default is None, no limit.
 
     Returns:
     - str: A string containing error messages with line numbers, or a message indicating
            that the XML file is correct if no errors are found.
     """
 
-    i=0
-    open=[]  
-    closed=[] 
-    errors=[]
-    closing=False
-    error_string=""
-    line_number=1
-
-    while i < len(xml):
-
-        if xml[i]=='\n':
-            # Increment line number when a newline character is encountered
-            line_number += 1
-
-        # Check if the current character is the start of an XML tag
-        if xml[i] == "<":
-            if xml[i+1] != "/":  
-                i+=1
-                open_tag=""
-                # Extract the content of the opening tag until '>'
-                while xml[i] != ">":
-                    open_tag+=xml[i]
-                    i+=1
-                closing=False 
-                # Extract the content of the opening tag (excluding '<' and '>')
-                open_tag_content=open_tag.replace("<", '').replace(">", '')
-                open.append(open_tag_content)
-
-            #The same logic will happen If it's a closing tag
-            elif xml[i+1] == "/":
-                i+=2
-                closed_tag=""
-                while xml[i] != ">":
-                    closed_tag+=xml[i]
-                    i+=1
-                closing=True
-                closed_tag_content=closed_tag.replace("<", '').replace("/", '').replace(">", '')
-                closed.append(closed_tag_content)
-
-        # If there is a closing tag and there are open tags in stacks
-        if closing and open:
-            exsit=True
-            # Check if the last open tag matches the last closed tag
-            if open and closed and closed[-1]!=open[-1]:
-                # Loop until a matching open tag is found in stack is crossponding to the closed tag in closed stack or no open tags
-                while open and exsit :
-                    for element in open:
-                        if element == closed[-1]:
-                            exsit=True
-                            break
-                    else:
-                        exsit=False
-
-                    # If a matching open tag is found,so there is a missing closed tag for the first element in opening tag
-                    if exsit:
-                        errors.append(open.pop())
-                        if open and closed and open[-1] == closed[-1]:
-                            closed.pop()
-                            open.pop()
-                            while errors:
-                              error_string += f"Missing closed tag for opening tag: {errors.pop()} at line {line_number}\n"
-                            break
-                    # if there is no matching tag for the closed tag in the stack in the opening tag so there is missing opening tag or missmatched tag  
-                    else:
-                        unmatched_tag = closed.pop()
-                        error_string += f"Unmatched tag for opening tag : {open[-1]}-> {unmatched_tag}\n"
-                        error_string +=f" or missing an opening tag for {unmatched_tag} at line {line_number}\n"
-                        
-                    
-                while errors:
-                    open.append(errors.pop())
-                # If there are still closed tags report them    
-                if closed:
-                    error_string += f"{closed[-1]} tag is not opened at line {line_number}\n"
-                    closed.pop()
-                
-            else:
-                # If the last open tag matches the last closed tag, pop them
-                open.pop()
-                if closed:
-                    closed.pop()
-            closing = False
-            
-        i+=1
-    
-    # Process any remaining open or closed tags
-    while open:
-        error_string += f"{open.pop()} tag is not closed at line {line_number}\n"
-
-    while closed:
-       error_string += f"{closed.pop()} tag is not opened at line {line_number}\n"
-    
-    if(error_string):
-        return error_string
-    else:
-        return "correct XML file "
-    
-
+    return format_errors(detect_errors(xml, max_errors))
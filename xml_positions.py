@@ -0,0 +1,273 @@
+from array import array
+from bisect import bisect_right
+from formatting import iter_token_spans
+
+class Position_Index:
+    """
+    Where every element of an XML text is, kept in compact integer arrays
+    indexed by document order (the order of the opening tags), so the
+    element at an offset, or the offset of an element, is found with a
+    binary search instead of scanning the text again.
+
+    Offsets are indices in the text string, lines and columns start at 1.
+
+    Attributes:
+    ----------
+    - names (list of str):
+        Name of each element.
+    - elements (list of Element, or None):
+        The tree's element for each index, if the index was built for a tree.
+    - starts, ends (array of int):
+        Span of each element, from the '<' of its opening tag to after the
+        '>' of its closing tag. Elements left open end with the text.
+    - parents (array of int):
+        Index of each element's parent, -1 for top-level elements.
+    - positions (array of int):
+        Position of each element among its parent's children of the same
+        name, starting at 1.
+    - sibling_counts (array of int):
+        Number of children of each element's parent with the same name,
+        the element included.
+    - start_lines, start_columns, end_lines, end_columns (array of int):
+        Line and column of each element's start and end.
+    - line_starts (array of int):
+        Offset of the first character of each line.
+
+    Methods:
+    --------
+    - element_at(offset):
+        Index of the innermost element containing an offset.
+    - path(index):
+        Path of an element, e.g. "/users/user[2]/name".
+    - path_at(offset):
+        Path of the innermost element containing an offset.
+    - index_of(element):
+        Index of a tree element.
+    - span(element):
+        Start and end offsets of a tree element.
+    - line_column(offset):
+        Line and column of an offset.
+    - offset(line, column):
+        Offset of a line and column.
+    """
+
+    def __init__(self, text, elements=None):
+        """
+        Parameters:
+        ----------
+        - text (str):
+            syntactically correct XML string.
+        - elements (list of Element, optional):
+            Elements of a tree built from text, in document order, e.g.
+            collected by XML_Document. (Default is None)
+
+        Raises:
+        -------
+        ValueError:
+            If text can not be tokenized in place (see
+            formatting.iter_token_spans()), or elements is not the tree of text.
+        """
+
+        self.names = []
+        self.elements = elements
+        self.starts = array('q')
+        self.ends = array('q')
+        self.parents = array('i')
+        self.positions = array('I')
+
+        stack = []
+        # names already used by the children of each open element, and the
+        # counts of each element's name among its siblings once all are read
+        name_counts = [{}]
+        element_counts = []
+        for token_start, token_end, token in iter_token_spans(text):
+            if (token[0] != '<'):
+                continue
+
+            # Closing tag, a stray one at the top level is ignored as the
+            # parser ignores it
+            if (token[1] == '/' and token[-2] != '/'):
+                if (stack):
+                    self.ends[stack.pop()] = token_end
+                    name_counts.pop()
+                continue
+
+            # Opening tag, named like xml_document.get_attr() names it
+            name = token[1:-2] if token[-2] == '/' else token[1:-1]
+            name = name.split(' ', 1)[0]
+            counts = name_counts[-1]
+            counts[name] = counts.get(name, 0) + 1
+            element_counts.append(counts)
+
+            index = len(self.names)
+            self.names.append(name)
+            self.starts.append(token_start)
+            self.parents.append(stack[-1] if stack else -1)
+            self.positions.append(counts[name])
+            if (token[-2] == '/'):
+                self.ends.append(token_end)
+            else:
+                self.ends.append(len(text))
+                stack.append(index)
+                name_counts.append({})
+        self.sibling_counts = array('I', [counts[name] for counts, name in zip(element_counts, self.names)])
+
+        if (elements is not None and (len(elements) != len(self.names)
+                                      or any(element.name != name for element, name in zip(elements, self.names)))):
+            raise ValueError("Elements do not match the text.")
+        self.element_indices = None
+
+        self.line_starts = array('q', [0])
+        position = text.find('\n')
+        while (position >= 0):
+            self.line_starts.append(position + 1)
+            position = text.find('\n', position + 1)
+
+        self.start_lines = array('I')
+        self.start_columns = array('I')
+        self.end_lines = array('I')
+        self.end_columns = array('I')
+        for offsets, lines, columns in ((self.starts, self.start_lines, self.start_columns),
+                                        (self.ends, self.end_lines, self.end_columns)):
+            for offset in offsets:
+                line, column = self.line_column(offset)
+                lines.append(line)
+                columns.append(column)
+
+    def __len__(self):
+        return len(self.names)
+
+    def element_at(self, offset):
+        """
+        Finds the innermost element whose span contains an offset.
+
+        Parameters:
+        ----------
+        - offset (int):
+            Index in the text.
+
+        Returns:
+        --------
+        int:
+            Index of the element, -1 if the offset is outside every element.
+        """
+
+        # any element containing offset is the last element starting at or
+        # before it, or one of that element's ancestors
+        index = bisect_right(self.starts, offset) - 1
+        while (index >= 0 and self.ends[index] <= offset):
+            index = self.parents[index]
+        return index
+
+    def path(self, index):
+        """
+        Gets the path of an element, with the position of every step that
+        has siblings of the same name. xml_query.query() finds the element
+        again from it.
+
+        Parameters:
+        ----------
+        - index (int):
+            Index of the element.
+
+        Returns:
+        --------
+        str:
+            Path such as "/users/user[2]/name".
+        """
+
+        steps = []
+        while (index >= 0):
+            if (self.sibling_counts[index] > 1):
+                steps.append(f"{self.names[index]}[{self.positions[index]}]")
+            else:
+                steps.append(self.names[index])
+            index = self.parents[index]
+        return '/' + '/'.join(reversed(steps))
+
+    def path_at(self, offset):
+        """
+        Gets the path of the innermost element containing an offset, see path().
+
+        Returns:
+        --------
+        str:
+            Path of the element, None if there is none.
+        """
+
+        index = self.element_at(offset)
+        return self.path(index) if index >= 0 else None
+
+    def index_of(self, element):
+        """
+        Gets the index of a tree element, for an index built with elements.
+
+        Parameters:
+        ----------
+        - element (Element):
+            Element of the tree.
+
+        Returns:
+        --------
+        int:
+            Index of the element.
+
+        Raises:
+        -------
+        KeyError:
+            If the element is not in the tree.
+        """
+
+        if (self.element_indices is None):
+            self.element_indices = {id(element): index for index, element in enumerate(self.elements)}
+        return self.element_indices[id(element)]
+
+    def span(self, element):
+        """
+        Gets the start and end offsets of a tree element, see index_of().
+
+        Returns:
+        --------
+        tuple of (int, int):
+            Span of the element.
+        """
+
+        index = self.index_of(element)
+        return self.starts[index], self.ends[index]
+
+    def line_column(self, offset):
+        """
+        Gets the line and column of an offset.
+
+        Parameters:
+        ----------
+        - offset (int):
+            Index in the text.
+
+        Returns:
+        --------
+        tuple of (int, int):
+            Line and column, starting at 1.
+        """
+
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    def offset(self, line, column=1):
+        """
+        Gets the offset of a line and column, the inverse of line_column().
+
+        Parameters:
+        ----------
+        - line (int):
+            Line, starting at 1.
+        - column (int, optional):
+            Column, starting at 1. (Default is 1)
+
+        Returns:
+        --------
+        int:
+            Index in the text.
+        """
+
+        return self.line_starts[line - 1] + column - 1
@@ -0,0 +1,193 @@
+import re
+
+# One location step: optional separator, element name (or *), predicates.
+STEP_PATTERN = re.compile(r'\s*(//|/)?\s*([^/\[\]\s]+)\s*((?:\[(?:[^\]"\']|"[^"]*"|\'[^\']*\')*\]\s*)*)')
+# One predicate: [name], [name=value], [@key], [@key=value] or [position].
+PREDICATE_PATTERN = re.compile(r'\[\s*(@?)([^\]=\s]+)\s*(?:=\s*("[^"]*"|\'[^\']*\'|[^\]]*?)\s*)?\]')
+
+def parse_path(path):
+    """
+    Splits a path into location steps.
+
+    Parameters:
+    ----------
+    - path (str):
+        Path such as "/users/user[id=5]/name", see query().
+
+    Returns:
+    --------
+    list of tuple of (str, str, list of tuple):
+        Axis ("/" for children, "//" for descendants), element name and
+        predicates as (is_attribute, name, value or None) tuples.
+    """
+
+    steps = []
+    position = 0
+    path = path.strip()
+    while (position < len(path)):
+        match = STEP_PATTERN.match(path, position)
+        # every step but a relative path's first needs a separator
+        if (not match or match.end() == position or (steps and not match.group(1))):
+            raise ValueError(f"Invalid query path: {path!r}")
+
+        axis, name, predicates_text = match.groups()
+        predicates = []
+        for predicate in PREDICATE_PATTERN.finditer(predicates_text):
+            is_attribute, key, value = predicate.groups()
+            if (value is not None and value[:1] in ('"', "'")):
+                value = value[1:-1]
+            predicates.append((bool(is_attribute), key, value))
+        if (len(predicates) != predicates_text.count('[')):
+            raise ValueError(f"Invalid predicate in query path: {path!r}")
+
+        steps.append((axis or '/', name, predicates))
+        position = match.end()
+
+    if (not steps):
+        raise ValueError(f"Invalid query path: {path!r}")
+    return steps
+
+def matches_predicates(element, predicates):
+    """
+    Checks an element against a step's predicates.
+
+    Parameters:
+    ----------
+    - element (Element):
+        Element to check.
+    - predicates (list of tuple):
+        Predicates as returned by parse_path().
+
+    Returns:
+    --------
+    bool:
+        True if every predicate holds.
+    """
+
+    for is_attribute, name, value in predicates:
+        # element names can not start with a digit, so this is a position,
+        # counted from 1 among the children of the element's parent that
+        # have the element's own name, also after a * step; 0 or a position
+        # past the last of them matches nothing
+        if (not is_attribute and value is None and name.isdigit()):
+            siblings = element.parent.get_children(element.name)
+            position = int(name)
+            found = 0 < position <= len(siblings) and siblings[position - 1] is element
+        elif (is_attribute):
+            found = any(attribute.key == name and (value is None or attribute.value == value)
+                        for attribute in element.attributes)
+        else:
+            found = any(value is None or child.content == value
+                        for child in element.get_children(name))
+        if (not found):
+            return False
+    return True
+
+def child_step(contexts, name):
+    """
+    Gets the children named name (any name for "*") of every context element.
+    """
+
+    matches = []
+    for context in contexts:
+        if (name == '*'):
+            for siblings in context.children:
+                matches.extend(siblings)
+        else:
+            matches.extend(context.get_children(name))
+    return matches
+
+def descendant_step(contexts, name, document_root, tag_index):
+    """
+    Gets the descendants named name (any name for "*") of every context
+    element, looked up in tag_index when there is one.
+    """
+
+    if (tag_index is not None and name != '*'):
+        candidates = tag_index.get(name, [])
+        if (len(contexts) == 1 and contexts[0] is document_root):
+            return list(candidates)
+
+        # keep the candidates that have one of the contexts as an ancestor
+        context_ids = set(id(context) for context in contexts)
+        matches = []
+        for candidate in candidates:
+            ancestor = candidate.parent
+            while (True):
+                if (id(ancestor) in context_ids):
+                    matches.append(candidate)
+                    break
+                if (ancestor is ancestor.parent or ancestor.parent is None):
+                    break
+                ancestor = ancestor.parent
+        return matches
+
+    # no index, walk the subtrees in document order, adding each element as
+    # it is reached; nested contexts would repeat elements
+    matches = []
+    seen = set()
+    stack = [(context, False) for context in reversed(contexts)]
+    while (stack):
+        element, is_descendant = stack.pop()
+        if (is_descendant and (name == '*' or element.name == name)):
+            matches.append(element)
+        for child in reversed(list(element.iter_children())):
+            if (id(child) not in seen):
+                seen.add(id(child))
+                stack.append((child, True))
+    return matches
+
+def query(context, path, tag_index=None):
+    """
+    Finds the elements matching a subset of XPath.
+
+    Supported syntax:
+        /a/b        children named b of top-level elements named a
+        //b         elements named b anywhere in the document
+        a//b        elements named b anywhere below a
+        *           any element name
+        [c]         elements with a child named c
+        [c=5]       elements with a child named c whose content is 5
+        [@k]        elements with an attribute k
+        [@k="v"]    elements whose attribute k is v
+        [2]         elements that are the second of their parent's children
+                    with the same name as theirs, counted from 1, so *[2]
+                    is the second child of each name; [0] and positions
+                    past the last such child match nothing
+    Paths starting with / are absolute, others are relative to context.
+    Values can be quoted with ' or ", or left bare.
+
+    Parameters:
+    ----------
+    - context (Element):
+        Element relative paths start from, e.g. XML_Document.root.
+    - path (str):
+        Path to match.
+    - tag_index (dict of str to list of Element, optional):
+        Elements of each name in document order, like XML_Document.tag_index.
+        Descendant steps use it instead of walking the tree. (Default is None)
+
+    Returns:
+    --------
+    list of Element:
+        Matching elements. Descendant steps return them in document order,
+        child steps group siblings of the same name.
+    """
+
+    steps = parse_path(path)
+
+    document_root = context
+    while (document_root.parent is not None and document_root.parent is not document_root):
+        document_root = document_root.parent
+    if (path.strip().startswith('/')):
+        context = document_root
+
+    elements = [context]
+    for axis, name, predicates in steps:
+        if (axis == '/'):
+            elements = child_step(elements, name)
+        else:
+            elements = descendant_step(elements, name, document_root, tag_index)
+        if (predicates):
+            elements = [element for element in elements if matches_predicates(element, predicates)]
+    return elements
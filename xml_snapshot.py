@@ -0,0 +1,311 @@
+import gc
+import mmap
+import struct
+import sys
+from array import array
+from hashlib import blake2b
+from sys import intern
+from xml_document_parts import Element, Attribute
+
+# File layout, all integers little-endian:
+#   header       HEADER_FORMAT, see below
+#   offsets      (string count + 1) uint64, start of each string in strings
+#   elements     element count * 5 uint32: name, parent, content, first
+#                attribute and attribute count, parents before children
+#   attributes   attribute count * 2 uint32: key and value
+#   index        index count uint32, the elements of tag_index, grouped
+#                by name, each name's elements in document order
+#   tokens       token count uint32
+#   strings      UTF-8 text of all strings, one after the other
+# Every section starts at a multiple of 8 bytes, so the fixed-width ones
+# can be used straight from a memory map.
+MAGIC = b"XMLSNAP\0"
+VERSION = 1
+# magic, version, flags, source length, source checksum, string count,
+# element count, attribute count, index count, token count, string bytes
+HEADER_FORMAT = "<8sIIQ16sIIIIIQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+ELEMENT_FIELDS = 5
+# Parent of top-level elements, the document root is not stored.
+NO_PARENT = 0xFFFFFFFF
+
+def source_checksum(text):
+    """
+    Gets the checksum of a source text stored in snapshots of its tree.
+
+    Parameters:
+    ----------
+    - text (str):
+        XML string.
+
+    Returns:
+    --------
+    bytes:
+        16-byte BLAKE2 digest of the UTF-8 text.
+    """
+
+    return blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+def padding(size):
+    """
+    Gets the number of zero bytes that bring size to a multiple of 8.
+    """
+
+    return -size % 8
+
+def write_snapshot(path, root, tokens, tag_index, text):
+    """
+    Writes a tree to a binary snapshot file.
+
+    Parameters:
+    ----------
+    - path (str):
+        Snapshot file path.
+    - root (Element):
+        Document root, e.g. XML_Document.root. Its own name, attributes
+        and content are not stored.
+    - tokens (list of str):
+        Tokens the tree was built from, e.g. XML_Document.tokens.
+    - tag_index (dict of str to list of Element):
+        Elements of each name in document order, e.g. XML_Document.tag_index.
+    - text (str):
+        Source text, only its length and checksum are stored.
+    """
+
+    strings = {}
+    def string_id(string):
+        index = strings.get(string)
+        if (index is None):
+            index = strings[string] = len(strings)
+        return index
+
+    elements = array('I')
+    attributes = array('I')
+    element_ids = {}
+
+    # breadth first, so every parent is stored before its children
+    level = [(element, NO_PARENT) for element in root.iter_children()]
+    while (level):
+        next_level = []
+        for element, parent in level:
+            element_id = element_ids[id(element)] = len(element_ids)
+            elements.extend((string_id(element.name), parent, string_id(element.content),
+                             len(attributes) // 2, len(element.attributes)))
+            for attribute in element.attributes:
+                attributes.extend((string_id(attribute.key), string_id(attribute.value)))
+            next_level.extend((child, element_id) for child in element.iter_children())
+        level = next_level
+
+    index = array('I', [element_ids[id(element)] for elements_of_name in tag_index.values()
+                        for element in elements_of_name])
+    token_ids = array('I', [string_id(token) for token in tokens])
+
+    encoded = [string.encode('utf-8', 'surrogatepass') for string in strings]
+    offsets = array('Q', [0])
+    position = 0
+    for string in encoded:
+        position += len(string)
+        offsets.append(position)
+
+    sections = [offsets, elements, attributes, index, token_ids]
+    if (sys.byteorder != 'little'):
+        for section in sections:
+            section.byteswap()
+
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, 0, len(text), source_checksum(text),
+                         len(strings), len(element_ids), len(attributes) // 2, len(index),
+                         len(token_ids), position)
+    with open(path, 'wb') as file:
+        file.write(header)
+        file.write(b'\0' * padding(HEADER_SIZE))
+        for section in sections:
+            data = section.tobytes()
+            file.write(data)
+            file.write(b'\0' * padding(len(data)))
+        file.write(b''.join(encoded))
+
+def read_snapshot(path, text=None):
+    """
+    Reads a tree from a binary snapshot file. The file is memory-mapped
+    and its fixed-width sections are read in place.
+
+    Parameters:
+    ----------
+    - path (str):
+        Snapshot file path.
+    - text (str, optional):
+        Current source text. If given, the snapshot must have been taken
+        of this exact text. (Default is None, do not check)
+
+    Returns:
+    --------
+    Element:
+        Document root, like XML_Document.root.
+    list of str:
+        Tokens, like XML_Document.tokens.
+    dict of str to list of Element:
+        Elements of each name in document order, like XML_Document.tag_index.
+
+    Raises:
+    -------
+    ValueError:
+        If the file is not a snapshot, has another version, is truncated,
+        or is stale, i.e. was not taken of text.
+    """
+
+    with open(path, 'rb') as file:
+        if (file.seek(0, 2) < HEADER_SIZE):
+            raise ValueError(f"{path} is not an XML snapshot.")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            (magic, version, _, source_length, checksum, string_count, element_count,
+             attribute_count, index_count, token_count, string_size) = struct.unpack_from(HEADER_FORMAT, mapped)
+            if (magic != MAGIC):
+                raise ValueError(f"{path} is not an XML snapshot.")
+            if (version != VERSION):
+                raise ValueError(f"{path} has snapshot version {version}, expected {VERSION}.")
+            if (text is not None and (len(text) != source_length or source_checksum(text) != checksum)):
+                raise ValueError(f"{path} is stale, it was taken of a different text.")
+
+            # section offsets and sizes, in file order
+            layout = []
+            position = HEADER_SIZE + padding(HEADER_SIZE)
+            for typecode, count in (('Q', string_count + 1), ('I', element_count * ELEMENT_FIELDS),
+                                    ('I', attribute_count * 2), ('I', index_count), ('I', token_count)):
+                size = count * array(typecode).itemsize
+                layout.append((typecode, position, size))
+                position += size + padding(size)
+            if (len(mapped) < position + string_size):
+                raise ValueError(f"{path} is truncated.")
+
+            offsets, elements, attributes, index, token_ids = [
+                read_section(mapped, typecode, start, size) for typecode, start, size in layout]
+            blob = mapped[position:position + string_size]
+
+    strings = decode_strings(blob, offsets)
+    tokens = [strings[i] for i in token_ids]
+
+    # names are interned once per distinct string, not once per element
+    names = {}
+    root = Element("root", None, [])
+    root.parent = root
+    nodes = []
+    append = nodes.append
+
+    # nothing built here can be garbage, skip the collector's passes over
+    # the growing tree
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        columns = [elements[field::ELEMENT_FIELDS] for field in range(ELEMENT_FIELDS)]
+        for name, parent, content, first_attribute, attribute_count in zip(*columns):
+            name = names.get(name) or names.setdefault(name, intern(strings[name]))
+            if (attribute_count):
+                list_of_attributes = [Attribute(intern(strings[attributes[j]]), strings[attributes[j + 1]])
+                                      for j in range(2 * first_attribute, 2 * (first_attribute + attribute_count), 2)]
+            else:
+                list_of_attributes = []
+            parent = root if parent == NO_PARENT else nodes[parent]
+            element = Element(name, parent, list_of_attributes)
+            element.content = strings[content]
+            append(element)
+
+            # same as xml_document.add_child()
+            child_index = parent.child_index
+            if (child_index is None):
+                child_index = parent.child_index = {}
+            siblings = child_index.get(name)
+            if (siblings is None):
+                siblings = child_index[name] = []
+                parent.children.append(siblings)
+            elif (parent.child_runs is None and siblings is not parent.children[-1]):
+                parent.child_runs = [[group, len(group)] for group in parent.children]
+            runs = parent.child_runs
+            if (runs is not None):
+                if (runs[-1][0] is siblings):
+                    runs[-1][1] += 1
+                else:
+                    runs.append([siblings, 1])
+            siblings.append(element)
+
+        tag_index = {}
+        for i in index:
+            element = nodes[i]
+            elements_of_name = tag_index.get(element.name)
+            if (elements_of_name is None):
+                elements_of_name = tag_index[element.name] = []
+            elements_of_name.append(element)
+    finally:
+        if (collecting):
+            gc.enable()
+
+    return root, tokens, tag_index
+
+def read_section(mapped, typecode, start, size):
+    """
+    Internal function that reads a section of unsigned integers.
+
+    Returns:
+    --------
+    list of int:
+        The section's integers.
+    """
+
+    if (sys.byteorder == 'little'):
+        with memoryview(mapped) as view, view[start:start + size] as section, section.cast(typecode) as values:
+            return values.tolist()
+
+    values = array(typecode, mapped[start:start + size])
+    values.byteswap()
+    return values.tolist()
+
+def decode_strings(blob, offsets):
+    """
+    Internal function that splits the string table into strings.
+
+    Parameters:
+    ----------
+    - blob (bytes):
+        UTF-8 text of all strings.
+    - offsets (list of int):
+        Start of each string in blob, followed by its length.
+
+    Returns:
+    --------
+    list of str:
+        Strings in table order.
+    """
+
+    text = blob.decode('utf-8', 'surrogatepass')
+    # ASCII only, byte offsets are character offsets too
+    if (len(text) == len(blob)):
+        return [text[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+    return [blob[offsets[i]:offsets[i + 1]].decode('utf-8', 'surrogatepass') for i in range(len(offsets) - 1)]
+
+def is_current(path, text):
+    """
+    Checks whether a snapshot file exists and was taken of text.
+
+    Parameters:
+    ----------
+    - path (str):
+        Snapshot file path.
+    - text (str):
+        Current source text.
+
+    Returns:
+    --------
+    bool:
+        True if the snapshot can be loaded for text.
+    """
+
+    try:
+        with open(path, 'rb') as file:
+            header = file.read(HEADER_SIZE)
+    except OSError:
+        return False
+    if (len(header) < HEADER_SIZE):
+        return False
+
+    magic, version, _, source_length, checksum = struct.unpack_from(HEADER_FORMAT, header)[:5]
+    return (magic == MAGIC and version == VERSION and len(text) == source_length
+            and source_checksum(text) == checksum)